@@ -3,6 +3,8 @@ from datetime import datetime
 import matplotlib.pyplot as plt
 
 from data import BinanceDataHandler, GateDataHandler
+from chart_render import draw_diff_fr, render_symbol
+from mean_reversion import mean_reversion_stats, rank_symbols, spread_panel
 
 pd.set_option('display.max_columns', None)  # 显示所有列
 pd.set_option('display.max_rows', None)     # 显示所有行
@@ -50,6 +52,23 @@ class AnalysisUtils:
 
         return merged_df
 
+    # 多个symbol的价差对齐成面板（行为时间、列为symbol），拉取失败的symbol跳过
+    def get_spread_panel(self, symbols, interval='1m', limit=1000):
+        frames = {}
+        for symbol in symbols:
+            try:
+                frames[symbol] = self.get_futures_diff(symbol, interval=interval, limit=limit)
+            except Exception as e:
+                print(f"Can't get futures diff for {symbol}: {e}")
+        return spread_panel(frames)
+
+    # 所有symbol一起算价差回归速度（半衰期、z-score、穿越率、平均持仓时长），按半衰期排序
+    def rank_mean_reversion(self, symbols, interval='1m', limit=1000, window=240, upper=0.006, lower=-0.006,
+                            max_half_life=None):
+        panel = self.get_spread_panel(symbols, interval=interval, limit=limit)
+        stats = mean_reversion_stats(panel, window=window, upper=upper, lower=lower)
+        return rank_symbols(stats, max_half_life=max_half_life)
+
     # merge两个平台资金费率
     @staticmethod
     def merge_fr(binance_df, gate_df):
@@ -75,39 +94,30 @@ class AnalysisUtils:
         return merged_df
 
     # plot上述两个平台的价格历史和资金费率历史
+    # save_path 不为空时画到文件（无界面），width_px 为图片宽度；max_points 为价差曲线降采样后的最大点数
     @staticmethod
-    def plot_diff_fr(merged_df, symbol):
-        merged_copy = merged_df.copy()
-
-        merged_copy['diff_pct'] = pd.to_numeric(merged_copy['diff_pct'], errors='coerce')
-        merged_copy['binance_fr'] = pd.to_numeric(merged_copy['binance_fr'], errors='coerce')
-        merged_copy['gate_fr'] = pd.to_numeric(merged_copy['gate_fr'], errors='coerce')
-
-        plt.figure(figsize=(8, 4))
-        plt.plot(merged_copy.index, merged_copy['diff_pct'], label='Future Close Diff Pct', linewidth=1)
-        plt.scatter(merged_copy.index, merged_copy['binance_fr'], label='Binance FR', color='orange', marker='o',
-                    alpha=0.7)
-        plt.scatter(merged_copy.index, merged_copy['gate_fr'], label='Gate FR', color='green', marker='^', alpha=0.7)
-        plt.axhline(y=merged_copy['diff_pct'].describe()['50%'], color='red', linestyle='--', linewidth=1)
-        plt.xlabel('Date')
-        plt.ylabel('Future Close Diff Pct')
-        plt.title(f'{symbol} future klines diff pct trend')
-        plt.legend()
-        plt.grid(True)
-        plt.tight_layout()
+    def plot_diff_fr(merged_df, symbol, save_path=None, max_points=None, width_px=1200):
+        if save_path:
+            render_symbol(merged_df, symbol, save_path, width_px=width_px, max_points=max_points)
+            return save_path
+
+        fig, ax = plt.subplots(figsize=(8, 4))
+        draw_diff_fr(ax, merged_df, symbol, max_points=max_points)
+        fig.tight_layout()
         plt.show()
 
     # 完整分析，包含获取数据和plot
-    def full_analysis(self, symbol, interval='5m', limit=1500):
+    def full_analysis(self, symbol, interval='5m', limit=1500, save_path=None):
         """
         symbol: e.g. "AIOTUSDT"
+        save_path: 不为空时图片保存到该路径而不是弹窗显示
         """
         merged_df = self.merge_diff_fr(symbol, interval=interval, limit=limit)
         b_vol = self.bdata_handler.get_24tradevol(symbol)
         g_vol = self.gdata_handler.get_24tradevol(symbol=symbol.replace("USDT","_USDT"))
         print(f"binance last 24hour vol in usdt is: {b_vol}")
         print(f"gate last 24hour vol in usdt is: {g_vol}")
-        self.plot_diff_fr(merged_df, symbol)
+        self.plot_diff_fr(merged_df, symbol, save_path=save_path)
 
 if __name__ == '__main__':
 
@@ -0,0 +1,284 @@
+"""
+获取相关数据的异步模块，和 data.py 的 GateDataHandler / BinanceDataHandler 一一对应：
+- 直接调用交易所 REST 接口，不依赖同步的 python-binance / gate_api
+- 每个 handler 共用一个 aiohttp 长连接池（keep-alive），代理取自 config.py
+- 信号量限制同时在途的请求数，429 / 5xx 以及连接错误、超时自动退避重试
+- 返回的 DataFrame 列和 data.py 相同，可以直接替换使用
+
+用法：
+    async with AsyncBinanceDataHandler() as b, AsyncGateDataHandler() as g:
+        dfs = await asyncio.gather(*[b.get_future_klines(s) for s in symbols])
+"""
+import asyncio
+from datetime import datetime
+
+import aiohttp
+import pandas as pd
+
+from config import BINANCE_PROXY, GATE_PROXY
+
+RETRY_STATUS = (418, 429, 500, 502, 503, 504)
+
+
+class _AsyncRestClient:
+
+    name = None
+
+    def __init__(self, base_url, proxy=None, max_concurrency=20, pool_size=100, timeout=10, retries=3):
+        self.base_url = base_url.rstrip('/')
+        self.proxy = proxy
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.session = None
+
+    async def __aenter__(self):
+        self._ensure_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _ensure_session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    # GET 并解析 JSON；参数里的 None 会被去掉
+    # 可重试的状态码、连接错误和超时按同样的退避重试，其余 HTTP 错误直接抛出
+    async def _get(self, path, params=None):
+        session = self._ensure_session()
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        delay = 1
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            try:
+                async with self.semaphore:
+                    async with session.get(f"{self.base_url}{path}", params=params, proxy=self.proxy) as resp:
+                        if resp.status not in RETRY_STATUS or attempt == self.retries:
+                            resp.raise_for_status()
+                            return await resp.json()
+                        retry_after = resp.headers.get('Retry-After')
+            except aiohttp.ClientResponseError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    raise
+                print(f"[{self.name}] GET {path} failed: {e}, retrying in {delay}s")
+            await asyncio.sleep(float(retry_after) if retry_after else delay)
+            delay *= 2
+
+
+class AsyncGateDataHandler(_AsyncRestClient):
+
+    name = 'gate'
+
+    def __init__(self, base_url="https://api.gateio.ws/api/v4", proxy=GATE_PROXY, **kwargs):
+        super().__init__(base_url, proxy=proxy, **kwargs)
+
+    # Gateio所有合约实时资金费率
+    async def gate_get_funding_rates(self, symbol_filter="usdt"):
+
+        contracts = await self._get(f"/futures/{symbol_filter}/contracts")
+        df = pd.DataFrame([{
+            'symbol': c['name'],
+            'mark_price': c.get('mark_price'),
+            'gate_funding_rate': c.get('funding_rate'),
+            'next_funding_time': c.get('funding_next_apply'),
+        } for c in contracts])
+
+        df['gate_funding_rate'] = df['gate_funding_rate'].astype(float)
+        df['mark_price'] = df['mark_price'].astype(float)
+        df['symbol_renamed'] = df['symbol'].apply(lambda x: x.replace("_", ""))
+        df['next_funding_time'] = pd.to_datetime(df['next_funding_time'], unit='s')
+
+        df.sort_values(by="gate_funding_rate", ascending=False, inplace=True)
+
+        return df
+
+    # Gateio单个合约的实时funding rate，获取失败返回 None
+    async def get_funding_rate(self, symbol):
+        try:
+            info = await self._get(f"/futures/usdt/contracts/{symbol}")
+            return info['funding_rate']
+        except Exception as e:
+            print(f"[Gate FR] 获取 {symbol} 资金费率失败: {e}")
+            return None
+
+    # Gate上某合约的资金费率历史
+    async def get_funding_rate_history(self, symbol, limit=500):
+        try:
+            fr_history = await self._get("/futures/usdt/funding_rate", {'contract': symbol, 'limit': limit})
+            df = pd.DataFrame([{'funding_rate': f['r'],
+                                'funding_ts': f['t']} for f in fr_history])
+            df['funding_time'] = pd.to_datetime(df['funding_ts'], unit='s')
+            df['funding_rate'] = df['funding_rate'].astype(float)
+            df['symbol'] = symbol
+            df.rename(columns={'funding_rate': "gate_fr"}, inplace=True)
+
+            return df
+
+        except Exception as e:
+            print(f"❌ Error fetching Gate.io funding rate history for {symbol}: {e}")
+            return None
+
+    # 近期所有symbol的合约资金费率历史，所有合约并发请求
+    async def get_all_funding_rate_histories(self, limit=100):
+        all_symbols_df = await self.gate_get_funding_rates()
+        symbols = all_symbols_df['symbol'].tolist()
+
+        results = await asyncio.gather(*[self.get_funding_rate_history(s, limit=limit) for s in symbols])
+        all_fr_rows = [df for df in results if df is not None and not df.empty]
+
+        return pd.concat(all_fr_rows, ignore_index=True)
+
+    # Gate获取某合约的K线数据，返回列同 GateDataHandler.get_future_klines
+    async def get_future_klines(self, symbol, ts_from: int = None, interval='1m', limit=10, settle: str = 'usdt'):
+
+        klines = await self._get(f"/futures/{settle}/candlesticks",
+                                 {'contract': symbol, 'from': ts_from, 'interval': interval, 'limit': limit})
+
+        df = pd.DataFrame({
+            'timestamp': [k['t'] for k in klines],
+            'open': [k['o'] for k in klines],
+            'high': [k['h'] for k in klines],
+            'low': [k['l'] for k in klines],
+            'close': [k['c'] for k in klines],
+            'volume': [k.get('v') for k in klines],
+            'sum': [k.get('sum') for k in klines],
+        })
+        df[['open', 'high', 'low', 'close']] = df[['open', 'high', 'low', 'close']].astype(float)
+        df[['volume', 'sum']] = df[['volume', 'sum']].apply(pd.to_numeric, errors='coerce').astype(float)
+        df.insert(1, 'time', pd.to_datetime(df['timestamp'], unit='s'))
+
+        return df
+
+    # 某symbol过去24小时交易量
+    async def get_24tradevol(self, symbol):
+
+        try:
+            tickers = await self._get("/futures/usdt/tickers", {'contract': symbol})
+            for t in tickers:
+                if t['contract'] == symbol:
+                    return t['volume_24h_settle']
+
+        except Exception as e:
+            print(f"Can't get futures trade volume info: {e}")
+
+    # 所有tickers
+    async def get_tickers(self):
+
+        try:
+            tickers = await self._get("/futures/usdt/tickers")
+            df = pd.DataFrame([{
+                "symbol": t['contract'],
+                "last": t['last'],
+                "vol_usdt": t['volume_24h_settle']
+            } for t in tickers])
+            return df
+        except Exception as e:
+            print(f"Can't get futures tickers: {e}")
+
+
+class AsyncBinanceDataHandler(_AsyncRestClient):
+
+    name = 'binance'
+
+    def __init__(self, base_url="https://fapi.binance.com", proxy=BINANCE_PROXY, **kwargs):
+        super().__init__(base_url, proxy=proxy, **kwargs)
+
+    # 同 BinanceDataHandler.transform_df
+    @staticmethod
+    def transform_df(df):
+        df = df.iloc[:, :6]
+        df.columns = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+        df['Date'] = pd.to_datetime(df['Date'], unit='ms')
+        df.set_index('Date', inplace=True)
+        df = df.astype(float)
+
+        return df
+
+    @staticmethod
+    def _to_ms(time_str):
+        if not time_str:
+            return None
+        return int(datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S').timestamp() * 1000)
+
+    # 获取合约k线数据
+    async def get_future_klines(self, symbol, interval='1m', start_str=None, end_str=None, limit=1000):
+
+        try:
+            raw_data = await self._get("/fapi/v1/klines", {'symbol': symbol,
+                                                            'interval': interval,
+                                                            'startTime': self._to_ms(start_str),
+                                                            'endTime': self._to_ms(end_str),
+                                                            'limit': limit})
+
+            df = pd.DataFrame(raw_data)
+
+            return self.transform_df(df)
+
+        except Exception as e:
+            print(f"Can't get futures kline: {e}")
+
+    # 获取合约历史资金费率
+    async def get_funding_rate_history(self, symbol, start_str=None, end_str=None, limit=1000):
+
+        try:
+            raw_data = await self._get("/fapi/v1/fundingRate", {'symbol': symbol,
+                                                                 'startTime': self._to_ms(start_str),
+                                                                 'endTime': self._to_ms(end_str),
+                                                                 'limit': limit})
+
+            df = pd.DataFrame(raw_data)
+            df['Date'] = pd.to_datetime(df['fundingTime']//1000, unit='s')
+            df.rename(columns={'fundingRate': "binance_fr"}, inplace=True)
+
+            return df
+
+        except Exception as e:
+            print(f"Can't get futures funding rate: {e}")
+
+    # Binance上所有合约symbol的status
+    async def bi_get_all_contract_status(self):
+        data = await self._get("/fapi/v1/exchangeInfo")
+        symbols = data.get('symbols', [])
+        rows = []
+        for symbol_info in symbols:
+            rows.append({
+                'symbol': symbol_info['symbol'],
+                'status': symbol_info['status']
+            })
+        df = pd.DataFrame(rows)
+
+        return df
+
+    # Binance上某symbol的过去24小时的成交额
+    async def get_24tradevol(self, symbol):
+        try:
+            ticker = await self._get("/fapi/v1/ticker/24hr", {'symbol': symbol})
+            return float(ticker['quoteVolume'])
+        except Exception as e:
+            print(f"Can't get futures trade volume info: {e}")
+
+
+if __name__ == '__main__':
+
+    async def main():
+        symbols = ['BTCUSDT', 'ETHUSDT', 'AIOTUSDT']
+        async with AsyncBinanceDataHandler() as bdata_handler, AsyncGateDataHandler() as gdata_handler:
+            b_dfs = await asyncio.gather(*[bdata_handler.get_future_klines(s, limit=100) for s in symbols])
+            g_dfs = await asyncio.gather(*[gdata_handler.get_future_klines(s.replace('USDT', '_USDT'), limit=100)
+                                           for s in symbols])
+            for symbol, b_df, g_df in zip(symbols, b_dfs, g_dfs):
+                print(symbol)
+                print(b_df.tail(2) if b_df is not None else None)
+                print(g_df.tail(2))
+
+    asyncio.run(main())
@@ -0,0 +1,171 @@
+"""
+批量画图模块（无界面）：
+- LTTB（largest-triangle-three-buckets）降采样，点数按图片像素宽度决定，保留价差曲线形状
+- 直接用 Agg canvas 画到文件，不经过 pyplot，可以在多进程 worker 里并行
+- 为整个 symbol 列表生成图片和一个 index.html 汇总页
+"""
+import html
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+
+# LTTB 降采样，返回保留点的下标（首尾点必选）
+def lttb_indices(x, y, n_out):
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # 中间 n-2 个点均分为 n_out-2 个桶
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0] = 0
+    out[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # 下一个桶的均值点作为三角形的第三个顶点
+        next_start = end
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        bx = x[start:end]
+        by = y[start:end]
+        area = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def _to_float(series):
+    return pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64)
+
+
+# 在给定 ax 上画价差曲线和两边资金费率；max_points 为价差曲线的最大点数
+def draw_diff_fr(ax, merged_df, symbol, max_points=None):
+    times = merged_df.index
+    diff = _to_float(merged_df['diff_pct'])
+
+    valid = np.isfinite(diff)
+    line_times = times[valid]
+    line_diff = diff[valid]
+    if max_points and len(line_diff) > max_points:
+        idx = lttb_indices(line_times.asi8 if hasattr(line_times, 'asi8') else np.arange(len(line_diff)),
+                           line_diff, max_points)
+        line_times = line_times[idx]
+        line_diff = line_diff[idx]
+
+    ax.plot(line_times, line_diff, label='Future Close Diff Pct', linewidth=1)
+
+    # 资金费率点数很少（8小时一次），只画非空的点
+    for col, label, color, marker in [('binance_fr', 'Binance FR', 'orange', 'o'),
+                                      ('gate_fr', 'Gate FR', 'green', '^')]:
+        if col not in merged_df:
+            continue
+        fr = _to_float(merged_df[col])
+        has_fr = np.isfinite(fr)
+        ax.scatter(times[has_fr], fr[has_fr], label=label, color=color, marker=marker, alpha=0.7)
+
+    if valid.any():
+        ax.axhline(y=np.median(diff[valid]), color='red', linestyle='--', linewidth=1)
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Future Close Diff Pct')
+    ax.set_title(f'{symbol} future klines diff pct trend')
+    ax.legend()
+    ax.grid(True)
+
+
+# 单个 symbol 画到文件；max_points 为降采样点数，不传时等于图片像素宽度
+def render_symbol(merged_df, symbol, path, width_px=1200, height_px=500, dpi=100, max_points=None):
+    fig = Figure(figsize=(width_px / dpi, height_px / dpi), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    draw_diff_fr(ax, merged_df, symbol, max_points=max_points or width_px)
+    fig.tight_layout()
+    fig.savefig(path)
+    return path
+
+
+def _render_task(args):
+    root, symbol, out_dir, width_px, height_px = args
+    from spread_pipeline import read_history
+    try:
+        df = read_history(root, symbol)
+        path = os.path.join(out_dir, f"{symbol}.png")
+        render_symbol(df, symbol, path, width_px=width_px, height_px=height_px)
+        return symbol, path, None
+    except Exception as e:
+        return symbol, None, str(e)
+
+
+# 为 index 页生成 html；stats 为 analyze_universe 的结果（可选），按 range_2_8 排序并展示
+def write_index(out_dir, entries, stats=None, title='Futures diff charts'):
+    if stats is not None and 'range_2_8' in stats:
+        order = {s: i for i, s in enumerate(stats.sort_values('range_2_8', ascending=False).index)}
+        entries = sorted(entries, key=lambda e: order.get(e[0], len(order)))
+
+    cards = []
+    for symbol, path, error in entries:
+        caption = html.escape(symbol)
+        if stats is not None and symbol in stats.index:
+            row = stats.loc[symbol]
+            caption += (f" &middot; range_2_8={row['range_2_8']:.4f}"
+                        f" &middot; median={row['quantile5']:.4f}")
+        if path:
+            img = f'<img src="{html.escape(os.path.basename(path))}" loading="lazy">'
+        else:
+            img = f'<pre>{html.escape(error or "no data")}</pre>'
+        cards.append(f'<div class="card"><div>{caption}</div>{img}</div>')
+
+    page = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{html.escape(title)}</title>
+<style>body{{font-family:sans-serif}} .card{{display:inline-block;margin:6px;vertical-align:top}}
+.card img{{width:600px}}</style></head>
+<body><h2>{html.escape(title)}</h2>
+{''.join(cards)}
+</body></html>
+"""
+    index_path = os.path.join(out_dir, 'index.html')
+    with open(index_path, 'w', encoding='utf-8') as f:
+        f.write(page)
+    return index_path
+
+
+# 全部 symbol 并行画图：数据从分区历史（spread_pipeline）读取，worker 之间不传 DataFrame
+def render_universe(root, out_dir, symbols=None, workers=None, width_px=1200, height_px=500, stats=None):
+    from spread_pipeline import list_symbols
+
+    os.makedirs(out_dir, exist_ok=True)
+    symbols = symbols or list_symbols(root)
+    tasks = [(root, s, out_dir, width_px, height_px) for s in symbols]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+
+    if workers == 1:
+        entries = [_render_task(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            entries = list(pool.map(_render_task, tasks))
+
+    for symbol, _, error in entries:
+        if error:
+            print(f"Can't render {symbol}: {error}")
+    return write_index(out_dir, entries, stats=stats)
+
+
+if __name__ == '__main__':
+
+    from spread_pipeline import analyze_universe
+
+    root = 'DATA/history'
+    stats = analyze_universe(root)
+    candidates = stats[stats['range_2_8'] >= 0.005].index.tolist()
+    index_path = render_universe(root, 'DATA/charts', symbols=candidates, stats=stats)
+    print(index_path)
@@ -46,13 +46,14 @@ class GateDataHandler:
         return df
 
     # Gateio单个合约的实时funding rate
+    # 获取失败返回 None，不用默认值掩盖；实时场景请用 market_data/funding_feed.py 的 FundingFeed
     def get_funding_rate(self, symbol):
         try:
             info = self.futures_api.get_futures_contract(settle='usdt', contract=symbol)
             return info.funding_rate
         except Exception as e:
             print(f"[Gate FR] 获取 {symbol} 资金费率失败: {e}")
-            return 0.0001
+            return None
 
     # Gate上某合约的资金费率历史
     def get_funding_rate_history(self, symbol, limit=500):
@@ -114,17 +115,19 @@ class GateDataHandler:
             limit=limit
         )
 
-        # 转为 DataFrame
-        df = pd.DataFrame([{
-            'timestamp': k.t,
-            'time': pd.to_datetime(k.t, unit='s'),
-            'open': float(k.o),
-            'high': float(k.h),
-            'low': float(k.l),
-            'close': float(k.c),
-            'volume': float(k.v) if hasattr(k, 'v') else None,
-            'sum': float(k.sum) if hasattr(k, 'sum') else None
-        } for k in klines])
+        # 按列转为 DataFrame，避免逐行构建 dict 和逐行 to_datetime
+        df = pd.DataFrame({
+            'timestamp': [k.t for k in klines],
+            'open': [k.o for k in klines],
+            'high': [k.h for k in klines],
+            'low': [k.l for k in klines],
+            'close': [k.c for k in klines],
+            'volume': [getattr(k, 'v', None) for k in klines],
+            'sum': [getattr(k, 'sum', None) for k in klines],
+        })
+        df[['open', 'high', 'low', 'close']] = df[['open', 'high', 'low', 'close']].astype(float)
+        df[['volume', 'sum']] = df[['volume', 'sum']].apply(pd.to_numeric, errors='coerce').astype(float)
+        df.insert(1, 'time', pd.to_datetime(df['timestamp'], unit='s'))
 
         return df
 
@@ -0,0 +1,222 @@
+"""
+列式K线内存存储模块：
+- 直接从 API 返回构建 numpy 数组，不逐行生成 dict / DataFrame
+- 时间戳统一为 int64 epoch 毫秒；OHLCV 精度允许时存 float32
+- 每个 symbol 的数值列存成一个 (字段数, 行数) 的二维块，pandas/numpy 视图零拷贝
+- 可选磁盘目录做 memory-mapped 备份；超过内存预算时按 LRU 淘汰 symbol
+- 没有备份目录时不淘汰（数据无处落盘），超出预算只打印一次提示，数据保留在内存
+"""
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+KLINE_FIELDS = ('open', 'high', 'low', 'close', 'volume', 'quote_volume')
+
+# Binance futures_klines 每行: [open_time, o, h, l, c, v, close_time, quote_volume, trades, ...]
+BINANCE_FIELD_INDEX = [1, 2, 3, 4, 5, 7]
+# Gate candlestick 字段: t(秒), o, h, l, c, v, sum
+GATE_FIELD_NAMES = ['o', 'h', 'l', 'c', 'v', 'sum']
+
+
+def _field(k, name):
+    # gate_api 返回对象，aiohttp/原始 REST 返回 dict，两者都支持
+    value = k.get(name) if isinstance(k, dict) else getattr(k, name, None)
+    return np.nan if value is None else value
+
+
+# Binance 原始K线 -> (ts_ms, values)，values 形状为 (len(KLINE_FIELDS), n)
+def binance_klines_to_arrays(raw_klines):
+    if not raw_klines:
+        return np.empty(0, dtype=np.int64), np.empty((len(KLINE_FIELDS), 0))
+    arr = np.array(raw_klines, dtype=object)
+    ts = arr[:, 0].astype(np.int64)
+    values = arr[:, BINANCE_FIELD_INDEX].T.astype(np.float64)
+    return ts, values
+
+
+# Gate 原始K线 -> (ts_ms, values)
+def gate_klines_to_arrays(klines):
+    n = len(klines)
+    ts = np.fromiter((_field(k, 't') for k in klines), dtype=np.float64, count=n).astype(np.int64) * 1000
+    values = np.empty((len(GATE_FIELD_NAMES), n))
+    for row, name in enumerate(GATE_FIELD_NAMES):
+        values[row] = np.fromiter((_field(k, name) for k in klines), dtype=np.float64, count=n)
+    return ts, values
+
+
+# float32 往返误差在 rtol 内就用 float32，否则保留 float64
+def compact_float_dtype(values, rtol=1e-6):
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return np.float32
+    if np.abs(finite).max() >= np.finfo(np.float32).max:
+        return np.float64
+    roundtrip = finite.astype(np.float32).astype(np.float64)
+    scale = np.maximum(np.abs(finite), np.finfo(np.float64).tiny)
+    return np.float32 if (np.abs(roundtrip - finite) / scale).max() <= rtol else np.float64
+
+
+class _SymbolKlines:
+    # 单个 symbol 的缓冲区：ts[:n] 和 values[:, :n] 为有效数据，容量按倍数增长摊销 append
+    def __init__(self, ts, values, mmapped=False):
+        self.ts = ts
+        self.values = values
+        self.n = len(ts)
+        self.mmapped = mmapped
+
+    @property
+    def nbytes(self):
+        # memmap 由操作系统页缓存管理，不计入驻留内存
+        return 0 if self.mmapped else self.ts.nbytes + self.values.nbytes
+
+    def _reserve(self, extra):
+        need = self.n + extra
+        if not self.mmapped and need <= len(self.ts):
+            return
+        capacity = max(need, int(self.n * 1.5), 1024)
+        ts = np.empty(capacity, dtype=np.int64)
+        values = np.empty((self.values.shape[0], capacity), dtype=self.values.dtype)
+        ts[:self.n] = self.ts[:self.n]
+        values[:, :self.n] = self.values[:, :self.n]
+        self.ts, self.values, self.mmapped = ts, values, False
+
+    def append(self, ts, values):
+        if len(ts) == 0:
+            return
+        if self.n and ts[0] <= self.ts[self.n - 1]:
+            self._merge(ts, values)
+            return
+        self._reserve(len(ts))
+        self.ts[self.n:self.n + len(ts)] = ts
+        self.values[:, self.n:self.n + len(ts)] = values
+        self.n += len(ts)
+
+    # 时间有重叠（重复拉取同一窗口）时按时间戳合并，相同时间以新数据为准
+    def _merge(self, ts, values):
+        all_ts = np.concatenate([self.ts[:self.n], ts])
+        all_values = np.concatenate([self.values[:, :self.n], values.astype(self.values.dtype)], axis=1)
+        reversed_ts = all_ts[::-1]
+        _, first = np.unique(reversed_ts, return_index=True)
+        keep = len(all_ts) - 1 - first
+        self.ts = all_ts[keep]
+        self.values = np.ascontiguousarray(all_values[:, keep])
+        self.n = len(self.ts)
+        self.mmapped = False
+
+    def view(self):
+        return self.ts[:self.n], self.values[:, :self.n]
+
+
+class KlineStore:
+
+    def __init__(self, memory_budget_mb=1024, backing_dir=None, float32_rtol=1e-6):
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.backing_dir = backing_dir
+        self.float32_rtol = float32_rtol
+        self._data = OrderedDict()  # symbol -> _SymbolKlines，按最近使用排序
+        self._over_budget_warned = False
+        if backing_dir:
+            os.makedirs(backing_dir, exist_ok=True)
+
+    def _paths(self, symbol):
+        return (os.path.join(self.backing_dir, f"{symbol}.ts.npy"),
+                os.path.join(self.backing_dir, f"{symbol}.values.npy"))
+
+    # 取 symbol 的缓冲区，内存中没有则尝试从备份文件 memmap 回来
+    def _get(self, symbol):
+        entry = self._data.get(symbol)
+        if entry is None and self.backing_dir:
+            ts_path, values_path = self._paths(symbol)
+            if os.path.exists(ts_path) and os.path.exists(values_path):
+                entry = _SymbolKlines(np.load(ts_path, mmap_mode='r'), np.load(values_path, mmap_mode='r'),
+                                      mmapped=True)
+                self._data[symbol] = entry
+        if entry is not None:
+            self._data.move_to_end(symbol)
+        return entry
+
+    # 写入一批K线，ts 为 epoch 毫秒，values 形状为 (len(KLINE_FIELDS), n)
+    def append(self, symbol, ts, values):
+        ts = np.asarray(ts, dtype=np.int64)
+        values = np.asarray(values)
+        entry = self._get(symbol)
+        if entry is None:
+            dtype = compact_float_dtype(values, rtol=self.float32_rtol)
+            entry = _SymbolKlines(np.empty(0, dtype=np.int64), np.empty((len(KLINE_FIELDS), 0), dtype=dtype))
+            self._data[symbol] = entry
+        elif entry.values.dtype == np.float32 and compact_float_dtype(values, self.float32_rtol) == np.float64:
+            entry.values = entry.values.astype(np.float64)
+            entry.mmapped = False
+        entry.append(ts, values.astype(entry.values.dtype, copy=False))
+        self._enforce_budget(keep=symbol)
+
+    def ingest_binance(self, symbol, raw_klines):
+        ts, values = binance_klines_to_arrays(raw_klines)
+        self.append(symbol, ts, values)
+
+    def ingest_gate(self, symbol, klines):
+        ts, values = gate_klines_to_arrays(klines)
+        self.append(symbol, ts, values)
+
+    # 零拷贝 numpy 视图：(ts_ms, values)
+    def arrays(self, symbol):
+        entry = self._get(symbol)
+        if entry is None:
+            raise KeyError(symbol)
+        return entry.view()
+
+    # 零拷贝 DataFrame 视图，index 为 time（datetime64[ms]）
+    def frame(self, symbol):
+        ts, values = self.arrays(symbol)
+        index = pd.DatetimeIndex(ts.view('datetime64[ms]'), name='time')
+        return pd.DataFrame(values.T, index=index, columns=list(KLINE_FIELDS), copy=False)
+
+    def symbols(self):
+        names = set(self._data)
+        if self.backing_dir:
+            names.update(f[:-len('.ts.npy')] for f in os.listdir(self.backing_dir) if f.endswith('.ts.npy'))
+        return sorted(names)
+
+    def memory_usage(self):
+        return sum(entry.nbytes for entry in self._data.values())
+
+    # 写入备份文件，之后该 symbol 改为 memmap 只读视图，释放驻留内存
+    def flush(self, symbol=None):
+        if not self.backing_dir:
+            return
+        for name in ([symbol] if symbol else list(self._data)):
+            entry = self._data.get(name)
+            if entry is None or entry.mmapped:
+                continue
+            ts_path, values_path = self._paths(name)
+            ts, values = entry.view()
+            np.save(ts_path, ts)
+            np.save(values_path, np.ascontiguousarray(values))
+            self._data[name] = _SymbolKlines(np.load(ts_path, mmap_mode='r'), np.load(values_path, mmap_mode='r'),
+                                             mmapped=True)
+
+    # 落盘后从内存移除；没有 backing_dir 时数据无处保存，拒绝淘汰
+    def evict(self, symbol):
+        if symbol not in self._data:
+            return
+        if not self.backing_dir:
+            raise ValueError(f"can't evict {symbol} without backing_dir, the data would be lost")
+        self.flush(symbol)
+        del self._data[symbol]
+
+    # 超出内存预算时从最久未使用的 symbol 开始淘汰；没有 backing_dir 时只提示，不丢数据
+    def _enforce_budget(self, keep=None):
+        if not self.backing_dir:
+            if not self._over_budget_warned and self.memory_usage() > self.memory_budget:
+                self._over_budget_warned = True
+                print(f"[KlineStore] memory usage over budget ({self.memory_budget / 1024 / 1024:.0f} MB) "
+                      f"without backing_dir, keeping all data in memory")
+            return
+        for symbol in list(self._data):
+            if self.memory_usage() <= self.memory_budget:
+                break
+            if symbol == keep or self._data[symbol].mmapped:
+                continue
+            self.evict(symbol)
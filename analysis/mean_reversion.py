@@ -0,0 +1,366 @@
+"""
+全市场价差均值回归统计模块：
+- 所有 symbol 的价差对齐成一个面板（行为时间、列为 symbol），统计量全部按列做矩阵运算，不逐个 symbol 循环
+- AR(1) 拟合 x_t = a + b * x_{t-1} + e：半衰期 -ln2/ln(b)、长期均值 a/(1-b)、残差和平稳标准差（OU 离散形式）
+- 滚动 z-score、零轴穿越率、按回测规则的平均持仓时长（bar 数）
+  持仓口径同 ArbitrageBacktester：diff > upper 开空 Binance，回到 <= 0 平仓；diff < lower 开多，回到 >= 0 平仓
+  同一段正（负）价差里只算第一次越过阈值；和回测一样，平仓的那根 bar 不开新仓，反向仓位最早下一根开
+- MeanReversionState 只保存充分统计量，新 bar 到达时 O(symbol 数) 增量更新，结果和整段批量计算一致
+"""
+import numpy as np
+import pandas as pd
+
+from spread_pipeline import list_symbols, read_history
+
+LN2 = np.log(2)
+
+
+# 多个 symbol 的价差对齐成面板；frames 为 {symbol: merge_klines / merge_diff_fr 的结果}
+def spread_panel(frames, column='diff_pct'):
+    panel = pd.concat({symbol: df[column] for symbol, df in frames.items() if df is not None and not df.empty},
+                      axis=1)
+    return panel.sort_index().astype(np.float64)
+
+
+# 从 spread_pipeline 的历史分区读出价差面板
+def load_panel(root, symbols=None, column='diff_pct', start=None):
+    symbols = symbols or list_symbols(root)
+    frames = {}
+    for symbol in symbols:
+        df = read_history(root, symbol, columns=[column])
+        frames[symbol] = df.loc[start:] if start is not None else df
+    return spread_panel(frames, column=column)
+
+
+# AR(1) 的充分统计量：n, Σx, Σy, Σx², Σxy, Σy²（x 为上一根，y 为当前，两者都有值才计入）
+def ar1_sums(values):
+    x, y = values[:-1], values[1:]
+    valid = np.isfinite(x) & np.isfinite(y)
+    if not valid.all():
+        x = np.where(valid, x, 0.0)
+        y = np.where(valid, y, 0.0)
+    return np.stack([valid.sum(axis=0).astype(np.float64), x.sum(axis=0), y.sum(axis=0),
+                     np.einsum('ij,ij->j', x, x), np.einsum('ij,ij->j', x, y), np.einsum('ij,ij->j', y, y)])
+
+
+# 由充分统计量得到 AR(1) / OU 参数，每个量都是长度为 symbol 数的数组
+def ar1_from_sums(sums):
+    n, sx, sy, sxx, sxy, syy = sums
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var_x = n * sxx - sx * sx
+        b = np.where((n > 2) & (var_x > 0), (n * sxy - sx * sy) / var_x, np.nan)
+        a = (sy - b * sx) / n
+        sse = syy - 2 * a * sy - 2 * b * sxy + n * a * a + 2 * a * b * sx + b * b * sxx
+        resid_std = np.sqrt(np.maximum(sse, 0) / (n - 2))
+        reverting = (b > 0) & (b < 1)
+        half_life = np.where(reverting, -LN2 / np.log(np.where(reverting, b, 0.5)), np.inf)
+        mu = np.where(reverting, a / (1 - b), np.nan)
+        stationary_std = np.where(reverting, resid_std / np.sqrt(1 - b * b), np.nan)
+    half_life = np.where(np.isnan(b), np.nan, half_life)
+    return {'ar_b': b, 'ar_a': a, 'half_life': half_life, 'mu': mu, 'resid_std': resid_std,
+            'stationary_std': stationary_std, 'n_pairs': n}
+
+
+# 滚动 z-score，口径同 pandas rolling(window).mean() / .std()（ddof=1，窗口内必须全部有值）
+def rolling_zscore(values, window):
+    valid = np.isfinite(values)
+    # 先减去列均值再累加，降低累加和的舍入误差
+    count = valid.sum(axis=0)
+    center = np.where(count > 0, np.where(valid, values, 0.0).sum(axis=0) / np.maximum(count, 1), 0.0)
+    x = np.where(valid, values - center, 0.0)
+    zero = np.zeros((1, values.shape[1]))
+    c1 = np.concatenate([zero, np.cumsum(x, axis=0)])
+    c2 = np.concatenate([zero, np.cumsum(x * x, axis=0)])
+    cn = np.concatenate([zero, np.cumsum(valid, axis=0)])
+    z = np.full(values.shape, np.nan)
+    if len(values) < window:
+        return z
+    s1 = c1[window:] - c1[:-window]
+    s2 = c2[window:] - c2[:-window]
+    n = cn[window:] - cn[:-window]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = s1 / window
+        std = np.sqrt(np.maximum(s2 - s1 * mean, 0) / (window - 1))
+        z[window - 1:] = np.where((n == window) & (std > 0), (x[window - 1:] - mean) / std, np.nan)
+    return z
+
+
+# 只算最后一根的滚动 z-score，排序时不需要整段序列
+def last_zscore(values, window):
+    tail = values[-window:]
+    if len(tail) < window:
+        return np.full(values.shape[1], np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std = tail.std(axis=0, ddof=1)
+        return np.where(std > 0, (tail[-1] - tail.mean(axis=0)) / std, np.nan)
+
+
+# 相邻两根都有值时，穿越 center 的次数和相邻对数
+def zero_crossings(values, center=0.0):
+    d = values - center
+    prev, cur = d[:-1], d[1:]
+    valid = np.isfinite(prev) & np.isfinite(cur)
+    crossings = (valid & (prev * cur < 0)).sum(axis=0)
+    return crossings, valid.sum(axis=0)
+
+
+# 只对中间有缺口的列做 ffill（开头的缺失不影响持仓判断），对齐后的面板通常只有少数列需要
+def _ffill_gaps(values):
+    valid = np.isfinite(values)
+    first = valid.argmax(axis=0)
+    gap_cols = np.flatnonzero((~valid).sum(axis=0) > first)
+    if not len(gap_cols):
+        return values
+    values = values.copy()
+    sub = values[:, gap_cols]
+    idx = np.where(np.isfinite(sub), np.arange(len(sub))[:, None], 0)
+    values[:, gap_cols] = np.take_along_axis(sub, np.maximum.accumulate(idx, axis=0), axis=0)
+    return values
+
+
+# 一个方向的开平仓：signal 为开仓条件，run_end 为这段价差结束（平仓）的位置，都是 (symbol 数, bar 数) 的布尔矩阵
+# 只在事件下标上 searchsorted，不对整个面板做累加；exits 为实际平仓位置（展平下标）
+def _hold_one_side(signal, run_end, n_bars):
+    n_symbols = signal.shape[0]
+    # 行优先展平后的下标按 (symbol, bar) 有序，同一 symbol 的事件连续
+    sig = np.flatnonzero(signal)
+    ends = np.flatnonzero(run_end)
+    run = np.searchsorted(ends, sig, side='right')
+    sig_cols = sig // n_bars
+    # 每段里的第一个信号开仓；换 symbol 时也算新的一段
+    first = np.concatenate(([True], (run[1:] != run[:-1]) | (sig_cols[1:] != sig_cols[:-1])))[:len(sig)]
+    entry, run, cols = sig[first], run[first], sig_cols[first]
+    # 下一个段结束点必须在同一个 symbol 里，否则到最后都没平仓
+    exit_ = ends[np.minimum(run, len(ends) - 1)] if len(ends) else np.full(len(entry), -1)
+    done = (run < len(ends)) & (exit_ // n_bars == cols)
+    total = np.bincount(cols[done], weights=(exit_ - entry)[done], minlength=n_symbols)
+    closed = np.bincount(cols[done], minlength=n_symbols).astype(np.float64)
+    open_at = np.full(n_symbols, -1)
+    open_at[cols[~done]] = entry[~done] % n_bars
+    return total, closed, open_at, exit_[done]
+
+
+# 两个方向各算一遍：返回 (持仓 bar 数之和, 已平仓次数, short_at, long_at) 和平仓 bar 上有反向信号的位置（升序）
+# short_sig / long_sig 为实际参与开仓的信号，反向信号按原始的 raw_short / raw_long 判断
+def _hold_pass(short_sig, long_sig, short_end, long_end, raw_short, raw_long, n_bars):
+    short_total, short_closed, short_at, short_exits = _hold_one_side(short_sig, short_end, n_bars)
+    long_total, long_closed, long_at, long_exits = _hold_one_side(long_sig, long_end, n_bars)
+    hit = np.concatenate((short_exits[raw_long.ravel()[short_exits]], long_exits[raw_short.ravel()[long_exits]]))
+    return (short_total + long_total, short_closed + long_closed, short_at, long_at), np.sort(hit)
+
+
+# 按回测规则的持仓：返回 (持仓 bar 数之和, 已平仓次数, 未平仓的开仓位置 short_at / long_at，-1 为无)
+def _hold_state(values, upper=0.006, lower=-0.006):
+    # 缺失值沿用上一根，持仓状态在缺口里保持不变
+    x = np.ascontiguousarray(_ffill_gaps(values).T)
+    n_bars = x.shape[1]
+    pos, neg = x > 0, x < 0
+    prev_pos = np.concatenate([np.zeros((x.shape[0], 1), dtype=bool), pos[:, :-1]], axis=1)
+    prev_neg = np.concatenate([np.zeros((x.shape[0], 1), dtype=bool), neg[:, :-1]], axis=1)
+    # 平仓：正价差段之后第一根 <= 0，负价差段之后第一根 >= 0
+    short_sig, long_sig = x > upper, x < lower
+    short_end, long_end = prev_pos & (x <= 0), prev_neg & (x >= 0)
+    result, hit = _hold_pass(short_sig, long_sig, short_end, long_end, short_sig, long_sig, n_bars)
+
+    # 同回测，平仓的 bar 不开反向仓（价差一根 bar 从一边阈值外跳到另一边阈值外时才会碰到）
+    # 挡掉的信号又会改变后面的平仓位置，所以只对碰到的 symbol 重算，直到被挡的位置不再变化
+    rows = np.unique(hit // n_bars)
+    while len(rows):
+        sub_hit = hit[np.isin(hit // n_bars, rows)]
+        blocked = np.zeros((len(rows), n_bars), dtype=bool)
+        blocked[np.searchsorted(rows, sub_hit // n_bars), sub_hit % n_bars] = True
+        s_sig, l_sig = short_sig[rows], long_sig[rows]
+        sub, new_sub_hit = _hold_pass(s_sig & ~blocked, l_sig & ~blocked, short_end[rows], long_end[rows],
+                                      s_sig, l_sig, n_bars)
+        for full, part in zip(result, sub):
+            full[rows] = part
+        new_sub_hit = rows[new_sub_hit // n_bars] * n_bars + new_sub_hit % n_bars
+        changed = np.setxor1d(sub_hit, new_sub_hit)
+        hit = np.union1d(hit[~np.isin(hit // n_bars, rows)], new_sub_hit)
+        rows = np.unique(changed // n_bars)
+    return result
+
+
+# 按回测规则的持仓时长：返回 (持仓 bar 数之和, 已平仓次数, 未平仓次数)
+def hold_times(values, upper=0.006, lower=-0.006):
+    total, closed, short_at, long_at = _hold_state(values, upper, lower)
+    return total, closed, (short_at >= 0).astype(np.float64) + (long_at >= 0)
+
+
+def _as_panel(panel):
+    if isinstance(panel, pd.DataFrame):
+        return panel.to_numpy(dtype=np.float64), list(panel.columns), panel.index
+    values = np.asarray(panel, dtype=np.float64)
+    return values, list(range(values.shape[1])), None
+
+
+# 推断 bar 长度（分钟），用于把 bar 数换算成分钟
+def _bar_minutes(index):
+    if not isinstance(index, pd.DatetimeIndex) or len(index) < 2:
+        return None
+    return (index[1:] - index[:-1]).median().total_seconds() / 60
+
+
+def _stats_frame(symbols, ar, crossings, pairs, hold_sum, closed, still_open, zscore, bar_minutes):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df = pd.DataFrame({
+            **ar,
+            'zscore': zscore,
+            'zero_cross_rate': crossings / pairs,
+            'entries': closed + still_open,
+            'open_at_end': still_open,
+            'hold_bars': hold_sum / closed,
+        }, index=pd.Index(symbols, name='symbol'))
+    if bar_minutes:
+        df['half_life_minutes'] = df['half_life'] * bar_minutes
+        df['hold_minutes'] = df['hold_bars'] * bar_minutes
+    return df
+
+
+# 整个面板一次算出所有 symbol 的均值回归统计，返回以 symbol 为 index 的 DataFrame
+def mean_reversion_stats(panel, window=240, upper=0.006, lower=-0.006, center=0.0):
+    values, symbols, index = _as_panel(panel)
+    ar = ar1_from_sums(ar1_sums(values))
+    crossings, pairs = zero_crossings(values, center)
+    hold_sum, closed, still_open = hold_times(values, upper, lower)
+    return _stats_frame(symbols, ar, crossings, pairs, hold_sum, closed, still_open, last_zscore(values, window),
+                        _bar_minutes(index))
+
+
+# 按回归速度排序：只保留半衰期有限、样本足够的 symbol，半衰期越短越靠前
+def rank_symbols(stats, max_half_life=None, min_entries=1):
+    df = stats[np.isfinite(stats['half_life']) & (stats['entries'] >= min_entries)]
+    if max_half_life is not None:
+        df = df[df['half_life'] <= max_half_life]
+    return df.sort_values(['half_life', 'hold_bars'])
+
+
+class MeanReversionState:
+    # 增量版 mean_reversion_stats：每个新 bar 传入一行（长度为 symbol 数），缺失填 NaN
+    def __init__(self, symbols, window=240, upper=0.006, lower=-0.006, center=0.0, bar_minutes=None):
+        self.symbols = list(symbols)
+        self.window = window
+        self.upper = upper
+        self.lower = lower
+        self.center = center
+        self.bar_minutes = bar_minutes
+        n = len(self.symbols)
+        self.t = 0                                  # 已处理的 bar 数
+        self.prev = np.full(n, np.nan)              # 上一根原始值（AR / 穿越用）
+        self.last = np.full(n, np.nan)              # 最近一个有效值（持仓状态用，等同 ffill）
+        self.sums = np.zeros((6, n))
+        self.crossings = np.zeros(n)
+        self.pairs = np.zeros(n)
+        # 滚动窗口：环形缓冲区 + 窗口内和、平方和、有效数
+        self.buffer = np.full((window, n), np.nan)
+        self.win_sum = np.zeros(n)
+        self.win_sumsq = np.zeros(n)
+        self.win_count = np.zeros(n)
+        self.zscore = np.full(n, np.nan)
+        # 持仓：开仓所在 bar 号，-1 为空仓；short 为 diff 过 upper 开的仓
+        self.short_at = np.full(n, -1)
+        self.long_at = np.full(n, -1)
+        self.hold_sum = np.zeros(n)
+        self.closed = np.zeros(n)
+
+    # 用一段历史面板初始化，之后逐根 update；结果和对整段历史调用 mean_reversion_stats 一致
+    @classmethod
+    def from_panel(cls, panel, window=240, upper=0.006, lower=-0.006, center=0.0):
+        values, symbols, index = _as_panel(panel)
+        state = cls(symbols, window=window, upper=upper, lower=lower, center=center, bar_minutes=_bar_minutes(index))
+        if not len(values):
+            return state
+        n_bars = len(values)
+        state.t = n_bars
+        state.sums = ar1_sums(values)
+        state.crossings, state.pairs = (c.astype(np.float64) for c in zero_crossings(values, center))
+        state.prev = values[-1].copy()
+        state.last = _ffill_gaps(values)[-1].copy()
+        # 最后 window 根按 update 的环形位置放进缓冲区
+        tail = np.arange(max(n_bars - window, 0), n_bars)
+        state.buffer[tail % window] = values[tail]
+        state.win_sum = np.nansum(state.buffer, axis=0)
+        state.win_sumsq = np.nansum(state.buffer * state.buffer, axis=0)
+        state.win_count = np.isfinite(state.buffer).sum(axis=0).astype(np.float64)
+        state.zscore = last_zscore(values, window)
+        state.hold_sum, state.closed, state.short_at, state.long_at = _hold_state(values, upper, lower)
+        return state
+
+    def update(self, row):
+        x = np.asarray(row, dtype=np.float64)
+        valid = np.isfinite(x)
+        x0 = np.where(valid, x, 0.0)
+
+        # AR(1) 充分统计量
+        pair = valid & np.isfinite(self.prev)
+        p0 = np.where(pair, self.prev, 0.0)
+        y0 = np.where(pair, x0, 0.0)
+        self.sums += np.stack([pair, p0, y0, p0 * p0, p0 * y0, y0 * y0])
+
+        # 穿越
+        d_prev, d = self.prev - self.center, x - self.center
+        self.crossings += pair & (d_prev * d < 0)
+        self.pairs += pair
+
+        # 滚动窗口
+        slot = self.t % self.window
+        out = self.buffer[slot]
+        out_valid = np.isfinite(out)
+        out0 = np.where(out_valid, out, 0.0)
+        self.win_sum += x0 - out0
+        self.win_sumsq += x0 * x0 - out0 * out0
+        self.win_count += valid.astype(np.float64) - out_valid
+        self.buffer[slot] = x
+        if slot == self.window - 1:
+            # 每转一圈按缓冲区重算一次，避免累加误差
+            self.win_sum = np.nansum(self.buffer, axis=0)
+            self.win_sumsq = np.nansum(self.buffer * self.buffer, axis=0)
+            self.win_count = np.isfinite(self.buffer).sum(axis=0).astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = self.win_sum / self.window
+            std = np.sqrt(np.maximum(self.win_sumsq - self.win_sum * mean, 0) / (self.window - 1))
+            self.zscore = np.where((self.win_count == self.window) & (std > 0), (x - mean) / std, np.nan)
+
+        # 持仓：先平仓再开仓，和 hold_times 的分段口径一致
+        last = np.where(valid, x, self.last)
+        known = np.isfinite(last)
+        close_short = (self.short_at >= 0) & known & (last <= 0)
+        close_long = (self.long_at >= 0) & known & (last >= 0)
+        self.hold_sum += np.where(close_short, self.t - self.short_at, 0) + np.where(close_long, self.t - self.long_at, 0)
+        self.closed += close_short.astype(np.float64) + close_long
+        self.short_at = np.where(close_short, -1, self.short_at)
+        self.long_at = np.where(close_long, -1, self.long_at)
+        # 仓位一直持有到这段正（负）价差结束，所以每段最多开一次；刚平仓的 bar 不开仓，同回测
+        can_open = ~(close_short | close_long)
+        self.short_at = np.where(can_open & (self.short_at < 0) & (last > self.upper), self.t, self.short_at)
+        self.long_at = np.where(can_open & (self.long_at < 0) & (last < self.lower), self.t, self.long_at)
+
+        self.prev = x
+        self.last = last
+        self.t += 1
+        return self.zscore
+
+    def stats(self):
+        still_open = (self.short_at >= 0).astype(np.float64) + (self.long_at >= 0)
+        return _stats_frame(self.symbols, ar1_from_sums(self.sums), self.crossings, self.pairs, self.hold_sum,
+                            self.closed, still_open, self.zscore, self.bar_minutes)
+
+
+if __name__ == '__main__':
+
+    import time
+
+    rng = np.random.default_rng(0)
+    n_bars, n_symbols = 10000, 500
+    b = rng.uniform(0.9, 0.999, n_symbols)
+    noise = rng.normal(0, 0.001, (n_bars, n_symbols))
+    values = np.zeros((n_bars, n_symbols))
+    for t in range(1, n_bars):
+        values[t] = b * values[t - 1] + noise[t]
+    panel = pd.DataFrame(values, index=pd.date_range('2024-01-01', periods=n_bars, freq='1min'),
+                         columns=[f"SYM{i}USDT" for i in range(n_symbols)])
+
+    start = time.perf_counter()
+    stats = mean_reversion_stats(panel, upper=0.004, lower=-0.004)
+    print(f"{n_symbols} symbols x {n_bars} bars: {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(rank_symbols(stats).head(10))
@@ -0,0 +1,265 @@
+"""
+回测结果的蒙特卡洛稳健性分析：
+- 价差序列块自助重采样（stationary bootstrap），保留价差的短期自相关和资金费率的结算节奏
+- 每条路径单独扰动手续费、滑点和开仓阈值，检验阈值选择是否脆弱
+- 所有路径按时间步同时推进，逻辑和 ArbitrageBacktester 一致（开仓、资金费、穿越 0 平仓、结束强平），
+  只是用 numpy 数组一次算完所有路径，不逐条打印
+- 另有基于交易记录的自助法：对 ArbitrageBacktester.run() 的逐笔盈亏有放回重抽
+- 输出每个 symbol 的 PnL 分布、亏损概率、最大回撤分位数；多个 symbol 用进程池并行
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from spread_pipeline import list_symbols, read_history
+
+PNL_QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+DRAWDOWN_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+# 从 merge_diff_fr / read_history 的结果取出模拟需要的列
+# b_ret 为币安价格的对数收益，用于还原平仓时 b_price / entry_price_b
+def prepare_series(df):
+    diff = df['diff_pct'].to_numpy(dtype=np.float64)
+    b_close = df['b_close'].to_numpy(dtype=np.float64)
+    b_ret = np.zeros(len(b_close))
+    b_ret[1:] = np.diff(np.log(b_close))
+    return {
+        'diff': diff,
+        'b_ret': np.nan_to_num(b_ret),
+        'b_fr': pd.to_numeric(df['binance_fr'], errors='coerce').to_numpy(dtype=np.float64),
+        'g_fr': pd.to_numeric(df['gate_fr'], errors='coerce').to_numpy(dtype=np.float64),
+    }
+
+
+# stationary bootstrap：每步以 1/block_len 的概率跳到随机位置，否则顺延一行；逐步产出所有路径的行号
+def stationary_bootstrap(n_rows, n_paths, length=None, block_len=60, rng=None):
+    rng = rng or np.random.default_rng()
+    length = length or n_rows
+    idx = rng.integers(0, n_rows, size=n_paths)
+    p_jump = 1.0 / block_len
+    yield idx
+    for _ in range(length - 1):
+        idx = idx + 1
+        jump = (rng.random(n_paths) < p_jump) | (idx >= n_rows)
+        n_jump = int(jump.sum())
+        if n_jump:
+            idx[jump] = rng.integers(0, n_rows, size=n_jump)
+        yield idx
+
+
+# 原始序列本身，作为基准路径
+def identity_indices(n_rows, n_paths=1):
+    for t in range(n_rows):
+        yield np.full(n_paths, t)
+
+
+# 按行号序列同时模拟所有路径；upper / lower / fee_rate / slippage 可为标量或每条路径一个值
+def simulate_paths(series, indices, n_paths, upper_threshold=0.006, lower_threshold=-0.006, fee_rate=0.0005,
+                   slippage=0.0, notional=10000):
+    diff, b_ret, b_fr, g_fr = series['diff'], series['b_ret'], series['b_fr'], series['g_fr']
+    upper = np.broadcast_to(np.asarray(upper_threshold, dtype=np.float64), (n_paths,))
+    lower = np.broadcast_to(np.asarray(lower_threshold, dtype=np.float64), (n_paths,))
+    # 每次开/平仓两边各付一次手续费和滑点
+    trade_cost = 2 * notional * (np.asarray(fee_rate, dtype=np.float64) + np.asarray(slippage, dtype=np.float64))
+    trade_cost = np.broadcast_to(trade_cost, (n_paths,))
+
+    pos = np.zeros(n_paths)  # 1: short_binance, -1: long_binance
+    entry_diff = np.zeros(n_paths)
+    entry_lp = np.zeros(n_paths)
+    lp = np.zeros(n_paths)  # 币安价格的累计对数收益
+    realized = np.zeros(n_paths)
+    funding = np.zeros(n_paths)
+    fees = np.zeros(n_paths)
+    peak = np.zeros(n_paths)
+    max_dd = np.zeros(n_paths)
+    trades = np.zeros(n_paths, dtype=np.int64)
+    wins = np.zeros(n_paths, dtype=np.int64)
+    x = np.zeros(n_paths)
+
+    # 全部用整列运算 + where，避免每步做布尔索引
+    for idx in indices:
+        x = diff[idx]
+        lp += b_ret[idx]
+        in_pos = pos != 0
+
+        # 资金费：只在持仓期间、两边费率都有时计入（无仓位时 pos 为 0，缺失费率为 nan）
+        fp = np.nan_to_num(notional * pos * (b_fr[idx] - g_fr[idx]), nan=0.0)
+        funding += fp
+        realized += fp
+
+        # 价差盈亏：short_binance 为 N * (b/eb) * (ed - d) / (1 - ed)，long_binance 取反，和回测的两边价差盈亏等价
+        unreal = notional * np.exp(lp - entry_lp) * pos * (entry_diff - x) / (1 - entry_diff)
+
+        # 平仓：价差回到 0 的另一侧
+        closing = in_pos & (pos * x <= 0)
+        close_pnl = np.where(closing, unreal - trade_cost, 0.0)
+        realized += close_pnl
+        fees += closing * trade_cost
+        trades += closing
+        wins += close_pnl > 0
+        pos[closing] = 0
+
+        # 开仓：本步开始时无仓位（同一步平仓后不再开仓，和回测一致）
+        signal = (x > upper).astype(np.float64) - (x < lower)
+        opening = ~in_pos & (signal != 0)
+        pos = np.where(opening, signal, pos)
+        entry_diff = np.where(opening, x, entry_diff)
+        entry_lp = np.where(opening, lp, entry_lp)
+        realized -= opening * trade_cost
+        fees += opening * trade_cost
+
+        # 按盯市权益算回撤
+        equity = realized + np.where(in_pos & ~closing, np.nan_to_num(unreal, nan=0.0), 0.0)
+        np.maximum(peak, equity, out=peak)
+        np.maximum(max_dd, peak - equity, out=max_dd)
+
+    # 结束时仍有仓位则按最后一行强平
+    held = pos != 0
+    if held.any():
+        last = np.where(np.isfinite(x), x, entry_diff)
+        unreal = notional * np.exp(lp - entry_lp) * pos * (entry_diff - last) / (1 - entry_diff)
+        close_pnl = np.where(held, unreal - trade_cost, 0.0)
+        realized += close_pnl
+        fees += held * trade_cost
+        trades += held
+        wins += close_pnl > 0
+        np.maximum(max_dd, peak - realized, out=max_dd)
+
+    return {'pnl': realized, 'funding': funding, 'fees': fees, 'trades': trades, 'wins': wins,
+            'max_drawdown': max_dd}
+
+
+# 在原始序列上跑一次，结果应与 ArbitrageBacktester.run() 的总盈亏一致
+def baseline(df, upper_threshold=0.006, lower_threshold=-0.006, fee_rate=0.0005, notional=10000):
+    series = prepare_series(df)
+    n = len(series['diff'])
+    out = simulate_paths(series, identity_indices(n), 1, upper_threshold, lower_threshold, fee_rate,
+                         notional=notional)
+    return {k: v[0] for k, v in out.items()}
+
+
+# 多条路径的汇总
+def summarize_paths(paths, prefix=''):
+    pnl, dd = paths['pnl'], paths['max_drawdown']
+    row = {
+        f"{prefix}paths": len(pnl),
+        f"{prefix}pnl_mean": pnl.mean(),
+        f"{prefix}pnl_std": pnl.std(),
+        f"{prefix}prob_loss": (pnl < 0).mean(),
+    }
+    for q, v in zip(PNL_QUANTILES, np.quantile(pnl, PNL_QUANTILES)):
+        row[f"{prefix}pnl_p{q * 100:g}"] = v
+    for q, v in zip(DRAWDOWN_QUANTILES, np.quantile(dd, DRAWDOWN_QUANTILES)):
+        row[f"{prefix}dd_p{q * 100:g}"] = v
+    if 'trades' in paths:
+        row[f"{prefix}trades_mean"] = paths['trades'].mean()
+        row[f"{prefix}funding_mean"] = paths['funding'].mean()
+    return row
+
+
+# 蒙特卡洛：块重采样 + 手续费/滑点扰动 + 阈值抖动
+def monte_carlo(df, n_paths=10000, upper_threshold=0.006, lower_threshold=-0.006, fee_rate=0.0005, notional=10000,
+                block_len=60, fee_jitter=0.2, slippage=0.0002, threshold_jitter=0.1, path_batch=5000, seed=None):
+    """
+    fee_jitter: 手续费相对扰动幅度，每条路径 fee_rate * U(1 - j, 1 + j)
+    slippage: 每边每次成交的滑点上限，每条路径 U(0, slippage)
+    threshold_jitter: 开仓阈值相对扰动幅度，两边阈值分别抖动
+    path_batch: 每批同时推进的路径数，控制内存
+    """
+    rng = np.random.default_rng(seed)
+    series = prepare_series(df)
+    n_rows = len(series['diff'])
+
+    batches = []
+    for start in range(0, n_paths, path_batch):
+        m = min(path_batch, n_paths - start)
+        fees = fee_rate * rng.uniform(1 - fee_jitter, 1 + fee_jitter, m)
+        slips = rng.uniform(0, slippage, m) if slippage else 0.0
+        upper = upper_threshold * rng.uniform(1 - threshold_jitter, 1 + threshold_jitter, m)
+        lower = lower_threshold * rng.uniform(1 - threshold_jitter, 1 + threshold_jitter, m)
+        indices = stationary_bootstrap(n_rows, m, block_len=block_len, rng=rng)
+        batches.append(simulate_paths(series, indices, m, upper, lower, fees, slips, notional))
+
+    return {k: np.concatenate([b[k] for b in batches]) for k in batches[0]}
+
+
+# 把 ArbitrageBacktester.run() 的记录按开仓 -> 资金费 -> 平仓归并成逐笔盈亏
+def trade_pnls(result_df):
+    if result_df is None or result_df.empty:
+        return np.array([])
+    trade_id = (result_df['type'] == 'open_position').cumsum()
+    closed = result_df.groupby(trade_id)['type'].transform(lambda s: (s == 'close_position').any())
+    return result_df[closed & (trade_id > 0)].groupby(trade_id)['pnl'].sum().to_numpy(dtype=np.float64)
+
+
+# 交易记录自助法：逐笔盈亏有放回重抽，顺序也随之打乱，得到总盈亏和回撤分布
+def bootstrap_trades(result_df, n_paths=10000, seed=None):
+    pnls = trade_pnls(result_df)
+    if pnls.size == 0:
+        return None
+    rng = np.random.default_rng(seed)
+    sample = pnls[rng.integers(0, pnls.size, size=(n_paths, pnls.size))]
+    equity = np.cumsum(sample, axis=1)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), 0)
+    return {'pnl': equity[:, -1], 'max_drawdown': (peak - equity).max(axis=1)}
+
+
+# 单个 symbol 的完整稳健性分析，供进程池调用
+def analyze_symbol(root, symbol, n_paths=10000, seed=None, **params):
+    df = read_history(root, symbol, columns=['b_close', 'diff_pct', 'binance_fr', 'gate_fr']).dropna(subset=['diff_pct'])
+    thresholds = {k: params[k] for k in ('upper_threshold', 'lower_threshold', 'fee_rate', 'notional') if k in params}
+    row = {'symbol': symbol, 'rows': len(df)}
+    row.update({f"base_{k}": v for k, v in baseline(df, **thresholds).items()})
+    row.update(summarize_paths(monte_carlo(df, n_paths=n_paths, seed=seed, **params)))
+    return row
+
+
+def _analyze_symbol_args(args):
+    root, symbol, n_paths, seed, params = args
+    return analyze_symbol(root, symbol, n_paths=n_paths, seed=seed, **params)
+
+
+# 全市场稳健性分析；每个 symbol 用独立的随机种子，结果可复现
+def analyze_universe(root, symbols=None, n_paths=10000, workers=None, seed=0, out_path=None, **params):
+    symbols = symbols or list_symbols(root)
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(symbols)))
+    seeds = np.random.SeedSequence(seed).spawn(len(symbols))
+
+    tasks = [(root, s, n_paths, ss, params) for s, ss in zip(symbols, seeds)]
+    if workers == 1:
+        rows = [_analyze_symbol_args(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = list(pool.map(_analyze_symbol_args, tasks))
+
+    result = pd.DataFrame(rows).set_index('symbol')
+    if out_path:
+        result.to_parquet(out_path)
+    return result
+
+
+if __name__ == '__main__':
+
+    from analysis_utils import AnalysisUtils
+    from arbitrage_backtester import ArbitrageBacktester
+
+    symbol = 'BIDUSDT'
+    analyzer = AnalysisUtils()
+    df = analyzer.merge_diff_fr(symbol)
+
+    bt = ArbitrageBacktester(df, upper_threshold=0.008, lower_threshold=-0.005)
+    result_df = bt.run()
+    print(f"回测总盈亏：{result_df['pnl'].sum():.4f}")
+
+    paths = monte_carlo(df, n_paths=10000, upper_threshold=0.008, lower_threshold=-0.005, seed=42)
+    print(pd.Series(summarize_paths(paths)))
+    trades = bootstrap_trades(result_df, n_paths=10000, seed=42)
+    if trades is not None:
+        print(pd.Series(summarize_paths(trades, prefix='trade_')))
+
+    # root = 'DATA/history'
+    # print(analyze_universe(root, n_paths=10000, out_path='DATA/robustness.parquet'))
@@ -0,0 +1,263 @@
+"""
+多月价差的流式分析模块（内存有上限）：
+- 历史数据按 symbol / 月份分区存成 parquet：{root}/{symbol}/{YYYY-MM}.parquet
+- 逐块读取，每个 symbol 维护可合并的流式统计（直方图分位数、阈值穿越次数、资金费率 carry）
+- 多个 symbol 用进程池并行，块大小按内存上限推算
+- 输出 diff_all.parquet 的增强版：quantile0~10、range_2_8、range_2_7 之外加上均值/标准差/穿越/carry
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+HISTORY_COLUMNS = ['diff_pct', 'binance_fr', 'gate_fr']
+DEFAULT_THRESHOLDS = (0.002, 0.003, 0.004, 0.005, 0.006, 0.008, 0.01)
+
+# 直方图范围和精度：|diff_pct| <= 20%，桶宽 1e-5
+HIST_BOUND = 0.2
+HIST_BINS = 40000
+
+# 每行估算占用：3 列 float64，arrow 批 + numpy 临时数组约 4 倍
+BYTES_PER_ROW = len(HISTORY_COLUMNS) * 8 * 4
+
+
+# 把 merge_diff_fr 的结果按月写入分区，和已有分区按时间去重合并
+def write_history(root, symbol, merged_df):
+    df = merged_df[['b_close', 'g_close', 'diff_pct', 'binance_fr', 'gate_fr']].copy()
+    df[['binance_fr', 'gate_fr']] = df[['binance_fr', 'gate_fr']].apply(pd.to_numeric, errors='coerce')
+    df.index = pd.to_datetime(df.index)
+    df.index.name = 'time'
+
+    symbol_dir = os.path.join(root, symbol)
+    os.makedirs(symbol_dir, exist_ok=True)
+    for month, part in df.groupby(df.index.strftime('%Y-%m')):
+        path = os.path.join(symbol_dir, f"{month}.parquet")
+        if os.path.exists(path):
+            part = pd.concat([pd.read_parquet(path), part])
+            part = part[~part.index.duplicated(keep='last')]
+        part.sort_index().to_parquet(path)
+
+
+# 用 AnalysisUtils 拉取并落盘多个 symbol 的历史
+def download_history(analyzer, symbols, root, interval='1m', limit=1500):
+    for symbol in symbols:
+        print(f"saving history for {symbol}...")
+        try:
+            write_history(root, symbol, analyzer.merge_diff_fr(symbol, interval=interval, limit=limit))
+        except Exception as e:
+            print(f"Can't save history for {symbol}: {e}")
+
+
+def list_symbols(root):
+    return sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)))
+
+
+# 按时间顺序逐块读取某 symbol 的历史，每块返回 {列名: numpy 数组}
+def iter_history(root, symbol, batch_size=1_000_000, columns=HISTORY_COLUMNS):
+    symbol_dir = os.path.join(root, symbol)
+    for name in sorted(f for f in os.listdir(symbol_dir) if f.endswith('.parquet')):
+        parquet_file = pq.ParquetFile(os.path.join(symbol_dir, name))
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=list(columns)):
+            yield {col: batch.column(col).to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+                   for col in columns}
+
+
+# 读取某 symbol 的完整历史为 DataFrame（index 为 time），用于画图等需要整段序列的场景
+def read_history(root, symbol, columns=HISTORY_COLUMNS):
+    symbol_dir = os.path.join(root, symbol)
+    paths = [os.path.join(symbol_dir, f) for f in sorted(os.listdir(symbol_dir)) if f.endswith('.parquet')]
+    return pd.concat([pd.read_parquet(p, columns=list(columns)) for p in paths]).sort_index()
+
+
+class SpreadAggregate:
+    # 单个 symbol 的流式统计；按时间顺序 update，多个相邻分段可以 merge
+    def __init__(self, thresholds=DEFAULT_THRESHOLDS, bound=HIST_BOUND, bins=HIST_BINS):
+        self.thresholds = np.asarray(thresholds, dtype=np.float64)
+        self.bound = bound
+        self.bins = bins
+        self.hist = np.zeros(bins + 2, dtype=np.int64)  # 首尾两个桶为越界计数
+        self.count = 0
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.cross_up = np.zeros(len(self.thresholds), dtype=np.int64)    # 向上穿越 +thr
+        self.cross_down = np.zeros(len(self.thresholds), dtype=np.int64)  # 向下穿越 -thr
+        self.first = None
+        self.last = None
+        self.fr_count = 0
+        self.carry_sum = 0.0  # sum(binance_fr - gate_fr)，short_binance 方向每单位名义本金的资金费收益
+        self.b_fr_sum = 0.0
+        self.g_fr_sum = 0.0
+
+    def _bin_index(self, x):
+        idx = np.floor((x + self.bound) / (2 * self.bound) * self.bins).astype(np.int64) + 1
+        return np.clip(idx, 0, self.bins + 1)
+
+    def _crossings(self, prev, cur):
+        prev = prev[:, None]
+        cur = cur[:, None]
+        up = ((prev <= self.thresholds) & (cur > self.thresholds)).sum(axis=0)
+        down = ((prev >= -self.thresholds) & (cur < -self.thresholds)).sum(axis=0)
+        return up, down
+
+    def update(self, diff, b_fr=None, g_fr=None):
+        x = diff[np.isfinite(diff)]
+        if x.size:
+            self.hist += np.bincount(self._bin_index(x), minlength=self.bins + 2)
+            self.count += x.size
+            self.sum += x.sum()
+            self.sumsq += np.dot(x, x)
+            self.min = min(self.min, x.min())
+            self.max = max(self.max, x.max())
+
+            series = x if self.last is None else np.concatenate([[self.last], x])
+            up, down = self._crossings(series[:-1], series[1:])
+            self.cross_up += up
+            self.cross_down += down
+            if self.first is None:
+                self.first = x[0]
+            self.last = x[-1]
+
+        if b_fr is not None and g_fr is not None:
+            both = np.isfinite(b_fr) & np.isfinite(g_fr)
+            if both.any():
+                self.fr_count += int(both.sum())
+                self.b_fr_sum += b_fr[both].sum()
+                self.g_fr_sum += g_fr[both].sum()
+                self.carry_sum += (b_fr[both] - g_fr[both]).sum()
+        return self
+
+    # other 为紧接在 self 之后的时间段
+    def merge(self, other):
+        self.hist += other.hist
+        if self.last is not None and other.first is not None:
+            up, down = self._crossings(np.array([self.last]), np.array([other.first]))
+            self.cross_up += up
+            self.cross_down += down
+        self.cross_up += other.cross_up
+        self.cross_down += other.cross_down
+        self.count += other.count
+        self.sum += other.sum
+        self.sumsq += other.sumsq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if self.first is None:
+            self.first = other.first
+        if other.last is not None:
+            self.last = other.last
+        self.fr_count += other.fr_count
+        self.carry_sum += other.carry_sum
+        self.b_fr_sum += other.b_fr_sum
+        self.g_fr_sum += other.g_fr_sum
+        return self
+
+    # 从直方图插值求分位数，首尾用精确的 min / max
+    def quantiles(self, qs):
+        if self.count == 0:
+            return np.full(len(qs), np.nan)
+        cdf = np.cumsum(self.hist)
+        width = 2 * self.bound / self.bins
+        out = []
+        for q in qs:
+            if q <= 0:
+                out.append(self.min)
+                continue
+            if q >= 1:
+                out.append(self.max)
+                continue
+            rank = q * self.count
+            idx = int(np.searchsorted(cdf, rank))
+            below = cdf[idx - 1] if idx > 0 else 0
+            frac = (rank - below) / self.hist[idx] if self.hist[idx] else 0.0
+            value = -self.bound + (idx - 1 + frac) * width
+            out.append(min(max(value, self.min), self.max))
+        return np.array(out)
+
+    def result(self):
+        row = {}
+        for i, value in enumerate(self.quantiles([i / 10 for i in range(11)])):
+            row[f"quantile{i}"] = value
+        row['range_2_8'] = row['quantile8'] - row['quantile2']
+        row['range_2_7'] = row['quantile7'] - row['quantile2']
+
+        mean = self.sum / self.count if self.count else np.nan
+        row['count'] = self.count
+        row['mean'] = mean
+        row['std'] = np.sqrt(max(self.sumsq / self.count - mean ** 2, 0.0)) if self.count else np.nan
+        row['min'] = self.min if self.count else np.nan
+        row['max'] = self.max if self.count else np.nan
+        row['out_of_range'] = int(self.hist[0] + self.hist[-1])
+
+        for thr, up, down in zip(self.thresholds, self.cross_up, self.cross_down):
+            row[f"cross_up_{thr:g}"] = int(up)
+            row[f"cross_down_{thr:g}"] = int(down)
+            # 每 1000 根K线的开仓信号次数
+            row[f"cross_per_1k_{thr:g}"] = (up + down) * 1000 / self.count if self.count else np.nan
+
+        row['fr_count'] = self.fr_count
+        row['binance_fr_mean'] = self.b_fr_sum / self.fr_count if self.fr_count else np.nan
+        row['gate_fr_mean'] = self.g_fr_sum / self.fr_count if self.fr_count else np.nan
+        row['carry_sum'] = self.carry_sum
+        row['carry_mean'] = self.carry_sum / self.fr_count if self.fr_count else np.nan
+        return row
+
+
+# 单个 symbol 的流式分析，供进程池调用
+def analyze_symbol(root, symbol, batch_size=1_000_000, thresholds=DEFAULT_THRESHOLDS):
+    agg = SpreadAggregate(thresholds=thresholds)
+    for chunk in iter_history(root, symbol, batch_size=batch_size):
+        agg.update(chunk['diff_pct'], chunk['binance_fr'], chunk['gate_fr'])
+    row = agg.result()
+    row['symbol'] = symbol
+    return row
+
+
+# 单个 symbol 出错（目录为空、文件损坏等）只跳过该 symbol，不影响其他 worker
+def _analyze_symbol_args(args):
+    try:
+        return analyze_symbol(*args)
+    except Exception as e:
+        print(f"Can't analyze {args[1]}: {e}")
+        return None
+
+
+# 全市场分析：memory_limit_mb 为所有 worker 合计的数据块内存上限
+# 没有 symbol 或全部失败时返回列齐全的空表
+def analyze_universe(root, symbols=None, workers=None, memory_limit_mb=1024, thresholds=DEFAULT_THRESHOLDS,
+                     out_path=None):
+    symbols = symbols or list_symbols(root)
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(symbols)))
+
+    per_worker = memory_limit_mb * 1024 * 1024 / workers
+    # 每个 worker 常驻的直方图等统计量也要算进预算
+    state_bytes = (HIST_BINS + 2) * 8 * 2
+    batch_size = max(10_000, int((per_worker - state_bytes) / BYTES_PER_ROW))
+
+    tasks = [(root, s, batch_size, tuple(thresholds)) for s in symbols]
+    if workers == 1:
+        rows = [_analyze_symbol_args(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = list(pool.map(_analyze_symbol_args, tasks))
+
+    columns = ['symbol', *SpreadAggregate(thresholds=thresholds).result()]
+    result = pd.DataFrame([row for row in rows if row is not None], columns=columns).set_index('symbol')
+    if out_path:
+        result.to_parquet(out_path)
+    return result
+
+
+if __name__ == '__main__':
+
+    from analysis_utils import AnalysisUtils
+
+    root = 'DATA/history'
+    # analyzer = AnalysisUtils()
+    # download_history(analyzer, ['AIOTUSDT', 'BIDUSDT'], root=root, interval='1m', limit=1500)
+
+    diff_all = analyze_universe(root, memory_limit_mb=512, out_path='DATA/diff_all_stream.parquet')
+    print(diff_all[diff_all['range_2_8'] >= 0.005])
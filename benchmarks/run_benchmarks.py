@@ -0,0 +1,369 @@
+"""
+热点路径 benchmark：
+- ArbitrageBacktester.run
+- AnalysisUtils.merge_klines / merge_fr / merge_diff_fr
+- BinanceWSClient / GateWSClient 的消息 handler
+- SharedMarketData.update / get_snapshot
+
+全部使用 synthetic.py 生成的离线数据，输出吞吐量和内存峰值，并与 baselines.json 对比。
+仓库里的 baselines.json 是参考机器上默认规模的结果，对比方式：
+- 每项先预热一次，再至少跑 repeat 次、累计不少于 MIN_MEASURE_SECONDS，取最快一次；计时期间关掉循环 GC
+- 计时之间穿插一段固定的校准负载，整轮运行里最快的一次作为本机速度，和结果一起写入 baseline；
+  对比时按 本轮校准 / baseline 校准 换算，换机器不算回退（共享机器上单次校准波动很大，所以取整轮最快）
+- baseline 耗时不到 --min-seconds（默认 0.1 秒）的项只输出结果不判定回退，这么短的用例单次抖动就超过容忍度
+
+用法（在项目根目录）：
+    python benchmarks/run_benchmarks.py                 # 默认规模
+    python benchmarks/run_benchmarks.py --full          # 含 1M / 10M 行、500 symbols
+    python benchmarks/run_benchmarks.py --only merge    # 只跑名称包含 merge 的项
+    python benchmarks/run_benchmarks.py --save-baseline # 把本次结果写为新的 baseline
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, 'analysis'), os.path.join(ROOT_DIR, 'market_data')):
+    if path not in sys.path:
+        sys.path.append(path)
+
+import matplotlib
+import numpy as np
+import pandas as pd
+matplotlib.use('Agg')
+
+import synthetic
+from analysis_utils import AnalysisUtils
+from arbitrage_backtester import ArbitrageBacktester
+from market_data.shared_data import SharedMarketData
+from market_data.ws_market_data import BinanceWSClient, GateWSClient
+
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baselines.json')
+
+MIN_MEASURE_SECONDS = 1.0  # 短用例重复到累计这么久再取最快一次
+MAX_REPEAT = 1000
+MIN_COMPARE_SECONDS = 0.1
+CALIBRATION_INTERVAL = 0.05
+
+DEFAULT_ROWS = [1_000, 100_000]
+FULL_ROWS = DEFAULT_ROWS + [1_000_000, 10_000_000]
+DEFAULT_SYMBOLS = [1, 50]
+FULL_SYMBOLS = [1, 50, 500]
+
+# iterrows 逐行回测，10M 行在普通机器上要跑很久，单独限制
+BACKTEST_MAX_ROWS = 1_000_000
+
+
+# 一个 benchmark 用例：setup 准备数据（不计时），run 为被测代码
+class BenchCase:
+    def __init__(self, name, size, setup, run, items):
+        self.name = name
+        self.size = size
+        self.setup = setup
+        self.run = run
+        self.items = items
+
+    @property
+    def key(self):
+        return f"{self.name}[{self.size}]"
+
+
+# 计时（预热一次后 best of repeat，短用例多跑几次）和内存峰值（tracemalloc 单独跑一次，避免干扰计时）
+# 计时之间穿插校准负载（短用例每 CALIBRATION_INTERVAL 秒一次），calibration 为其中最快一次
+def measure(case, repeat=3, min_time=MIN_MEASURE_SECONDS):
+    state = case.setup()
+    case.run(state)  # 预热：首次调用的导入、缓存和分配不计入
+    times = []
+    calibrations = []
+    last_calibration = None
+    while len(times) < repeat or (sum(times) < min_time and len(times) < MAX_REPEAT):
+        if len(times) < repeat:  # 补跑的短用例不再逐次 collect，collect 本身比用例还慢
+            gc.collect()
+        if last_calibration is None or time.perf_counter() - last_calibration > CALIBRATION_INTERVAL:
+            calibrations.append(calibrate())
+            last_calibration = time.perf_counter()
+        # 和 timeit 一样计时期间关掉循环 GC，分代回收的触发时机随堆状态变化，是耗时抖动的主要来源
+        gc.disable()
+        try:
+            t0 = time.perf_counter()
+            case.run(state)
+            times.append(time.perf_counter() - t0)
+        finally:
+            gc.enable()
+    calibrations.append(calibrate())
+
+    gc.collect()
+    tracemalloc.start()
+    case.run(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(times)
+    return {
+        'seconds': best,
+        'throughput': case.items / best if best > 0 else float('inf'),
+        'peak_mb': peak / 1024 / 1024,
+        'calibration': min(calibrations),
+    }
+
+
+def _quiet(func, *args, **kwargs):
+    # 回测会逐笔 print，benchmark 时丢弃输出
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return func(*args, **kwargs)
+
+
+def backtest_cases(rows):
+    cases = []
+    for n in rows:
+        if n > BACKTEST_MAX_ROWS:
+            continue
+        cases.append(BenchCase(
+            name='backtester.run', size=n, items=n,
+            setup=lambda n=n: synthetic.merged_diff_fr_df(n),
+            run=lambda df: _quiet(ArbitrageBacktester(df, upper_threshold=0.002, lower_threshold=-0.002).run),
+        ))
+    return cases
+
+
+def merge_cases(rows):
+    cases = []
+    for n in rows:
+        def setup_klines(n=n):
+            b_close, g_close = synthetic.paired_closes(n)
+            return synthetic.binance_klines_df(n, close=b_close), synthetic.gate_klines_df(n, close=g_close)
+
+        cases.append(BenchCase(
+            name='merge_klines', size=n, items=n, setup=setup_klines,
+            run=lambda dfs: AnalysisUtils.merge_klines(binance_df=dfs[0], gate_df=dfs[1]),
+        ))
+
+        # 资金费率 8 小时一次，行数远少于K线；这里直接按 n 条结算记录生成
+        cases.append(BenchCase(
+            name='merge_fr', size=n, items=n,
+            setup=lambda n=n: (synthetic.binance_funding_df(n), synthetic.gate_funding_df(n)),
+            run=lambda dfs: AnalysisUtils.merge_fr(binance_df=dfs[0], gate_df=dfs[1]),
+        ))
+
+        def setup_analyzer(n=n):
+            analyzer = AnalysisUtils.__new__(AnalysisUtils)
+            analyzer.bdata_handler = synthetic.SyntheticBinanceDataHandler()
+            analyzer.gdata_handler = synthetic.SyntheticGateDataHandler()
+            return analyzer
+
+        cases.append(BenchCase(
+            name='merge_diff_fr', size=n, items=n, setup=setup_analyzer,
+            run=lambda analyzer, n=n: analyzer.merge_diff_fr('BTCUSDT', interval='1m', limit=n),
+        ))
+    return cases
+
+
+# 固定的校准负载（约几毫秒）：纯 Python 循环、json 解析、小对象分配、数组遍历和 iterrows，
+# 和被测用例一样受 CPU 频率、缓存和内存带宽影响，用来换算 baseline
+CALIBRATION_FRAME = json.dumps({'b': [[f"{i:.2f}", "1.0"] for i in range(200)]})
+CALIBRATION_ARRAY = np.linspace(0.0, 1.0, 500_000)
+CALIBRATION_DF = pd.DataFrame({'a': np.arange(50.0), 'b': np.arange(50.0)})
+
+
+def calibrate(n=10_000):
+    t0 = time.perf_counter()
+    total = 0.0
+    for i in range(n):
+        total += math.sqrt(i) * (i % 7)
+    for _ in range(10):
+        total += len(json.loads(CALIBRATION_FRAME)['b'])
+    rows = [{'p': i, 'q': str(i)} for i in range(3000)]
+    total += len(rows) + float(np.cumsum(CALIBRATION_ARRAY)[-1])
+    for _, row in CALIBRATION_DF.iterrows():
+        total += row['a']
+    return time.perf_counter() - t0
+
+
+# handler 是 async 函数，批量消息在一个 event loop 里顺序处理，与真实接收循环一致
+# state: (clients, calls)，calls 为 [(handler, msg)]，每条消息交给对应 symbol 的 client
+# Gate client 每轮从空快照开始，否则重复跑时增量都是旧序号，会被当作过期推送跳过
+def _drive_handlers(state):
+    clients, calls = state
+    for client in clients:
+        if isinstance(client, GateWSClient):
+            client.book.load_snapshot(0, [], [])
+
+    async def _run():
+        for handler, msg in calls:
+            await handler(msg)
+    asyncio.run(_run())
+
+
+def ws_cases(rows, symbols):
+    cases = []
+    sink = SharedMarketData()
+    frame_counts = [n for n in rows if n <= 1_000_000]
+    for n in frame_counts:
+        for n_symbols in symbols:
+            size = f"{n}x{n_symbols}"
+            specs = [
+                ('ws.binance_mark_price', BinanceWSClient, '_handle_mark_price', synthetic.binance_mark_price_frames),
+                ('ws.binance_orderbook', BinanceWSClient, '_handle_orderbook', synthetic.binance_depth_frames),
+                ('ws.gate_ticker', GateWSClient, '_handle_ticker', synthetic.gate_ticker_frames),
+                ('ws.gate_orderbook', GateWSClient, '_handle_orderbook', synthetic.gate_orderbook_frames),
+            ]
+            for name, client_cls, handler_name, frame_func in specs:
+                def setup(client_cls=client_cls, handler_name=handler_name, frame_func=frame_func,
+                          n=n, n_symbols=n_symbols):
+                    # 和实盘一样每个 symbol 一个 client；synthetic 的第 i 帧属于 symbols[i % n_symbols]
+                    symbols = synthetic.symbol_names(n_symbols)
+                    if client_cls is GateWSClient:
+                        symbols = [s.replace('USDT', '_USDT') for s in symbols]
+                    clients = [client_cls(symbol=s, on_update=sink.update, proxy=None) for s in symbols]
+                    handlers = [getattr(client, handler_name) for client in clients]
+                    frames = frame_func(n, n_symbols=n_symbols)
+                    return clients, [(handlers[i % n_symbols], synthetic.FakeWSMessage(f)) for i, f in enumerate(frames)]
+
+                cases.append(BenchCase(
+                    name=name, size=size, items=n, setup=setup,
+                    run=_drive_handlers,
+                ))
+    return cases
+
+
+def shared_data_cases(rows, symbols):
+    cases = []
+    for n in [n for n in rows if n <= 1_000_000]:
+        for n_symbols in symbols:
+            def setup(n=n, n_symbols=n_symbols):
+                updates = [{
+                    'source': 'binance' if i % 2 else 'gate',
+                    'symbol': f"SYM{i % n_symbols}USDT",
+                    'price': 100.0 + i * 1e-4,
+                } for i in range(n)]
+                return SharedMarketData(), updates
+
+            def run(state):
+                shared, updates = state
+                for data in updates:
+                    shared.update(data)
+
+            cases.append(BenchCase(name='shared_data.update', size=f"{n}x{n_symbols}", items=n,
+                                   setup=setup, run=run))
+
+    # 读快照的次数与行数无关，单独按去重后的规模生成
+    for reads in sorted({min(n, 100_000) for n in rows}):
+        for n_symbols in symbols:
+            def setup_snapshot(reads=reads, n_symbols=n_symbols):
+                shared = SharedMarketData()
+                for i in range(n_symbols * 2):
+                    shared.update({'source': 'binance' if i % 2 else 'gate',
+                                   'symbol': f"SYM{i // 2}USDT", 'price': 100.0})
+                return shared, reads
+
+            def run_snapshot(state):
+                shared, reads = state
+                for _ in range(reads):
+                    shared.get_snapshot()
+
+            cases.append(BenchCase(name='shared_data.get_snapshot', size=f"{reads}x{n_symbols}",
+                                   items=reads, setup=setup_snapshot, run=run_snapshot))
+    return cases
+
+
+# baseline 文件：用例 key -> 结果（含同时测得的校准耗时）
+def load_baselines(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baselines(results, path=BASELINE_FILE):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+# 与 baseline 对比：耗时（按两边的校准耗时换算后）或内存峰值超出容忍度即视为回退
+# calibration 为本轮的校准耗时；baseline 耗时低于 min_seconds 只看不判定；没有校准记录的旧 baseline 按原始耗时比
+def compare(result, baseline, calibration, time_tolerance, mem_tolerance, min_seconds=MIN_COMPARE_SECONDS):
+    if not baseline:
+        return 'new', ''
+    scale = calibration / baseline['calibration'] if baseline.get('calibration') else 1.0
+    expected = baseline['seconds'] * scale
+    time_ratio = result['seconds'] / expected if expected else 1.0
+    mem_ratio = result['peak_mb'] / baseline['peak_mb'] if baseline['peak_mb'] else 1.0
+    detail = f"time x{time_ratio:.2f}, mem x{mem_ratio:.2f}"
+    if baseline['seconds'] < min_seconds:
+        return 'short', detail
+    if time_ratio > 1 + time_tolerance or mem_ratio > 1 + mem_tolerance:
+        return 'REGRESSION', detail
+    return 'ok', detail
+
+
+def build_cases(full=False):
+    rows = FULL_ROWS if full else DEFAULT_ROWS
+    symbols = FULL_SYMBOLS if full else DEFAULT_SYMBOLS
+    return backtest_cases(rows) + merge_cases(rows) + ws_cases(rows, symbols) + shared_data_cases(rows, symbols)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Hot path benchmarks on synthetic data')
+    parser.add_argument('--full', action='store_true', help='include 1M / 10M rows and 500 symbols')
+    parser.add_argument('--only', default=None, help='only run cases whose name contains this string')
+    parser.add_argument('--max-rows', type=int, default=None, help='skip cases larger than this many items')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--time-tolerance', type=float, default=0.25)
+    parser.add_argument('--mem-tolerance', type=float, default=0.10)
+    parser.add_argument('--min-seconds', type=float, default=MIN_COMPARE_SECONDS,
+                        help='do not flag cases whose baseline is faster than this')
+    args = parser.parse_args(argv)
+
+    baselines = load_baselines(args.baseline)
+    results = {}
+    regressions = []
+
+    # 先全部测完，本轮校准取所有用例里最快的一次，再逐项对比
+    for case in build_cases(full=args.full):
+        if args.only and args.only not in case.name:
+            continue
+        if args.max_rows and case.items > args.max_rows:
+            continue
+        print(f"measuring {case.key}...", flush=True)
+        results[case.key] = measure(case, repeat=args.repeat)
+    if not results:
+        return 0
+    calibration = min(result['calibration'] for result in results.values())
+    base_calibrations = [b['calibration'] for key, b in baselines.items() if key in results and b.get('calibration')]
+    if base_calibrations:
+        print(f"\ncalibration {calibration * 1000:.2f} ms, baseline {min(base_calibrations) * 1000:.2f} ms")
+
+    print(f"\n{'case':<42}{'seconds':>10}{'items/s':>14}{'peak MB':>10}  status")
+    for key, result in results.items():
+        result['calibration'] = calibration
+        status, detail = compare(result, baselines.get(key), calibration, args.time_tolerance, args.mem_tolerance,
+                                 args.min_seconds)
+        if status == 'REGRESSION':
+            regressions.append(key)
+        print(f"{key:<42}{result['seconds']:>10.4f}{result['throughput']:>14,.0f}"
+              f"{result['peak_mb']:>10.1f}  {status} {detail}")
+
+    if args.save_baseline:
+        merged = dict(baselines)
+        merged.update(results)
+        save_baselines(merged, args.baseline)
+        print(f"baseline saved to {args.baseline}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""
+离线合成数据生成模块（benchmark 用，不依赖交易所连接）：
+- Binance / Gate 合约K线、资金费率历史，格式与 analysis/data.py 返回一致
+- Binance / Gate orderbook
+- Binance markPrice/depth、Gate tickers/order_book_update 的 websocket 消息
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+MINUTE_MS = 60_000
+FUNDING_INTERVAL_MS = 8 * 60 * 60 * 1000
+DEFAULT_START_MS = 1_748_000_000_000 // MINUTE_MS * MINUTE_MS
+
+
+# 价差：均值回归的 OU 过程，模拟两个平台间的 diff_pct
+def ou_spread(n, theta=0.05, sigma=0.0015, mu=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(0.0, sigma, n)
+    spread = np.empty(n)
+    x = mu
+    # 分块用闭式解递推，避免大 n 时纯 python 循环过慢；块长保证 decay**-k 不溢出
+    decay = 1.0 - theta
+    block = max(1, int(30 / -np.log(decay)))
+    for start in range(0, n, block):
+        chunk = noise[start:start + block]
+        powers = decay ** np.arange(1, len(chunk) + 1)
+        spread[start:start + len(chunk)] = powers * (x - mu + np.cumsum(chunk / powers)) + mu
+        x = spread[start + len(chunk) - 1]
+    return spread
+
+
+# 价格：几何随机游走
+def random_walk_prices(n, start_price=100.0, vol=0.0008, seed=0):
+    rng = np.random.default_rng(seed + 1)
+    return start_price * np.exp(np.cumsum(rng.normal(0.0, vol, n)))
+
+
+# 由 close 序列派生 open/high/low/volume
+def _ohlcv(close, seed=0):
+    rng = np.random.default_rng(seed + 2)
+    n = len(close)
+    open_ = np.empty(n)
+    open_[0] = close[0]
+    open_[1:] = close[:-1]
+    wick = np.abs(rng.normal(0.0, 0.0004, n)) * close
+    high = np.maximum(open_, close) + wick
+    low = np.minimum(open_, close) - wick
+    volume = rng.gamma(2.0, 500.0, n)
+    return open_, high, low, volume
+
+
+# 两个平台一致的 close 价格（gate = binance * (1 - diff_pct)）
+def paired_closes(n, start_price=100.0, seed=0):
+    b_close = random_walk_prices(n, start_price=start_price, seed=seed)
+    spread = ou_spread(n, seed=seed)
+    g_close = b_close * (1.0 - spread)
+    return b_close, g_close
+
+
+# Binance futures_klines 原始返回（list of list，数字为字符串）
+def binance_klines_raw(n, start_ms=DEFAULT_START_MS, interval_ms=MINUTE_MS, start_price=100.0, seed=0):
+    close = random_walk_prices(n, start_price=start_price, seed=seed)
+    open_, high, low, volume = _ohlcv(close, seed=seed)
+    open_time = start_ms + np.arange(n, dtype=np.int64) * interval_ms
+    rows = []
+    for i in range(n):
+        rows.append([int(open_time[i]), f"{open_[i]:.6f}", f"{high[i]:.6f}", f"{low[i]:.6f}",
+                     f"{close[i]:.6f}", f"{volume[i]:.3f}", int(open_time[i] + interval_ms - 1),
+                     f"{volume[i] * close[i]:.4f}", 100, "0", "0", "0"])
+    return rows
+
+
+# 与 BinanceDataHandler.get_future_klines 返回格式一致
+def binance_klines_df(n, start_ms=DEFAULT_START_MS, interval_ms=MINUTE_MS, close=None, seed=0):
+    if close is None:
+        close = random_walk_prices(n, seed=seed)
+    open_, high, low, volume = _ohlcv(close, seed=seed)
+    index = pd.to_datetime(start_ms + np.arange(n, dtype=np.int64) * interval_ms, unit='ms')
+    df = pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume},
+                      index=pd.Index(index, name='Date'))
+    return df
+
+
+# 与 GateDataHandler.get_future_klines 返回格式一致
+def gate_klines_df(n, start_ms=DEFAULT_START_MS, interval_ms=MINUTE_MS, close=None, seed=0):
+    if close is None:
+        close = random_walk_prices(n, seed=seed)
+    open_, high, low, volume = _ohlcv(close, seed=seed + 10)
+    ts = (start_ms + np.arange(n, dtype=np.int64) * interval_ms) // 1000
+    return pd.DataFrame({
+        'timestamp': ts,
+        'time': pd.to_datetime(ts, unit='s'),
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': volume,
+        'sum': volume * close,
+    })
+
+
+# 与 BinanceDataHandler.get_funding_rate_history 返回格式一致（费率为字符串）
+def binance_funding_df(n, symbol='BTCUSDT', start_ms=DEFAULT_START_MS, seed=0):
+    rng = np.random.default_rng(seed + 3)
+    funding_time = start_ms + np.arange(n, dtype=np.int64) * FUNDING_INTERVAL_MS
+    rates = rng.normal(0.0001, 0.0003, n)
+    df = pd.DataFrame({
+        'symbol': symbol,
+        'fundingTime': funding_time,
+        'binance_fr': [f"{r:.8f}" for r in rates],
+        'markPrice': [f"{p:.6f}" for p in random_walk_prices(n, seed=seed)],
+    })
+    df['Date'] = pd.to_datetime(df['fundingTime'] // 1000, unit='s')
+    return df
+
+
+# 与 GateDataHandler.get_funding_rate_history 返回格式一致
+def gate_funding_df(n, symbol='BTC_USDT', start_ms=DEFAULT_START_MS, seed=0):
+    rng = np.random.default_rng(seed + 4)
+    funding_ts = (start_ms + np.arange(n, dtype=np.int64) * FUNDING_INTERVAL_MS) // 1000
+    df = pd.DataFrame({'gate_fr': rng.normal(0.0001, 0.0003, n), 'funding_ts': funding_ts})
+    df['funding_time'] = pd.to_datetime(df['funding_ts'], unit='s')
+    df['symbol'] = symbol
+    return df
+
+
+# merge_diff_fr 的输出格式，直接喂给 ArbitrageBacktester
+def merged_diff_fr_df(n, interval_ms=MINUTE_MS, start_ms=DEFAULT_START_MS, seed=0):
+    b_close, g_close = paired_closes(n, seed=seed)
+    index = pd.to_datetime(start_ms + np.arange(n, dtype=np.int64) * interval_ms, unit='ms')
+    df = pd.DataFrame({'b_close': b_close, 'g_close': g_close}, index=index)
+    df['diff_pct'] = (df['b_close'] - df['g_close']) / df['b_close']
+
+    rng = np.random.default_rng(seed + 5)
+    on_funding = (start_ms + np.arange(n, dtype=np.int64) * interval_ms) % FUNDING_INTERVAL_MS == 0
+    b_fr = np.full(n, np.nan)
+    g_fr = np.full(n, np.nan)
+    b_fr[on_funding] = rng.normal(0.0001, 0.0003, on_funding.sum())
+    g_fr[on_funding] = rng.normal(0.0001, 0.0003, on_funding.sum())
+    df['binance_fr'] = b_fr
+    df['gate_fr'] = g_fr
+    return df
+
+
+# Binance 深度（REST/WS 格式：[[price, qty], ...]，字符串）
+def binance_orderbook(levels=20, mid=100.0, tick=0.01, seed=0):
+    rng = np.random.default_rng(seed + 6)
+    steps = np.arange(1, levels + 1)
+    bids = [[f"{mid - tick * i:.4f}", f"{q:.3f}"] for i, q in zip(steps, rng.gamma(2.0, 5.0, levels))]
+    asks = [[f"{mid + tick * i:.4f}", f"{q:.3f}"] for i, q in zip(steps, rng.gamma(2.0, 5.0, levels))]
+    return {'bids': bids, 'asks': asks}
+
+
+# Gate 深度（order_book_update 格式：[{'p': price, 's': size}, ...]，size 为合约张数）
+def gate_orderbook(levels=20, mid=100.0, tick=0.01, seed=0):
+    rng = np.random.default_rng(seed + 7)
+    steps = np.arange(1, levels + 1)
+    bids = [{'p': f"{mid - tick * i:.4f}", 's': int(s)} for i, s in zip(steps, rng.integers(1, 500, levels))]
+    asks = [{'p': f"{mid + tick * i:.4f}", 's': int(s)} for i, s in zip(steps, rng.integers(1, 500, levels))]
+    return {'b': bids, 'a': asks}
+
+
+class FakeWSMessage:
+    # 模拟 aiohttp.WSMessage，handler 只用到 .type 和 .data
+    __slots__ = ('type', 'data')
+
+    def __init__(self, data, msg_type=None):
+        self.data = data
+        self.type = msg_type
+
+
+def symbol_names(n_symbols):
+    return [f"SYM{i}USDT" for i in range(n_symbols)]
+
+
+# Binance <symbol>@markPrice 消息
+def binance_mark_price_frames(n, n_symbols=1, start_ms=DEFAULT_START_MS, seed=0):
+    symbols = symbol_names(n_symbols)
+    prices = random_walk_prices(n, seed=seed)
+    frames = []
+    for i in range(n):
+        event_ms = start_ms + i * 1000
+        frames.append(json.dumps({
+            'e': 'markPriceUpdate', 'E': event_ms, 's': symbols[i % n_symbols],
+            'p': f"{prices[i]:.8f}", 'i': f"{prices[i]:.8f}", 'P': f"{prices[i]:.8f}",
+            'r': "0.00010000", 'T': (event_ms // FUNDING_INTERVAL_MS + 1) * FUNDING_INTERVAL_MS,
+        }))
+    return frames
+
+
+# Binance <symbol>@depth5 消息
+def binance_depth_frames(n, n_symbols=1, levels=5, start_ms=DEFAULT_START_MS, seed=0):
+    symbols = symbol_names(n_symbols)
+    prices = random_walk_prices(n, seed=seed)
+    frames = []
+    for i in range(n):
+        book = binance_orderbook(levels=levels, mid=prices[i], seed=seed + i % 7)
+        frames.append(json.dumps({
+            'e': 'depthUpdate', 'E': start_ms + i * 100, 'T': start_ms + i * 100, 's': symbols[i % n_symbols],
+            'U': i, 'u': i + 1, 'pu': i, 'b': book['bids'], 'a': book['asks'],
+        }))
+    return frames
+
+
+# Gate futures.tickers 消息
+def gate_ticker_frames(n, n_symbols=1, start_ms=DEFAULT_START_MS, seed=0):
+    symbols = [s.replace("USDT", "_USDT") for s in symbol_names(n_symbols)]
+    prices = random_walk_prices(n, seed=seed + 20)
+    frames = []
+    for i in range(n):
+        event_ms = start_ms + i * 1000
+        frames.append(json.dumps({
+            'time': event_ms // 1000, 'time_ms': event_ms, 'channel': 'futures.tickers', 'event': 'update',
+            'result': [{
+                'contract': symbols[i % n_symbols], 'last': f"{prices[i]:.6f}",
+                'mark_price': f"{prices[i]:.6f}", 'index_price': f"{prices[i]:.6f}",
+                'funding_rate': "0.0001", 'funding_rate_indicative': "0.0001",
+                'volume_24h_settle': "1000000",
+            }],
+        }))
+    return frames
+
+
+# Gate futures.order_book_update 消息
+def gate_orderbook_frames(n, n_symbols=1, levels=20, start_ms=DEFAULT_START_MS, seed=0):
+    symbols = [s.replace("USDT", "_USDT") for s in symbol_names(n_symbols)]
+    prices = random_walk_prices(n, seed=seed + 30)
+    frames = []
+    for i in range(n):
+        book = gate_orderbook(levels=levels, mid=prices[i], seed=seed + i % 7)
+        event_ms = start_ms + i * 100
+        frames.append(json.dumps({
+            'time': event_ms // 1000, 'time_ms': event_ms, 'channel': 'futures.order_book_update',
+            'event': 'update',
+            # 序号按 symbol 各自连续，整本盘口当作一条增量
+            'result': {'t': event_ms, 's': symbols[i % n_symbols], 'U': i // n_symbols + 1, 'u': i // n_symbols + 1,
+                       'b': book['b'], 'a': book['a']},
+        }))
+    return frames
+
+
+class SyntheticBinanceDataHandler:
+    # 与 BinanceDataHandler 接口一致的离线数据源
+    def __init__(self, seed=0):
+        self.seed = seed
+
+    def get_future_klines(self, symbol, interval='1m', start_str=None, end_str=None, limit=1000):
+        b_close, _ = paired_closes(limit, seed=self.seed)
+        return binance_klines_df(limit, close=b_close, seed=self.seed)
+
+    def get_funding_rate_history(self, symbol, start_str=None, end_str=None, limit=1000):
+        return binance_funding_df(limit, symbol=symbol, seed=self.seed)
+
+    def get_24tradevol(self, symbol):
+        return 1e6
+
+
+class SyntheticGateDataHandler:
+    # 与 GateDataHandler 接口一致的离线数据源
+    def __init__(self, seed=0):
+        self.seed = seed
+
+    def get_future_klines(self, symbol, ts_from=None, interval='1m', limit=10, settle='usdt'):
+        _, g_close = paired_closes(limit, seed=self.seed)
+        return gate_klines_df(limit, close=g_close, seed=self.seed)
+
+    def get_funding_rate_history(self, symbol, limit=500):
+        return gate_funding_df(limit, symbol=symbol, seed=self.seed)
+
+    def get_24tradevol(self, symbol):
+        return "1000000"
@@ -0,0 +1,243 @@
+"""
+秒级K线合成模块：
+- 订阅两边的成交推送（Binance aggTrade、Gate futures.trades），本地增量合成 1s / 5s / 1m 等多周期 OHLCV
+- 分桶按成交时间对 epoch 取整，两边同一周期的K线起止时间完全一致，可以直接按时间对齐
+- 只有最小周期直接由成交更新，更大周期由收盘的最小周期K线汇总，桶内最后一根到达即收盘
+- 定时 flush：超过 grace_ms 仍未收到新成交的桶按本地时间收盘，没有成交的桶用上一收盘价补平（成交量 0）
+- 收盘K线批量写入 KlineStore，key 为 {venue}_{symbol}_{周期}，字段同 KLINE_FIELDS
+- 已收盘的桶不再修改，迟到的成交只计数
+"""
+import asyncio
+import time
+
+import aiohttp
+import numpy as np
+import pandas as pd
+
+from analysis.kline_store import KlineStore
+from config import GATE_PROXY
+from market_data.funding_feed import GATE_CONTRACTS_URL
+from market_data.shared_data import normalize_symbol
+
+RESOLUTION_MS = {'1s': 1000, '5s': 5000, '15s': 15000, '30s': 30000, '1m': 60000, '5m': 300000}
+
+
+def bar_key(venue, symbol, resolution):
+    return f"{venue}_{normalize_symbol(symbol)}_{resolution}"
+
+
+class _Bar:
+    __slots__ = ('start', 'open', 'high', 'low', 'close', 'volume', 'quote_volume')
+
+    def __init__(self, start, open_, high, low, close, volume=0.0, quote_volume=0.0):
+        self.start = start
+        self.open = open_
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.quote_volume = quote_volume
+
+    def values(self):
+        return self.open, self.high, self.low, self.close, self.volume, self.quote_volume
+
+
+class BarBuilder:
+
+    def __init__(self, resolutions=('1s', '5s', '1m'), store=None, grace_ms=500, fill_gaps=True, on_bar=None,
+                 gate_proxy=GATE_PROXY):
+        """
+        resolutions: 需要合成的周期，都必须是最小周期的整数倍
+        store: KlineStore，不传则新建一个只在内存中的
+        grace_ms: 桶结束后再等多久的迟到成交才按本地时间收盘
+        fill_gaps: 没有成交的桶是否用上一收盘价补平，保证两边时间轴一致
+        on_bar: 每根K线收盘时回调 on_bar(venue, symbol, resolution, start_ms, values)
+        """
+        self.resolutions = sorted(resolutions, key=lambda r: RESOLUTION_MS[r])
+        self.base = self.resolutions[0]
+        self.base_ms = RESOLUTION_MS[self.base]
+        for r in self.resolutions[1:]:
+            if RESOLUTION_MS[r] % self.base_ms:
+                raise ValueError(f"resolution {r} is not a multiple of {self.base}")
+        self.store = store if store is not None else KlineStore()
+        self.grace_ms = grace_ms
+        self.fill_gaps = fill_gaps
+        self.on_bar = on_bar
+        self.gate_proxy = gate_proxy
+        self.quanto = {}       # 统一格式 symbol -> Gate quanto_multiplier
+        self.current = {}      # (venue, symbol) -> 正在累积的最小周期K线
+        self.next_start = {}   # (venue, symbol) -> 下一根还没收盘的最小周期桶起点
+        self.last_close = {}   # (venue, symbol) -> 最近一根收盘价，用于补平
+        self.rollup = {}       # (venue, symbol, resolution) -> 正在汇总的大周期K线
+        self.pending = {}      # bar_key -> [(start_ms, values)]，等待写入 store
+        self.stats = {'trades': 0, 'late_trades': 0, 'no_quanto': 0, 'bars': 0, 'filled_bars': 0}
+
+    def set_quanto(self, symbol, multiplier):
+        self.quanto[normalize_symbol(symbol)] = float(multiplier)
+
+    async def refresh_quanto(self, session=None):
+        own_session = session is None
+        session = session or aiohttp.ClientSession()
+        try:
+            async with session.get(GATE_CONTRACTS_URL, proxy=self.gate_proxy) as resp:
+                resp.raise_for_status()
+                for item in await resp.json():
+                    if item.get('quanto_multiplier'):
+                        self.set_quanto(item['name'], item['quanto_multiplier'])
+        except Exception as e:
+            print(f"[BarBuilder] Can't load Gate quanto multipliers: {e}")
+        finally:
+            if own_session:
+                await session.close()
+
+    # 作为 on_update（或在 on_update 里调用），只处理带 trades 的成交消息
+    def on_update(self, data: dict):
+        trades = data.get('trades')
+        if not trades:
+            return
+        venue = data['source']
+        symbol = normalize_symbol(data['symbol'])
+        if venue == 'gate':
+            multiplier = self.quanto.get(symbol)
+            if multiplier is None:
+                self.stats['no_quanto'] += len(trades)
+                return  # 没有合约面值时无法换算成交量
+        else:
+            multiplier = 1.0
+        for ts_ms, price, qty in trades:
+            self.add_trade(venue, symbol, int(ts_ms), price, qty * multiplier)
+
+    def add_trade(self, venue, symbol, ts_ms, price, qty):
+        key = (venue, symbol)
+        start = ts_ms // self.base_ms * self.base_ms
+        bar = self.current.get(key)
+        if start < self.next_start.get(key, start) or (bar is not None and start < bar.start):
+            self.stats['late_trades'] += 1
+            return
+        self.stats['trades'] += 1
+        if bar is not None and start > bar.start:
+            self._close_until(key, start)
+            bar = None
+        if bar is None:
+            self.current[key] = _Bar(start, price, price, price, price, qty, qty * price)
+            return
+        if price > bar.high:
+            bar.high = price
+        elif price < bar.low:
+            bar.low = price
+        bar.close = price
+        bar.volume += qty
+        bar.quote_volume += qty * price
+
+    # 收盘当前桶，并把 until 之前没有成交的桶补平；until 为下一根要累积的桶起点
+    def _close_until(self, key, until):
+        bar = self.current.pop(key, None)
+        if bar is not None:
+            self._emit_base(key, bar.start, bar.values())
+            self.last_close[key] = bar.close
+            start = bar.start + self.base_ms
+        else:
+            start = self.next_start.get(key, until)
+        close = self.last_close.get(key)
+        if self.fill_gaps and close is not None:
+            for t in range(start, until, self.base_ms):
+                self._emit_base(key, t, (close, close, close, close, 0.0, 0.0))
+                self.stats['filled_bars'] += 1
+        self.next_start[key] = max(until, self.next_start.get(key, until))
+
+    def _emit_base(self, key, start, values):
+        venue, symbol = key
+        self._record(venue, symbol, self.base, start, values)
+        end = start + self.base_ms
+        for resolution in self.resolutions[1:]:
+            res_ms = RESOLUTION_MS[resolution]
+            rkey = (venue, symbol, resolution)
+            bucket = start // res_ms * res_ms
+            bar = self.rollup.get(rkey)
+            if bar is not None and bar.start != bucket:
+                # 中间缺了最小周期K线（未补平时），已有部分按原样收盘
+                self._record(venue, symbol, resolution, bar.start, bar.values())
+                bar = None
+            if bar is None:
+                bar = self.rollup[rkey] = _Bar(bucket, *values)
+            else:
+                bar.high = max(bar.high, values[1])
+                bar.low = min(bar.low, values[2])
+                bar.close = values[3]
+                bar.volume += values[4]
+                bar.quote_volume += values[5]
+            if end == bucket + res_ms:
+                self._record(venue, symbol, resolution, bucket, bar.values())
+                del self.rollup[rkey]
+
+    def _record(self, venue, symbol, resolution, start, values):
+        self.pending.setdefault(bar_key(venue, symbol, resolution), []).append((start, values))
+        self.stats['bars'] += 1
+        if self.on_bar is not None:
+            self.on_bar(venue, symbol, resolution, start, values)
+
+    # 按本地时间收盘超过 grace_ms 的桶，然后把收盘K线批量写入 store
+    def flush(self, now_ms=None):
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        limit = (now_ms - self.grace_ms) // self.base_ms * self.base_ms
+        for key in list(set(self.current) | set(self.next_start)):
+            bar = self.current.get(key)
+            if (bar is not None and bar.start < limit) or (bar is None and self.next_start[key] < limit):
+                self._close_until(key, limit)
+        self.persist()
+
+    def persist(self):
+        pending, self.pending = self.pending, {}
+        for key, bars in pending.items():
+            ts = np.fromiter((b[0] for b in bars), dtype=np.int64, count=len(bars))
+            values = np.array([b[1] for b in bars], dtype=np.float64).T
+            self.store.append(key, ts, values)
+
+    async def run(self, interval=0.2):
+        while True:
+            await asyncio.sleep(interval)
+            self.flush()
+
+    # 已收盘的K线，index 为 time，列同 KLINE_FIELDS
+    def frame(self, venue, symbol, resolution):
+        return self.store.frame(bar_key(venue, symbol, resolution))
+
+
+# 两边同周期K线按时间对齐，列同 AnalysisUtils.merge_klines：b_close / g_close / diff_pct
+def merge_bars(store, symbol, resolution='1s'):
+    b_df = store.frame(bar_key('binance', symbol, resolution))[['close']]
+    g_df = store.frame(bar_key('gate', symbol, resolution))[['close']]
+    merged_df = pd.merge(left=b_df, right=g_df, how='inner', left_index=True, right_index=True,
+                         suffixes=('_b', '_g'))
+    merged_df.columns = ['b_close', 'g_close']
+    merged_df['diff_pct'] = (merged_df['b_close'] - merged_df['g_close']) / merged_df['b_close']
+    return merged_df
+
+
+if __name__ == '__main__':
+
+    from market_data.ws_market_data import BinanceWSClient, GateWSClient
+
+    builder = BarBuilder(store=KlineStore(backing_dir='DATA/bars'))
+
+    async def print_loop():
+        while True:
+            await asyncio.sleep(10)
+            try:
+                print(merge_bars(builder.store, 'RVNUSDT', '1s').tail(10))
+            except KeyError:
+                pass
+            print(builder.stats)
+
+    async def main():
+        await builder.refresh_quanto()
+        binance = BinanceWSClient(symbol="rvnusdt", on_update=builder.on_update)
+        gate = GateWSClient(symbol="RVN_USDT", on_update=builder.on_update)
+        await asyncio.gather(binance.subscribe_trades(), gate.subscribe_trades(), builder.run(), print_loop())
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        builder.flush()
+        builder.store.flush()
+        print("Stopped by user.")
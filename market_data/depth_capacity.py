@@ -0,0 +1,200 @@
+"""
+盘口深度容量估算模块：
+- 每次 orderbook 更新时，用两边盘口逐档撮合，算出可执行价差和目标价差下最多能做的名义本金
+  short_binance: 在 Binance 吃 bids 卖出、在 Gate 吃 asks 买入
+  long_binance:  在 Binance 吃 asks 买入、在 Gate 吃 bids 卖出
+- 价差口径同 diff_pct：(卖价 - 买价) / Binance 价格，并扣除两边 taker 手续费
+- 两边累计数量合并后作为分段点，按段向量化计算边际价差，不逐档循环
+- Gate 盘口用 GateWSClient 本地维护的完整盘口（增量推送已合并、已排序），不是原始增量
+- Gate 盘口是张数，需要乘 quanto_multiplier 换成币数量；启动时从 REST contracts 批量拉取
+- size_for() 从同一份估算结果给出两条腿共用的下单金额，future_trade.place_pair_order 用它代替固定金额
+"""
+import asyncio
+import time
+
+import aiohttp
+import numpy as np
+
+from config import GATE_PROXY
+from market_data.funding_feed import GATE_CONTRACTS_URL
+from market_data.shared_data import normalize_symbol
+
+SHORT_BINANCE = 'short_binance'
+LONG_BINANCE = 'long_binance'
+
+
+# 盘口转成 (价格, 数量) 两个数组；multiplier 用于 Gate 张数 -> 币数量
+def book_side_arrays(levels, multiplier=1.0):
+    if not levels:
+        return np.empty(0), np.empty(0)
+    arr = np.asarray(levels, dtype=np.float64)
+    return arr[:, 0], arr[:, 1] * multiplier
+
+
+# 在 sell 盘口（bids，价格降序）卖出、在 buy 盘口（asks，价格升序）买入，逐段计算边际价差
+# ref_side: 价差分母取哪一边的价格（'sell' / 'buy'），和 diff_pct 的分母 b_close 保持一致
+def walk_books(sell_px, sell_qty, buy_px, buy_qty, sell_fee, buy_fee, target_spread, ref_side='sell'):
+    if not len(sell_px) or not len(buy_px):
+        return None
+    sell_cum = np.cumsum(sell_qty)
+    buy_cum = np.cumsum(buy_qty)
+    depth = min(sell_cum[-1], buy_cum[-1])
+
+    # 分段点：两边累计数量合并排序（重复点只会产生 0 数量的段，不影响结果），截到较浅的一边
+    edges = np.sort(np.concatenate((sell_cum, buy_cum)))
+    edges = edges[:np.searchsorted(edges, depth, side='right')]
+    starts = np.concatenate(([0.0], edges[:-1]))
+    seg_qty = edges - starts
+    # 每段起点落在哪一档；去掉最后一个累计值，保证下标不越界
+    sp = sell_px[np.searchsorted(sell_cum[:-1], starts, side='right')]
+    bp = buy_px[np.searchsorted(buy_cum[:-1], starts, side='right')]
+
+    ref = sp if ref_side == 'sell' else bp
+    marginal = (sp * (1 - sell_fee) - bp * (1 + buy_fee)) / ref
+    # 越往深处边际价差越小，满足目标的是一段前缀
+    below = marginal < target_spread
+    n_ok = int(below.argmax()) if below.any() else len(marginal)
+
+    qty = seg_qty[:n_ok].sum()
+    sell_value = np.dot(sp[:n_ok], seg_qty[:n_ok])
+    buy_value = np.dot(bp[:n_ok], seg_qty[:n_ok])
+    ref_value = sell_value if ref_side == 'sell' else buy_value
+    return {
+        'spread': float(marginal[0]),           # 最优一档的可执行价差（已扣手续费）
+        'capacity_qty': float(qty),             # 目标价差以上可成交的币数量
+        'capacity_notional': float(buy_value),  # 对应买入腿的 USDT 名义本金
+        'avg_spread': float((sell_value * (1 - sell_fee) - buy_value * (1 + buy_fee)) / ref_value) if qty else None,
+        'worst_sell': float(sp[n_ok - 1]) if n_ok else None,
+        'worst_buy': float(bp[n_ok - 1]) if n_ok else None,
+        'book_qty': float(depth),               # 两边盘口能撮合的总数量（不看价差）
+    }
+
+
+class DepthCapacity:
+
+    def __init__(self, target_spread=0.006, binance_fee=0.0005, gate_fee=0.0005, max_age=5, haircut=0.5, min_amount=0,
+                 gate_proxy=GATE_PROXY):
+        """
+        target_spread: 开仓要求的最小价差（扣手续费后）
+        max_age: 任一边盘口超过多少秒未更新即视为过期
+        haircut: 下单金额最多取目标价差以上容量的多少比例，给下单途中的盘口变化留余量
+        min_amount: 低于该金额（USDT）不下单
+        """
+        self.target_spread = target_spread
+        self.binance_fee = binance_fee
+        self.gate_fee = gate_fee
+        self.max_age = max_age
+        self.haircut = haircut
+        self.min_amount = min_amount
+        self.gate_proxy = gate_proxy
+        self.quanto = {}   # 统一格式 symbol -> Gate quanto_multiplier
+        self.books = {}    # (venue, symbol) -> {'bids': (px, qty), 'asks': (px, qty), 'updated_at': ...}
+        self.results = {}  # symbol -> {SHORT_BINANCE: {...}, LONG_BINANCE: {...}, 'updated_at': ...}
+
+    def set_quanto(self, symbol, multiplier):
+        self.quanto[normalize_symbol(symbol)] = float(multiplier)
+
+    async def refresh_quanto(self, session=None):
+        own_session = session is None
+        session = session or aiohttp.ClientSession()
+        try:
+            async with session.get(GATE_CONTRACTS_URL, proxy=self.gate_proxy) as resp:
+                resp.raise_for_status()
+                for item in await resp.json():
+                    if item.get('quanto_multiplier'):
+                        self.set_quanto(item['name'], item['quanto_multiplier'])
+        except Exception as e:
+            print(f"[Capacity] Can't load Gate quanto multipliers: {e}")
+        finally:
+            if own_session:
+                await session.close()
+
+    # 启动时拉一次合约面值，之后每小时刷新
+    async def run(self, interval=3600):
+        while True:
+            await self.refresh_quanto()
+            await asyncio.sleep(interval)
+
+    # 作为 on_update（或在 on_update 里调用），只处理 orderbook 消息
+    def on_update(self, data: dict):
+        orderbook = data.get('orderbook')
+        if orderbook is None:
+            return
+        venue = data['source']
+        symbol = normalize_symbol(data['symbol'])
+        if venue == 'gate':
+            multiplier = self.quanto.get(symbol)
+            if multiplier is None:
+                return  # 没有合约面值时无法换算数量，不做估算
+        else:
+            multiplier = 1.0
+        self.books[(venue, symbol)] = {
+            'bids': book_side_arrays(orderbook.get('bids'), multiplier),
+            'asks': book_side_arrays(orderbook.get('asks'), multiplier),
+            'updated_at': time.time(),
+        }
+        self.recompute(symbol)
+
+    def recompute(self, symbol, target_spread=None):
+        b = self.books.get(('binance', symbol))
+        g = self.books.get(('gate', symbol))
+        if b is None or g is None:
+            return None
+        target = self.target_spread if target_spread is None else target_spread
+        result = {
+            SHORT_BINANCE: walk_books(*b['bids'], *g['asks'], self.binance_fee, self.gate_fee, target, 'sell'),
+            LONG_BINANCE: walk_books(*g['bids'], *b['asks'], self.gate_fee, self.binance_fee, target, 'buy'),
+            'target_spread': target,
+            'updated_at': min(b['updated_at'], g['updated_at']),
+        }
+        if target_spread is None:
+            self.results[symbol] = result
+        return result
+
+    def get(self, symbol, now=None):
+        result = self.results.get(normalize_symbol(symbol))
+        if result is None:
+            return None
+        now = now or time.time()
+        return dict(result, stale=now - result['updated_at'] > self.max_age)
+
+    # 一对套利单的下单金额（USDT），两条腿共用：只读一次估算结果，不超过 max_amount，
+    # 也不超过目标价差以上容量的 haircut 比例；不满足条件返回 0，两条腿都不下
+    def size_for(self, symbol, direction, max_amount):
+        result = self.get(symbol)
+        if result is None or result['stale'] or result.get(direction) is None:
+            return 0
+        amount = min(max_amount, result[direction]['capacity_notional'] * self.haircut)
+        return amount if amount >= self.min_amount and amount > 0 else 0
+
+
+# 交易所 + 下单方向 -> 套利方向，用于单边下单时查询容量
+def pair_direction(venue, side):
+    if venue == 'binance':
+        return SHORT_BINANCE if side == 'short' else LONG_BINANCE
+    return SHORT_BINANCE if side == 'long' else LONG_BINANCE
+
+
+if __name__ == '__main__':
+
+    from pprint import pprint
+
+    from market_data.ws_market_data import BinanceWSClient, GateWSClient
+
+    capacity = DepthCapacity(target_spread=0.002)
+
+    async def print_loop():
+        while True:
+            await asyncio.sleep(2)
+            pprint(capacity.get('RVNUSDT'))
+
+    async def main():
+        await capacity.refresh_quanto()
+        binance = BinanceWSClient(symbol="rvnusdt", on_update=capacity.on_update)
+        gate = GateWSClient(symbol="RVN_USDT", on_update=capacity.on_update)
+        await asyncio.gather(binance.subscribe_orderbook(depth=20), gate.subscribe_orderbook(), print_loop())
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("Stopped by user.")
@@ -0,0 +1,201 @@
+"""
+行情分发模块：WS client 和下游消费者之间的有界 fan-out
+- 每个消费者一个固定大小的环形缓冲区，publish 只做入队，不调用消费者代码
+- 每个消费者单独选择策略：
+  coalesce:    同一 (source, symbol, 类型) 只保留最新一条，适合策略计算；成交推送每条都是增量，不合并
+  drop_oldest: 缓冲区满时丢弃最旧的一条，适合日志/监控
+  block:       缓冲区满时让 feed 等待（会反压接收循环），只给不能丢数据的消费者用，如落盘
+- 统计每个消费者的入队、送达、丢弃、合并次数和队列深度
+"""
+import asyncio
+
+POLICY_COALESCE = 'coalesce'
+POLICY_DROP_OLDEST = 'drop_oldest'
+POLICY_BLOCK = 'block'
+
+
+# 默认合并键：同一来源、同一 symbol、同一类消息（orderbook / 价格）；成交返回 None，表示不合并
+def default_key(data: dict):
+    if 'trades' in data:
+        return None
+    return data['source'], data['symbol'], 'orderbook' if 'orderbook' in data else 'ticker'
+
+
+class RingBuffer:
+    # 预分配的定长环形队列
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.items = [None] * capacity
+        self.head = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def full(self):
+        return self.size == self.capacity
+
+    # 入队；满时覆盖最旧的一条并返回 True
+    def push(self, item):
+        tail = (self.head + self.size) % self.capacity
+        self.items[tail] = item
+        if self.size == self.capacity:
+            self.head = (self.head + 1) % self.capacity
+            return True
+        self.size += 1
+        return False
+
+    def pop(self):
+        item = self.items[self.head]
+        self.items[self.head] = None
+        self.head = (self.head + 1) % self.capacity
+        self.size -= 1
+        return item
+
+
+class Subscription:
+
+    def __init__(self, name, policy=POLICY_DROP_OLDEST, capacity=1024, key_func=default_key):
+        if policy not in (POLICY_COALESCE, POLICY_DROP_OLDEST, POLICY_BLOCK):
+            raise ValueError(f"unknown fan-out policy: {policy}")
+        self.name = name
+        self.policy = policy
+        self.capacity = capacity
+        self.key_func = key_func
+        # coalesce 下环形队列里放的是 key，最新数据在 latest 里
+        self.buffer = RingBuffer(capacity)
+        self.latest = {}
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.blocked = 0
+        self.max_depth = 0
+
+    @property
+    def depth(self):
+        return len(self.buffer)
+
+    # 非阻塞入队；block 策略下缓冲区已满时返回 False
+    def offer(self, data):
+        self.published += 1
+        if self.policy == POLICY_COALESCE:
+            key = self.key_func(data)
+            if key is None:
+                key = object()  # 不合并的消息用独占的 key 入队
+            elif key in self.latest:
+                self.latest[key] = data
+                self.coalesced += 1
+                return True
+            if self.buffer.full():
+                # 不同 key 超过容量时淘汰最旧的 key
+                self.latest.pop(self.buffer.pop(), None)
+                self.dropped += 1
+            self.latest[key] = data
+            self.buffer.push(key)
+        elif self.policy == POLICY_BLOCK:
+            if self.buffer.full():
+                self.published -= 1
+                self._space.clear()
+                return False
+            self.buffer.push(data)
+        else:
+            if self.buffer.push(data):
+                self.dropped += 1
+
+        if self.depth > self.max_depth:
+            self.max_depth = self.depth
+        self._ready.set()
+        return True
+
+    async def wait_space(self):
+        self.blocked += 1
+        await self._space.wait()
+
+    def _take(self):
+        item = self.buffer.pop()
+        if self.policy == POLICY_COALESCE:
+            item = self.latest.pop(item)
+        if not self.buffer.size:
+            self._ready.clear()
+        self._space.set()
+        self.delivered += 1
+        return item
+
+    def get_nowait(self):
+        if not self.buffer.size:
+            return None
+        return self._take()
+
+    async def get(self):
+        while not self.buffer.size:
+            await self._ready.wait()
+        return self._take()
+
+    # 一次取走当前所有待处理数据
+    def drain(self):
+        items = []
+        while self.buffer.size:
+            items.append(self._take())
+        return items
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+    def stats(self):
+        return {
+            'policy': self.policy,
+            'capacity': self.capacity,
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'published': self.published,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'blocked': self.blocked,
+        }
+
+
+class FanOut:
+
+    def __init__(self):
+        self.subscriptions = {}
+
+    def subscribe(self, name, policy=POLICY_DROP_OLDEST, capacity=1024, key_func=default_key):
+        sub = Subscription(name, policy=policy, capacity=capacity, key_func=key_func)
+        self.subscriptions[name] = sub
+        return sub
+
+    def unsubscribe(self, name):
+        self.subscriptions.pop(name, None)
+
+    # 作为 WS client 的 on_update；只有 block 消费者满了才返回需要 await 的协程
+    def publish(self, data: dict):
+        waiting = [sub for sub in self.subscriptions.values() if not sub.offer(data)]
+        if waiting:
+            return self._publish_blocked(data, waiting)
+        return None
+
+    async def _publish_blocked(self, data, waiting):
+        for sub in waiting:
+            while not sub.offer(data):
+                await sub.wait_space()
+
+    def stats(self):
+        return {name: sub.stats() for name, sub in self.subscriptions.items()}
+
+    # 周期性打印各消费者的队列统计
+    async def stats_loop(self, interval=60):
+        while True:
+            await asyncio.sleep(interval)
+            for name, s in self.stats().items():
+                print(f"[FanOut] {name:<12} {s['policy']:<11} depth={s['depth']}/{s['capacity']} "
+                      f"max={s['max_depth']} pub={s['published']} out={s['delivered']} "
+                      f"drop={s['dropped']} merged={s['coalesced']} blocked={s['blocked']}")
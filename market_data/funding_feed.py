@@ -0,0 +1,159 @@
+"""
+实时资金费率模块：
+- 从 WS 推送维护两边每个 symbol 的当前/预测资金费率和下次结算时间
+  Binance markPrice: r（下次结算费率）、T（下次结算时间）
+  Gate futures.tickers: funding_rate、funding_rate_indicative；下次结算时间只能从 REST contracts 取
+- 定时 REST 批量兜底（Binance premiumIndex、Gate contracts），只覆盖缺失或过期的数据
+- 读取时带 stale 标记，不再用默认值掩盖拿不到数据的情况
+"""
+import asyncio
+import time
+
+import aiohttp
+
+from config import BINANCE_PROXY, GATE_PROXY
+from market_data.shared_data import normalize_symbol
+
+BINANCE_PREMIUM_INDEX_URL = "https://fapi.binance.com/fapi/v1/premiumIndex"
+GATE_CONTRACTS_URL = "https://api.gateio.ws/api/v4/futures/usdt/contracts"
+
+
+class FundingState:
+    __slots__ = ('rate', 'predicted_rate', 'next_funding_time', 'updated_at', 'source')
+
+    def __init__(self, rate=None, predicted_rate=None, next_funding_time=None, updated_at=None, source=None):
+        self.rate = rate
+        self.predicted_rate = predicted_rate
+        self.next_funding_time = next_funding_time  # epoch 毫秒
+        self.updated_at = updated_at                # epoch 秒
+        self.source = source                        # 'ws' / 'rest'
+
+
+def _to_float(value):
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+class FundingFeed:
+
+    # max_age: 超过多少秒没有更新即视为过期；rest_interval: REST 兜底刷新间隔
+    def __init__(self, max_age=90, rest_interval=60, binance_proxy=BINANCE_PROXY, gate_proxy=GATE_PROXY):
+        self.max_age = max_age
+        self.rest_interval = rest_interval
+        self.binance_proxy = binance_proxy
+        self.gate_proxy = gate_proxy
+        self.states = {}  # (venue, 统一格式 symbol) -> FundingState
+
+    def set(self, venue, symbol, rate, predicted_rate=None, next_funding_time=None, source='ws', now=None):
+        key = (venue, normalize_symbol(symbol))
+        state = self.states.get(key)
+        if state is None:
+            state = self.states[key] = FundingState()
+        state.rate = rate
+        if predicted_rate is not None:
+            state.predicted_rate = predicted_rate
+        # Gate WS 不带结算时间，保留 REST 拿到的值
+        if next_funding_time is not None:
+            state.next_funding_time = int(next_funding_time)
+        state.updated_at = now or time.time()
+        state.source = source
+
+    # 作为 WS client 的 on_update（或在 on_update 里调用），只处理带资金费率的消息
+    # Binance 只推送一个费率（即下次结算的预估费率），当前和预测取同一个值
+    def on_update(self, data: dict):
+        rate = data.get('funding_rate')
+        if rate is None:
+            return
+        predicted_rate = data['predicted_funding_rate'] if 'predicted_funding_rate' in data else rate
+        self.set(data['source'], data['symbol'], float(rate),
+                 predicted_rate=_to_float(predicted_rate),
+                 next_funding_time=data.get('next_funding_time'))
+
+    def is_stale(self, state, now=None):
+        if state is None or state.rate is None or state.updated_at is None:
+            return True
+        now = now or time.time()
+        if now - state.updated_at > self.max_age:
+            return True
+        # 已过结算时间但还没收到新一期的数据
+        return state.next_funding_time is not None and now * 1000 >= state.next_funding_time
+
+    # 读取某个 symbol 的资金费率，始终返回 dict，拿不到数据时 rate 为 None、stale 为 True
+    def get(self, venue, symbol, now=None):
+        state = self.states.get((venue, normalize_symbol(symbol)))
+        now = now or time.time()
+        return {
+            'venue': venue,
+            'symbol': normalize_symbol(symbol),
+            'rate': state.rate if state else None,
+            'predicted_rate': state.predicted_rate if state else None,
+            'next_funding_time': state.next_funding_time if state else None,
+            'age': now - state.updated_at if state and state.updated_at else None,
+            'source': state.source if state else None,
+            'stale': self.is_stale(state, now),
+        }
+
+    # 两边的费率差（binance - gate），任一边过期则 stale
+    def spread(self, symbol, now=None):
+        b = self.get('binance', symbol, now)
+        g = self.get('gate', symbol, now)
+        diff = b['rate'] - g['rate'] if b['rate'] is not None and g['rate'] is not None else None
+        return {'symbol': normalize_symbol(symbol), 'binance': b, 'gate': g, 'diff': diff,
+                'stale': b['stale'] or g['stale']}
+
+    def stale_keys(self, now=None):
+        now = now or time.time()
+        return [key for key, state in self.states.items() if self.is_stale(state, now)]
+
+    def _set_from_rest(self, venue, symbol, rate, predicted_rate, next_funding_time, now):
+        state = self.states.get((venue, normalize_symbol(symbol)))
+        if state is None or self.is_stale(state, now):
+            self.set(venue, symbol, rate, predicted_rate=predicted_rate, next_funding_time=next_funding_time,
+                     source='rest', now=now)
+        elif state.next_funding_time is None and next_funding_time is not None:
+            state.next_funding_time = int(next_funding_time)
+
+    async def refresh_binance(self, session):
+        async with session.get(BINANCE_PREMIUM_INDEX_URL, proxy=self.binance_proxy) as resp:
+            resp.raise_for_status()
+            items = await resp.json()
+        now = time.time()
+        for item in items:
+            rate = _to_float(item.get('lastFundingRate'))
+            if rate is None:
+                continue
+            self._set_from_rest('binance', item['symbol'], rate, rate, item.get('nextFundingTime'), now)
+
+    async def refresh_gate(self, session):
+        async with session.get(GATE_CONTRACTS_URL, proxy=self.gate_proxy) as resp:
+            resp.raise_for_status()
+            items = await resp.json()
+        now = time.time()
+        for item in items:
+            rate = _to_float(item.get('funding_rate'))
+            if rate is None:
+                continue
+            next_apply = item.get('funding_next_apply')
+            self._set_from_rest('gate', item['name'], rate, _to_float(item.get('funding_rate_indicative')),
+                                int(next_apply) * 1000 if next_apply else None, now)
+
+    async def refresh_from_rest(self, session=None):
+        own_session = session is None
+        session = session or aiohttp.ClientSession()
+        try:
+            results = await asyncio.gather(self.refresh_binance(session), self.refresh_gate(session),
+                                           return_exceptions=True)
+            for venue, result in zip(('binance', 'gate'), results):
+                if isinstance(result, Exception):
+                    print(f"[Funding REST Error] {venue}: {result}")
+        finally:
+            if own_session:
+                await session.close()
+
+    # 启动时全量拉一次，之后按 rest_interval 兜底刷新
+    async def run(self):
+        async with aiohttp.ClientSession() as session:
+            while True:
+                await self.refresh_from_rest(session)
+                await asyncio.sleep(self.rest_interval)
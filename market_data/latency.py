@@ -0,0 +1,230 @@
+"""
+行情到下单全链路延迟统计模块：
+- 单调时钟打点（time.perf_counter_ns），记录开销为一次 list 自增
+- HDR 风格直方图：对数分段 + 段内线性细分，固定内存，相对误差约 1/64
+- 按 stage / venue / symbol 分别统计
+- 本地 /metrics 接口输出 Prometheus 文本格式，另有周期性汇总打印
+
+stage 约定：
+- exchange_to_receive: 交易所事件时间 -> 本地收到消息（墙上时钟，受本机时钟偏差影响）
+- receive_to_decode:   收到消息 -> 解析完成
+- decode_to_snapshot:  解析完成 -> 写入 SharedMarketData
+- snapshot_to_signal:  写入快照 -> 策略给出信号
+- signal_to_order_ack: 策略信号 -> 下单接口返回
+
+WS 推送的 dict 里带 event_ms（交易所事件时间，epoch 毫秒）；启用统计时还带 recv_ns、decode_ns、snapshot_ns 供下游使用，
+关闭（enabled=False）时 WS client 不打点，也不带这三个字段
+"""
+import asyncio
+import time
+
+STAGE_EXCHANGE_TO_RECEIVE = 'exchange_to_receive'
+STAGE_RECEIVE_TO_DECODE = 'receive_to_decode'
+STAGE_DECODE_TO_SNAPSHOT = 'decode_to_snapshot'
+STAGE_SNAPSHOT_TO_SIGNAL = 'snapshot_to_signal'
+STAGE_SIGNAL_TO_ORDER_ACK = 'signal_to_order_ack'
+
+SUMMARY_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+now_ns = time.perf_counter_ns
+
+
+class LatencyHistogram:
+
+    def __init__(self, sub_bucket_bits=6, max_value_bits=40):
+        # 小于 2**sub_bucket_bits 的值逐个计数，之后每翻一倍分 half 个桶
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.half = self.sub_bucket_count >> 1
+        # index = sub_bucket_count + (shift - 1) * half + (value >> shift) - half，常数部分预先算好
+        self._index_base = self.sub_bucket_count - 2 * self.half
+        self.max_value = (1 << max_value_bits) - 1
+        self.counts = [0] * (self.sub_bucket_count + (max_value_bits - sub_bucket_bits) * self.half)
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return self._index_base + shift * self.half + (value >> shift)
+
+    def _bucket_bounds(self, index):
+        if index < self.sub_bucket_count:
+            return index, index
+        k = index - self.sub_bucket_count
+        shift = k // self.half + 1
+        mantissa = k % self.half + self.half
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    # 记录一个延迟（单位 ns，int），负数按 0 处理，超过上限截断；热路径上调用，保持内联
+    def record(self, value):
+        if value < 0:
+            value = 0
+        elif value > self.max_value:
+            value = self.max_value
+        if value < self.sub_bucket_count:
+            self.counts[value] += 1
+        else:
+            shift = value.bit_length() - self.sub_bucket_bits
+            self.counts[self._index_base + shift * self.half + (value >> shift)] += 1
+        self.total += 1
+        self.sum += value
+        if self.total == 1:
+            self.min = self.max = value
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+
+    # 取分位数，返回所在桶的中点
+    def percentile(self, q):
+        if self.total == 0:
+            return None
+        rank = max(1, int(round(q * self.total)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            seen += count
+            if seen >= rank:
+                low, high = self._bucket_bounds(index)
+                return min(max((low + high) // 2, self.min), self.max)
+        return self.max
+
+    def mean(self):
+        return self.sum / self.total if self.total else None
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total += other.total
+        self.sum += other.sum
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+
+class LatencyRecorder:
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.histograms = {}  # (stage, venue, symbol) -> LatencyHistogram
+
+    # 取（没有则新建）某个直方图；热路径上可以先取出来缓存，直接调用 LatencyHistogram.record，reset 不会替换对象
+    def histogram(self, stage, venue, symbol):
+        key = (stage, venue, symbol)
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = LatencyHistogram()
+        return hist
+
+    # 记录一段耗时；end_ns 不传则取当前时间
+    def record(self, stage, venue, symbol, start_ns, end_ns=None):
+        if not self.enabled or start_ns is None:
+            return
+        hist = self.histograms.get((stage, venue, symbol)) or self.histogram(stage, venue, symbol)
+        hist.record((end_ns or now_ns()) - start_ns)
+
+    def record_ns(self, stage, venue, symbol, elapsed_ns):
+        if not self.enabled or elapsed_ns is None:
+            return
+        self.histogram(stage, venue, symbol).record(int(elapsed_ns))
+
+    # 交易所事件时间(ms) -> 本地接收，基于墙上时钟
+    def record_exchange_lag(self, venue, symbol, event_ms, recv_wall_ns=None):
+        if not self.enabled or not event_ms:
+            return
+        hist = self.histograms.get((STAGE_EXCHANGE_TO_RECEIVE, venue, symbol)) or \
+            self.histogram(STAGE_EXCHANGE_TO_RECEIVE, venue, symbol)
+        hist.record((recv_wall_ns or time.time_ns()) - int(event_ms) * 1_000_000)
+
+    # 每个 stage 的汇总，可选合并所有 symbol
+    def summary(self, by_symbol=False):
+        grouped = {}
+        for (stage, venue, symbol), hist in self.histograms.items():
+            key = (stage, venue, symbol) if by_symbol else (stage, venue, '*')
+            if key not in grouped:
+                grouped[key] = LatencyHistogram()
+            grouped[key].merge(hist)
+
+        rows = []
+        for (stage, venue, symbol), hist in sorted(grouped.items()):
+            row = {'stage': stage, 'venue': venue, 'symbol': symbol, 'count': hist.total,
+                   'mean_us': hist.mean() / 1000 if hist.total else None,
+                   'max_us': hist.max / 1000 if hist.total else None}
+            for q in SUMMARY_QUANTILES:
+                value = hist.percentile(q)
+                row[f"p{q * 100:g}_us"] = value / 1000 if value is not None else None
+            rows.append(row)
+        return rows
+
+    def format_summary(self, by_symbol=False):
+        lines = []
+        for row in self.summary(by_symbol=by_symbol):
+            quantiles = ' '.join(f"{k[:-3]}={row[k]:.1f}" for k in row if k.startswith('p') and row[k] is not None)
+            lines.append(f"{row['stage']:<20} {row['venue']:<8} {row['symbol']:<14} n={row['count']:<8} "
+                         f"mean={row['mean_us']:.1f} {quantiles} max={row['max_us']:.1f} (us)")
+        return '\n'.join(lines)
+
+    # Prometheus 文本格式（summary 类型，单位秒）
+    def prometheus_text(self, metric='arb_latency_seconds'):
+        lines = [f"# HELP {metric} Latency per pipeline stage, venue and symbol.",
+                 f"# TYPE {metric} summary"]
+        for (stage, venue, symbol), hist in sorted(self.histograms.items()):
+            if not hist.total:
+                continue
+            labels = f'stage="{stage}",venue="{venue}",symbol="{symbol}"'
+            for q in SUMMARY_QUANTILES:
+                lines.append(f'{metric}{{{labels},quantile="{q}"}} {hist.percentile(q) / 1e9:.9f}')
+            lines.append(f"{metric}_sum{{{labels}}} {hist.sum / 1e9:.9f}")
+            lines.append(f"{metric}_count{{{labels}}} {hist.total}")
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        for hist in self.histograms.values():
+            hist.reset()
+
+    # 周期性打印汇总
+    async def summary_loop(self, interval=60, by_symbol=False, reset=False):
+        while True:
+            await asyncio.sleep(interval)
+            text = self.format_summary(by_symbol=by_symbol)
+            if text:
+                print(f"\n[Latency Summary]\n{text}")
+            if reset:
+                self.reset()
+
+
+# 本地 metrics 接口：GET /metrics
+async def start_metrics_server(recorder=None, host='127.0.0.1', port=9108):
+    from aiohttp import web
+
+    recorder = recorder or LATENCY
+
+    async def metrics(request):
+        return web.Response(text=recorder.prometheus_text(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    print(f"[Metrics] serving on http://{host}:{port}/metrics")
+    return runner
+
+
+# 进程内默认的全局 recorder，WS client / SharedMarketData / trader 共用
+LATENCY = LatencyRecorder()
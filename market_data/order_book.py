@@ -0,0 +1,66 @@
+"""
+本地盘口维护模块（Gate futures.order_book_update 增量推送）：
+- 推送只带变化的档位，顺序不固定，张数为该价位的最新总量，0 表示删除该档
+- 先用 REST order_book（with_id=true）的快照初始化，id 为快照对应的序号
+- 每条推送带 U/u（本条覆盖的第一个和最后一个序号）：u <= 当前序号的旧推送忽略；
+  U > 当前序号 + 1 说明中间有缺口，清空盘口，由调用方重新拉快照
+- 每次应用后只保留最优 depth 档，输出按价格排好序的 bids（降序）/ asks（升序）
+"""
+
+
+class LocalOrderBook:
+
+    def __init__(self, depth=20):
+        self.depth = depth
+        self.bids = {}  # 价格 -> 数量
+        self.asks = {}
+        self.last_id = None  # 已应用到的序号，None 表示未同步
+
+    @property
+    def synced(self):
+        return self.last_id is not None
+
+    def reset(self):
+        self.bids = {}
+        self.asks = {}
+        self.last_id = None
+
+    # bids / asks 为 (价格, 数量) 序列
+    def load_snapshot(self, book_id, bids, asks):
+        self.bids = {p: q for p, q in bids if q > 0}
+        self.asks = {p: q for p, q in asks if q > 0}
+        self.last_id = int(book_id)
+        self._trim()
+
+    # 应用一条增量；返回 False 表示未同步或出现序号缺口，需要重新拉快照
+    def apply(self, first_id, last_id, bids, asks):
+        if self.last_id is None:
+            return False
+        if last_id <= self.last_id:
+            return True
+        if first_id > self.last_id + 1:
+            self.reset()
+            return False
+        for side, levels in ((self.bids, bids), (self.asks, asks)):
+            for p, q in levels:
+                if q > 0:
+                    side[p] = q
+                else:
+                    side.pop(p, None)
+        self.last_id = last_id
+        self._trim()
+        return True
+
+    def _trim(self):
+        if len(self.bids) > self.depth:
+            self.bids = dict(sorted(self.bids.items(), reverse=True)[:self.depth])
+        if len(self.asks) > self.depth:
+            self.asks = dict(sorted(self.asks.items())[:self.depth])
+
+    # 排好序的前 depth 档，格式同 WS client 推送的 orderbook
+    def top(self, depth=None):
+        depth = depth or self.depth
+        return {
+            'bids': sorted(self.bids.items(), reverse=True)[:depth],
+            'asks': sorted(self.asks.items())[:depth],
+        }
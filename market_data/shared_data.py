@@ -1,11 +1,57 @@
+from datetime import datetime, timezone
+
+from market_data.latency import LATENCY, STAGE_DECODE_TO_SNAPSHOT, STAGE_SNAPSHOT_TO_SIGNAL, now_ns
+
+
 class SharedMarketData:
-    def __init__(self):
+    def __init__(self, latency=LATENCY):
         self.snapshot = {}
+        self.latency = latency
+        self._hists = {}  # 快照 key -> decode_to_snapshot 直方图
 
     def update(self, data: dict):
-        symbol = data['symbol']
-        source = data['source']
-        self.snapshot[f"{source}_{symbol}"] = data
+        key = f"{data['source']}_{data['symbol']}"
+        decode_ns = data.get('decode_ns')
+        if decode_ns is not None and self.latency.enabled:
+            snapshot_ns = data['snapshot_ns'] = now_ns()
+            hist = self._hists.get(key)
+            if hist is None:
+                hist = self._hists[key] = self.latency.histogram(STAGE_DECODE_TO_SNAPSHOT, data['source'], data['symbol'])
+            hist.record(snapshot_ns - decode_ns)
+        self.snapshot[key] = data
+
+    # 本地盘口的最优价：side='long' 取 ask（买入），'short' 取 bid（卖出）
+    # symbol 用 WS client 的格式（Binance 'btcusdt'，Gate 'BTC_USDT'）；没有盘口或超过 max_age 秒未更新返回 None
+    # Gate 的 orderbook 是 GateWSClient 用增量推送维护好的本地盘口，不是原始增量；数量为 0 的档位跳过
+    def best_price(self, source, symbol, side, max_age=2.0):
+        data = self.snapshot.get(f"{source}_{symbol}")
+        if data is None or not data.get('orderbook'):
+            return None
+        timestamp = data.get('timestamp')
+        if max_age is not None and (timestamp is None or
+                                    (datetime.now(timezone.utc) - timestamp).total_seconds() > max_age):
+            return None
+        level = best_level(data['orderbook'].get('asks' if side == 'long' else 'bids'))
+        return float(level[0]) if level else None
 
     def get_snapshot(self):
-        return self.snapshot.copy()  # 返回副本避免线程/协程问题
\ No newline at end of file
+        return self.snapshot.copy()  # 返回副本避免线程/协程问题
+
+    # 策略基于某条快照产生信号时调用，返回信号时间，供下单时计算 signal_to_order_ack
+    def mark_signal(self, data: dict):
+        signal_ns = now_ns()
+        self.latency.record(STAGE_SNAPSHOT_TO_SIGNAL, data['source'], data['symbol'], data.get('snapshot_ns'), signal_ns)
+        return signal_ns
+
+
+# 统一 symbol 格式：Binance 'btcusdt' / Gate 'BTC_USDT' -> 'BTCUSDT'
+def normalize_symbol(symbol: str):
+    return symbol.upper().replace('_', '')
+
+
+# 盘口一侧第一个数量大于 0 的档位 (价格, 数量)，没有返回 None
+def best_level(levels):
+    for level in levels or ():
+        if float(level[1]) > 0:
+            return level
+    return None
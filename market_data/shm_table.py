@@ -0,0 +1,295 @@
+"""
+多进程行情分发模块（共享内存 + seqlock）：
+- 行情进程持有所有 WS client，把解析后的最优买卖价、标记价格、资金费率写入共享内存表
+- 表结构：每个 (symbol, venue) 一行，所有字段都是 8 字节，numpy 直接映射共享内存，不拷贝不 pickle
+- 每行一个 seqlock 序号：写入前后各 +1，奇数表示正在写；读方读到前后序号一致且为偶数才算有效
+- 策略、落盘、监控等读进程 attach 同名共享内存即可，按行序号判断是否有更新
+- 价格类字段初始为 NaN，没收到过推送的字段读出来是 NaN 而不是 0
+- bid_qty / ask_qty 两边统一为币数量：Gate 盘口是张数，写入前乘 quanto_multiplier；
+  行情进程启动时从 REST contracts 拉取，拿不到面值的 Gate 合约不写数量（保持 NaN）
+- Gate 最优价取 GateWSClient 用增量推送维护的本地盘口，数量为 0 的档位跳过
+
+只支持单写进程；seqlock 依赖写入顺序对读方可见，x86 下成立。
+"""
+import asyncio
+import time
+from multiprocessing import Process, parent_process, shared_memory
+
+import aiohttp
+import numpy as np
+
+from config import GATE_PROXY
+from market_data.funding_feed import GATE_CONTRACTS_URL
+from market_data.shared_data import best_level, normalize_symbol
+
+MAGIC = 0x41524253484D3031  # 'ARBSHM01'
+DEFAULT_NAME = 'arb_market_table'
+VENUES = ('binance', 'gate')
+
+HEADER_DTYPE = np.dtype([('magic', 'i8'), ('n_symbols', 'i8'), ('n_venues', 'i8'), ('global_seq', 'i8')])
+SYMBOL_DTYPE = np.dtype('S32')
+VENUE_DTYPE = np.dtype('S16')
+
+# 行内字段，全部 8 字节；seq / *_ms / *_ns 按 int64 读写，其余按 float64
+FIELDS = ('seq', 'bid', 'bid_qty', 'ask', 'ask_qty', 'mark', 'funding_rate', 'next_funding_ms', 'event_ms',
+          'write_ns')
+INT_FIELDS = ('seq', 'next_funding_ms', 'event_ms', 'write_ns')
+FLOAT_FIELDS = tuple(name for name in FIELDS if name not in INT_FIELDS)
+COL = {name: i for i, name in enumerate(FIELDS)}
+
+
+def _layout(n_symbols, n_venues):
+    symbols_offset = HEADER_DTYPE.itemsize
+    venues_offset = symbols_offset + n_symbols * SYMBOL_DTYPE.itemsize
+    records_offset = venues_offset + n_venues * VENUE_DTYPE.itemsize
+    records_offset = (records_offset + 63) // 64 * 64  # 对齐 cache line
+    size = records_offset + n_symbols * n_venues * len(FIELDS) * 8
+    return symbols_offset, venues_offset, records_offset, size
+
+
+def _open_shm(name):
+    # 3.13 之前 attach 方也会被 resource_tracker 登记，独立启动的读进程退出时会误删共享内存；
+    # multiprocessing 子进程和父进程共用同一个 tracker，不能注销，否则创建方 unlink 时报错
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if parent_process() is None:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class ShmMarketTable:
+
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=shm.buf)
+        if self.header['magic'][0] != MAGIC:
+            raise ValueError(f"shared memory {shm.name} is not a market table")
+        n_symbols = int(self.header['n_symbols'][0])
+        n_venues = int(self.header['n_venues'][0])
+        symbols_offset, venues_offset, records_offset, _ = _layout(n_symbols, n_venues)
+
+        names = np.ndarray((n_symbols,), dtype=SYMBOL_DTYPE, buffer=shm.buf, offset=symbols_offset)
+        venues = np.ndarray((n_venues,), dtype=VENUE_DTYPE, buffer=shm.buf, offset=venues_offset)
+        self.symbols = [s.decode() for s in names]
+        self.venues = [v.decode() for v in venues]
+        self._symbol_index = {s: i for i, s in enumerate(self.symbols)}
+        self._venue_index = {v: i for i, v in enumerate(self.venues)}
+
+        shape = (n_symbols * n_venues, len(FIELDS))
+        # 同一块内存的 float64 / int64 两个视图
+        self._f = np.ndarray(shape, dtype=np.float64, buffer=shm.buf, offset=records_offset)
+        self._i = np.ndarray(shape, dtype=np.int64, buffer=shm.buf, offset=records_offset)
+        self.unknown = 0
+        self.quanto = {}     # 统一格式 symbol -> Gate quanto_multiplier，只在写进程里用
+        self.no_quanto = 0   # 没有合约面值、没写数量的 Gate 盘口推送数
+
+    # 行情进程（或其父进程）创建共享内存表
+    @classmethod
+    def create(cls, symbols, venues=VENUES, name=DEFAULT_NAME):
+        symbols = [normalize_symbol(s) for s in symbols]
+        symbols_offset, venues_offset, _, size = _layout(len(symbols), len(venues))
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:size] = bytes(size)
+
+        np.ndarray((len(symbols),), dtype=SYMBOL_DTYPE, buffer=shm.buf, offset=symbols_offset)[:] = \
+            [s.encode() for s in symbols]
+        np.ndarray((len(venues),), dtype=VENUE_DTYPE, buffer=shm.buf, offset=venues_offset)[:] = \
+            [v.encode() for v in venues]
+        header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=shm.buf)
+        header['n_symbols'] = len(symbols)
+        header['n_venues'] = len(venues)
+        header['global_seq'] = 0
+        header['magic'] = MAGIC
+        table = cls(shm, owner=True)
+        table._f[:, [COL[name] for name in FLOAT_FIELDS]] = np.nan
+        return table
+
+    # 读进程 attach 已有的表
+    @classmethod
+    def attach(cls, name=DEFAULT_NAME):
+        return cls(_open_shm(name), owner=False)
+
+    def set_quanto(self, symbol, multiplier):
+        self.quanto[normalize_symbol(symbol)] = float(multiplier)
+
+    async def refresh_quanto(self, session=None, proxy=GATE_PROXY):
+        own_session = session is None
+        session = session or aiohttp.ClientSession()
+        try:
+            async with session.get(GATE_CONTRACTS_URL, proxy=proxy) as resp:
+                resp.raise_for_status()
+                for item in await resp.json():
+                    if item.get('quanto_multiplier'):
+                        self.set_quanto(item['name'], item['quanto_multiplier'])
+        except Exception as e:
+            print(f"[ShmTable] Can't load Gate quanto multipliers: {e}")
+        finally:
+            if own_session:
+                await session.close()
+
+    def row(self, venue, symbol):
+        s = self._symbol_index.get(normalize_symbol(symbol))
+        v = self._venue_index.get(venue)
+        if s is None or v is None:
+            return None
+        return s * len(self.venues) + v
+
+    # 所有行累计写入次数，读方可据此快速判断整表是否有变化
+    @property
+    def global_seq(self):
+        return int(self.header['global_seq'][0])
+
+    # 写入一行；只更新传入的字段
+    def write(self, venue, symbol, **fields):
+        row = self.row(venue, symbol)
+        if row is None:
+            self.unknown += 1
+            return False
+        ints = self._i[row]
+        floats = self._f[row]
+        ints[0] += 1  # 奇数：写入中
+        for name, value in fields.items():
+            if value is None:
+                continue
+            if name in INT_FIELDS:
+                ints[COL[name]] = int(value)
+            else:
+                floats[COL[name]] = value
+        ints[COL['write_ns']] = time.time_ns()
+        ints[0] += 1  # 偶数：写入完成
+        self.header['global_seq'] += 1
+        return True
+
+    # 作为 WS client 的 on_update：把推送的 dict 转成表字段；数量统一换成币数量
+    def publish(self, data: dict):
+        fields = {'event_ms': data.get('event_ms')}
+        orderbook = data.get('orderbook')
+        if orderbook is not None:
+            multiplier = 1.0
+            if data['source'] == 'gate':
+                multiplier = self.quanto.get(normalize_symbol(data['symbol']))
+                if multiplier is None:
+                    self.no_quanto += 1
+            bid, ask = best_level(orderbook.get('bids')), best_level(orderbook.get('asks'))
+            if bid:
+                fields['bid'] = float(bid[0])
+                if multiplier is not None:
+                    fields['bid_qty'] = float(bid[1]) * multiplier
+            if ask:
+                fields['ask'] = float(ask[0])
+                if multiplier is not None:
+                    fields['ask_qty'] = float(ask[1]) * multiplier
+        if data.get('price') is not None:
+            fields['mark'] = float(data['price'])
+        if data.get('funding_rate') is not None:
+            fields['funding_rate'] = float(data['funding_rate'])
+        fields['next_funding_ms'] = data.get('next_funding_time')
+        self.write(data['source'], data['symbol'], **fields)
+
+    # seqlock 读一行，返回 dict；从未写入过返回 None
+    def read(self, venue, symbol, retries=1000):
+        row = self.row(venue, symbol)
+        if row is None:
+            return None
+        return self._read_row(row, retries)
+
+    def _read_row(self, row, retries=1000):
+        seq_col = self._i[:, 0]
+        for attempt in range(retries):
+            if attempt:
+                time.sleep(0)  # 和写进程撞上时让出 CPU
+            before = int(seq_col[row])
+            if before & 1:
+                continue
+            floats = self._f[row].copy()
+            if int(seq_col[row]) == before:
+                if before == 0:
+                    return None
+                ints = floats.view(np.int64)
+                out = {name: (int(ints[i]) if name in INT_FIELDS else float(floats[i]))
+                       for i, name in enumerate(FIELDS)}
+                s, v = divmod(row, len(self.venues))
+                out['symbol'] = self.symbols[s]
+                out['venue'] = self.venues[v]
+                return out
+        raise TimeoutError(f"seqlock read of row {row} kept colliding with the writer")
+
+    # 当前所有行的序号，供读方对比判断哪些行有更新
+    def seqs(self):
+        return self._i[:, 0].copy()
+
+    # 返回 last_seqs 之后有更新的行，以及新的序号数组
+    def changed_since(self, last_seqs=None):
+        seqs = self.seqs()
+        rows = np.arange(len(seqs)) if last_seqs is None else np.nonzero(seqs != last_seqs)[0]
+        updates = [r for r in (self._read_row(int(row)) for row in rows) if r is not None]
+        return updates, seqs
+
+    # 一次读出整张表（各行分别满足 seqlock，不同行之间不保证同一时刻）
+    def snapshot(self):
+        updates, _ = self.changed_since(None)
+        return {(u['venue'], u['symbol']): u for u in updates}
+
+    def close(self):
+        self.header = self._f = self._i = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# 行情进程：attach 共享内存表，为每个 symbol 启动两边的 WS client
+def run_ingestion(symbols, name=DEFAULT_NAME, channels=('orderbook', 'mark_price')):
+    from market_data.ws_market_data import BinanceWSClient, GateWSClient
+
+    table = ShmMarketTable.attach(name)
+
+    async def main():
+        await table.refresh_quanto()
+        tasks = []
+        for symbol in symbols:
+            base = normalize_symbol(symbol).replace('USDT', '')
+            binance = BinanceWSClient(symbol=f"{base}USDT", on_update=table.publish)
+            gate = GateWSClient(symbol=f"{base}_USDT", on_update=table.publish)
+            if 'orderbook' in channels:
+                tasks += [binance.subscribe_orderbook(), gate.subscribe_orderbook()]
+            if 'mark_price' in channels:
+                tasks += [binance.subscribe_mark_price(), gate.subscribe_ticker()]
+        await asyncio.gather(*tasks)
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        table.close()
+
+
+# 父进程创建共享内存表并启动行情子进程；返回 (table, process)，退出时 table.close() 释放共享内存
+def start_ingestion_process(symbols, name=DEFAULT_NAME, channels=('orderbook', 'mark_price')):
+    table = ShmMarketTable.create(symbols, name=name)
+    process = Process(target=run_ingestion, args=(symbols, name, channels), daemon=True, name='market-ingestion')
+    process.start()
+    return table, process
+
+
+if __name__ == '__main__':
+
+    from pprint import pprint
+
+    table, process = start_ingestion_process(['RVNUSDT', 'BIDUSDT'])
+    try:
+        last = None
+        while True:
+            updates, last = table.changed_since(last)
+            if updates:
+                pprint(updates)
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Stopped by user.")
+    finally:
+        process.terminate()
+        table.close()
@@ -0,0 +1,172 @@
+"""
+多交易所价差矩阵：
+- 每个 symbol 维护 N 个交易所的最优买卖价 / 中间价，以及 N x N 价差矩阵
+  mid[i, j]  = (mid_i - mid_j) / mid_i，两个交易所时 mid[binance, gate] 即 diff_pct
+  exec[i, j] = (bid_i - ask_j) / bid_i，在 i 卖出、在 j 买入能锁定的价差（已扣买卖价差）
+- 某个交易所有更新时只重算它所在的一行一列（O(N)），不重算整个矩阵（O(N^2)）
+- 作为 WS client / VenueAdapter.stream_* 的 on_update 使用，也可以挂在 FanOut 的消费者后面
+- 还没有报价的交易所对应的行列是 NaN；设置 max_age_ms 后，best / opportunities 跳过报价过期的交易所
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from market_data.shared_data import normalize_symbol
+
+
+class SymbolSpreads:
+    __slots__ = ('bid', 'ask', 'mark', 'mid', 'event_ms', 'mid_spread', 'exec_spread', 'version')
+
+    def __init__(self, n):
+        self.bid = np.full(n, np.nan)
+        self.ask = np.full(n, np.nan)
+        self.mark = np.full(n, np.nan)
+        self.mid = np.full(n, np.nan)
+        self.event_ms = np.zeros(n, dtype=np.int64)
+        self.mid_spread = np.full((n, n), np.nan)
+        self.exec_spread = np.full((n, n), np.nan)
+        self.version = 0
+
+
+class SpreadMatrix:
+
+    # max_age_ms: 交易所报价超过多少毫秒（按 event_ms）未更新视为过期，None 为不检查
+    def __init__(self, venues, max_age_ms=None):
+        self.venues = list(venues)
+        self.max_age_ms = max_age_ms
+        self.index = {v: i for i, v in enumerate(self.venues)}
+        self.symbols = {}  # 统一格式 symbol -> SymbolSpreads
+        self.updates = 0
+        self.pair_updates = 0  # 累计重算的交易所对数量，用于确认是 O(N) 增量
+
+    def _spreads(self, symbol):
+        spreads = self.symbols.get(symbol)
+        if spreads is None:
+            spreads = self.symbols[symbol] = SymbolSpreads(len(self.venues))
+        return spreads
+
+    # 更新某交易所某 symbol 的报价并重算相关的一行一列
+    def update_quote(self, venue, symbol, bid=None, ask=None, mark=None, event_ms=None):
+        k = self.index[venue]
+        s = self._spreads(normalize_symbol(symbol))
+        if bid is not None:
+            s.bid[k] = bid
+        if ask is not None:
+            s.ask[k] = ask
+        if mark is not None:
+            s.mark[k] = mark
+        if event_ms:
+            s.event_ms[k] = event_ms
+        # 有盘口时用盘口中间价，只有标记价格时用标记价格
+        if np.isfinite(s.bid[k]) and np.isfinite(s.ask[k]):
+            s.mid[k] = (s.bid[k] + s.ask[k]) / 2
+        elif np.isfinite(s.mark[k]):
+            s.mid[k] = s.mark[k]
+        self._recompute(s, k)
+
+    def _recompute(self, s, k):
+        mid, bid, ask = s.mid, s.bid, s.ask
+        with np.errstate(divide='ignore', invalid='ignore'):
+            s.mid_spread[k, :] = (mid[k] - mid) / mid[k]
+            s.mid_spread[:, k] = (mid - mid[k]) / mid
+            s.exec_spread[k, :] = (bid[k] - ask) / bid[k]  # 在 k 卖、在 j 买
+            s.exec_spread[:, k] = (bid - ask[k]) / bid     # 在 i 卖、在 k 买
+        s.mid_spread[k, k] = np.nan
+        s.exec_spread[k, k] = np.nan
+        s.version += 1
+        self.updates += 1
+        self.pair_updates += 2 * (len(self.venues) - 1)
+
+    # 作为 on_update：orderbook 取最优一档，标记价格消息取 price
+    def on_update(self, data: dict):
+        venue = data['source']
+        if venue not in self.index:
+            return
+        orderbook = data.get('orderbook')
+        bid = ask = None
+        if orderbook is not None:
+            if orderbook.get('bids'):
+                bid = float(orderbook['bids'][0][0])
+            if orderbook.get('asks'):
+                ask = float(orderbook['asks'][0][0])
+        mark = data.get('price')
+        self.update_quote(venue, data['symbol'], bid=bid, ask=ask, mark=float(mark) if mark is not None else None,
+                          event_ms=data.get('event_ms'))
+
+    def get(self, symbol):
+        s = self.symbols.get(normalize_symbol(symbol))
+        if s is None:
+            return None
+        return {'venues': self.venues, 'bid': s.bid.copy(), 'ask': s.ask.copy(), 'mid': s.mid.copy(),
+                'mid_spread': s.mid_spread.copy(), 'exec_spread': s.exec_spread.copy(), 'version': s.version}
+
+    # kind: 'exec' / 'mid'，返回以交易所为行列的 DataFrame
+    def frame(self, symbol, kind='exec'):
+        s = self.symbols.get(normalize_symbol(symbol))
+        if s is None:
+            return None
+        matrix = s.exec_spread if kind == 'exec' else s.mid_spread
+        return pd.DataFrame(matrix.copy(), index=self.venues, columns=self.venues)
+
+    # 报价未过期的交易所掩码；没设 max_age_ms 时全部有效
+    def fresh(self, symbol, now_ms=None):
+        s = self.symbols.get(normalize_symbol(symbol))
+        if s is None:
+            return None
+        if self.max_age_ms is None:
+            return np.ones(len(self.venues), dtype=bool)
+        now_ms = now_ms or int(time.time() * 1000)
+        return (s.event_ms > 0) & (now_ms - s.event_ms <= self.max_age_ms)
+
+    # 某 symbol 当前最大的可执行价差：(卖出交易所, 买入交易所, 价差)；过期交易所所在的行列不参与
+    def best(self, symbol, now_ms=None):
+        s = self.symbols.get(normalize_symbol(symbol))
+        if s is None:
+            return None
+        fresh = self.fresh(symbol, now_ms)
+        spreads = np.where(fresh[:, None] & fresh[None, :], s.exec_spread, np.nan)
+        if not np.isfinite(spreads).any():
+            return None
+        flat = np.nanargmax(spreads)
+        i, j = divmod(int(flat), len(self.venues))
+        return self.venues[i], self.venues[j], float(spreads[i, j])
+
+    # 所有 symbol 中可执行价差不低于 min_spread 的机会，按价差从大到小
+    def opportunities(self, min_spread=0.0, now_ms=None):
+        out = []
+        for symbol in self.symbols:
+            best = self.best(symbol, now_ms)
+            if best is not None and best[2] >= min_spread:
+                out.append({'symbol': symbol, 'sell': best[0], 'buy': best[1], 'spread': best[2]})
+        return sorted(out, key=lambda r: r['spread'], reverse=True)
+
+
+if __name__ == '__main__':
+
+    import asyncio
+    from pprint import pprint
+
+    from venues.binance import BinanceVenue
+    from venues.gate import GateVenue
+
+    adapters = [BinanceVenue(), GateVenue()]
+    matrix = SpreadMatrix([a.name for a in adapters])
+    symbols = ['RVNUSDT', 'BIDUSDT']
+
+    async def print_loop():
+        while True:
+            await asyncio.sleep(2)
+            for symbol in symbols:
+                print(symbol)
+                print(matrix.frame(symbol))
+            pprint(matrix.opportunities())
+
+    async def main():
+        streams = [a.stream_orderbook(s, matrix.on_update) for a in adapters for s in symbols]
+        await asyncio.gather(print_loop(), *streams)
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("Stopped by user.")
@@ -1,18 +1,51 @@
 import asyncio
+import inspect
 import json
+import time
 import aiohttp
 from datetime import datetime, timezone
 
 from config import BINANCE_PROXY, GATE_PROXY
+from market_data.latency import LATENCY, STAGE_EXCHANGE_TO_RECEIVE, STAGE_RECEIVE_TO_DECODE, now_ns
+from market_data.order_book import LocalOrderBook
+
+
+# 调用 on_update；返回协程时（如 FanOut 的 block 消费者已满）等待其完成
+async def _emit(on_update, data):
+    result = on_update(data)
+    if result is not None and inspect.isawaitable(result):
+        await result
+
+
+# 启用延迟统计时给推送打点：带上 recv_ns / decode_ns，记录 receive->decode 和交易所延迟；
+# 关闭时 handler 不调用，推送里也没有这两个字段。两个直方图第一次用到时取出缓存在 client 上，省去每条按 key 查找
+def _stamp(client, update, recv_ns):
+    decode_ns = now_ns()
+    hists = client._hists
+    if hists is None:
+        hists = client._hists = (client.latency.histogram(STAGE_RECEIVE_TO_DECODE, update['source'], client.symbol),
+                                 client.latency.histogram(STAGE_EXCHANGE_TO_RECEIVE, update['source'], client.symbol))
+    update['recv_ns'] = recv_ns = recv_ns or decode_ns
+    update['decode_ns'] = decode_ns
+    hists[0].record(decode_ns - recv_ns)
+    event_ms = update['event_ms']
+    if event_ms:
+        hists[1].record(time.time_ns() - int(event_ms) * 1_000_000)
+
 
 class BinanceWSClient:
 
     base_url = "wss://fstream.binance.com/ws"
 
-    def __init__(self, symbol: str, on_update, proxy: str = BINANCE_PROXY):
+    # base_url: 指向其他地址（如 sim/exchange.py 的模拟交易所）时传入
+    def __init__(self, symbol: str, on_update, proxy: str = BINANCE_PROXY, latency=LATENCY, base_url=None):
         self.symbol = symbol.lower() # Binance symbol like 'btcusdt'
         self.proxy = proxy
+        if base_url:
+            self.base_url = base_url
         self.on_update = on_update
+        self.latency = latency
+        self._hists = None  # _stamp 缓存的 (receive_to_decode, exchange_to_receive) 直方图
 
     async def _run_ws_loop(self, url, handler_func):
         while True:
@@ -21,7 +54,7 @@ class BinanceWSClient:
                     async with session.ws_connect(url, proxy=self.proxy) as ws:
                         async for msg in ws:
                             if msg.type == aiohttp.WSMsgType.TEXT:
-                                await handler_func(msg)
+                                await handler_func(msg, recv_ns=now_ns() if self.latency.enabled else None)
             except Exception as e:
                 print(f"[Binance WS Error] {e}")
                 await asyncio.sleep(5)
@@ -30,42 +63,82 @@ class BinanceWSClient:
         url = f"{self.base_url}/{self.symbol}@markPrice"
         await self._run_ws_loop(url, self._handle_mark_price)
 
-    async def _handle_mark_price(self, msg):
+    async def _handle_mark_price(self, msg, recv_ns=None):
         data = json.loads(msg.data)
         mark_price = float(data['p'])
-        funding_rate = float(data.get('r', 0))
-        self.on_update({
+        funding_rate = float(data['r']) if data.get('r') else None
+        update = {
             'source': 'binance',
             'symbol': self.symbol,
             'timestamp': datetime.now(timezone.utc),
+            'event_ms': data.get('E'),
             'price': mark_price,
-            'funding_rate': funding_rate
-        })
+            'funding_rate': funding_rate,
+            'next_funding_time': data.get('T')
+        }
+        if self.latency.enabled:
+            _stamp(self, update, recv_ns)
+        await _emit(self.on_update, update)
 
     async def subscribe_orderbook(self, depth=5):
         url = f"{self.base_url}/{self.symbol}@depth{depth}"
         await self._run_ws_loop(url, self._handle_orderbook)
 
-    async def _handle_orderbook(self, msg):
+    async def _handle_orderbook(self, msg, recv_ns=None):
         data = json.loads(msg.data)
+        # 局部盘口推送本身就是订阅的 depth 档，不再截断
         orderbook = {
-            'bids': data.get('b', [])[:5],
-            'asks': data.get('a', [])[:5],
+            'bids': data.get('b', []),
+            'asks': data.get('a', []),
         }
-        self.on_update({
+        update = {
             'source': 'binance',
             'symbol': self.symbol,
             'timestamp': datetime.now(timezone.utc),
+            'event_ms': data.get('E'),
             'orderbook': orderbook
-        })
+        }
+        if self.latency.enabled:
+            _stamp(self, update, recv_ns)
+        await _emit(self.on_update, update)
+
+    # 归集成交：trades 为 [(成交时间ms, 价格, 数量)]，数量为币数量，供 bar_builder 合成秒级K线
+    async def subscribe_trades(self):
+        url = f"{self.base_url}/{self.symbol}@aggTrade"
+        await self._run_ws_loop(url, self._handle_trades)
+
+    async def _handle_trades(self, msg, recv_ns=None):
+        data = json.loads(msg.data)
+        trades = [(data['T'], float(data['p']), float(data['q']))]
+        update = {
+            'source': 'binance',
+            'symbol': self.symbol,
+            'timestamp': datetime.now(timezone.utc),
+            'event_ms': data.get('E'),
+            'trades': trades
+        }
+        if self.latency.enabled:
+            _stamp(self, update, recv_ns)
+        await _emit(self.on_update, update)
 
 class GateWSClient:
     base_url = "wss://fx-ws.gateio.ws/v4/ws/usdt"
+    rest_url = "https://api.gateio.ws/api/v4"
 
-    def __init__(self, symbol: str, on_update, proxy: str = GATE_PROXY):
+    # rest_url: 盘口快照的 REST 地址，指向模拟交易所时和 base_url 一起传入
+    def __init__(self, symbol: str, on_update, proxy: str = GATE_PROXY, latency=LATENCY, base_url=None,
+                 rest_url=None):
         self.symbol = symbol.upper()
         self.proxy = proxy
+        if base_url:
+            self.base_url = base_url
+        if rest_url:
+            self.rest_url = rest_url
+        # order_book_update 是增量推送，本地维护盘口，推给下游的是排好序的完整前 depth 档
+        self.book = LocalOrderBook()
         self.on_update = on_update
+        self.latency = latency
+        self._hists = None  # _stamp 缓存的 (receive_to_decode, exchange_to_receive) 直方图
 
     async def _run_ws_loop(self, url, subscribe_msg, handler_func):
         while True:
@@ -75,7 +148,7 @@ class GateWSClient:
                         await ws.send_json(subscribe_msg)
                         async for msg in ws:
                             if msg.type == aiohttp.WSMsgType.TEXT:
-                                await handler_func(msg)
+                                await handler_func(msg, recv_ns=now_ns() if self.latency.enabled else None)
             except Exception as e:
                 print(f"[Gate WS Error] {e}")
                 await asyncio.sleep(5)
@@ -89,23 +162,31 @@ class GateWSClient:
         }
         await self._run_ws_loop(self.base_url, subscribe_msg, self._handle_ticker)
 
-    async def _handle_ticker(self, msg):
+    async def _handle_ticker(self, msg, recv_ns=None):
         data = json.loads(msg.data)
         if data.get("event") == "update":
             try:
                 ticker = data["result"][0]
                 mark_price = float(ticker["mark_price"])
-                self.on_update({
+                funding_rate = ticker.get("funding_rate")
+                predicted_rate = ticker.get("funding_rate_indicative")
+                update = {
                     'source': 'gate',
                     'symbol': self.symbol,
                     'timestamp': datetime.now(timezone.utc),
+                    'event_ms': data.get('time_ms'),
                     'price': mark_price,
-                    'funding_rate': None  # 你也可以在 future 做延迟更新
-                })
+                    'funding_rate': float(funding_rate) if funding_rate else None,
+                    'predicted_funding_rate': float(predicted_rate) if predicted_rate else None
+                }
+                if self.latency.enabled:
+                    _stamp(self, update, recv_ns)
+                await _emit(self.on_update, update)
             except Exception as e:
                 print(f"[Gate Parse Error] {e}")
 
     async def subscribe_orderbook(self, depth=20, interval='100ms'):
+        self.book = LocalOrderBook(depth)
         subscribe_msg = {
             "time": int(datetime.now(timezone.utc).timestamp()),
             "channel": "futures.order_book_update",
@@ -116,35 +197,101 @@ class GateWSClient:
                                 subscribe_msg=subscribe_msg,
                                 handler_func=self._handle_orderbook)
 
-    async def _handle_orderbook(self, msg):
+    # REST 快照初始化本地盘口，id 和推送的 U/u 是同一序列
+    async def _sync_book(self):
+        params = {'contract': self.symbol, 'limit': str(self.book.depth), 'with_id': 'true'}
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"{self.rest_url}/futures/usdt/order_book", params=params,
+                                       proxy=self.proxy) as resp:
+                    resp.raise_for_status()
+                    snapshot = await resp.json()
+        except Exception as e:
+            print(f"[Gate Orderbook Snapshot Error] {e}")
+            return
+        self.book.load_snapshot(snapshot['id'],
+                                [(float(level['p']), float(level['s'])) for level in snapshot.get('bids', [])],
+                                [(float(level['p']), float(level['s'])) for level in snapshot.get('asks', [])])
+
+    # 增量推送先应用到本地盘口；未同步或序号断开时拉快照重建，快照比这条推送还旧就等下一条
+    async def _handle_orderbook(self, msg, recv_ns=None):
         data = json.loads(msg.data)
         if data.get("event") == "update":
             try:
                 result = data.get("result", {})
-                bids = result.get('b', []) or result.get('bids', [])
-                asks = result.get('a', []) or result.get('asks', [])
-
-                orderbook = {
-                'bids': [(float(bid['p']), float(bid['s'])) for bid in bids[:5]] if bids else [],
-                'asks': [(float(ask['p']), float(ask['s'])) for ask in asks[:5]] if asks else [],
-            }
-                self.on_update({
+                bids = [(float(bid['p']), float(bid['s'])) for bid in result.get('b', [])]
+                asks = [(float(ask['p']), float(ask['s'])) for ask in result.get('a', [])]
+                first_id, last_id = int(result['U']), int(result['u'])
+                if not self.book.apply(first_id, last_id, bids, asks):
+                    await self._sync_book()
+                    if not self.book.apply(first_id, last_id, bids, asks):
+                        return
+                orderbook = self.book.top()
+                event_ms = result.get('t') or data.get('time_ms')
+                update = {
                     'source': 'gate',
                     'symbol': self.symbol,
                     'timestamp': datetime.now(timezone.utc),
+                    'event_ms': event_ms,
                     'orderbook': orderbook
-                })
+                }
+                if self.latency.enabled:
+                    _stamp(self, update, recv_ns)
+                await _emit(self.on_update, update)
             except Exception as e:
                 print(f"[Gate Orderbook Parse Error] {e}")
 
+    # 逐笔成交：trades 为 [(成交时间ms, 价格, 张数)]，张数不带方向（size 负数为卖方主动）
+    async def subscribe_trades(self):
+        subscribe_msg = {
+            "time": int(datetime.now(timezone.utc).timestamp()),
+            "channel": "futures.trades",
+            "event": "subscribe",
+            "payload": [self.symbol]
+        }
+        await self._run_ws_loop(url=self.base_url,
+                                subscribe_msg=subscribe_msg,
+                                handler_func=self._handle_trades)
+
+    async def _handle_trades(self, msg, recv_ns=None):
+        data = json.loads(msg.data)
+        if data.get("event") == "update":
+            try:
+                trades = [(t.get('create_time_ms') or t['create_time'] * 1000, float(t['price']), abs(float(t['size'])))
+                          for t in data.get("result", [])]
+                if not trades:
+                    return
+                update = {
+                    'source': 'gate',
+                    'symbol': self.symbol,
+                    'timestamp': datetime.now(timezone.utc),
+                    'event_ms': data.get('time_ms'),
+                    'trades': trades
+                }
+                if self.latency.enabled:
+                    _stamp(self, update, recv_ns)
+                await _emit(self.on_update, update)
+            except Exception as e:
+                print(f"[Gate Trades Parse Error] {e}")
+
 if __name__ == "__main__":
     from pprint import pprint
-    from shared_data import SharedMarketData
+    from market_data.shared_data import SharedMarketData
+    from market_data.latency import LATENCY, start_metrics_server
+    from market_data.funding_feed import FundingFeed
+    from market_data.fanout import FanOut, POLICY_COALESCE
 
     shared_data = SharedMarketData()
+    funding_feed = FundingFeed()
+
+    # WS 接收循环只做入队，快照和资金费率只关心最新值，用 coalesce
+    fanout = FanOut()
+    snapshot_sub = fanout.subscribe('snapshot', policy=POLICY_COALESCE, capacity=1024)
 
-    def on_update_handler(data):
-        shared_data.update(data)
+    async def snapshot_consumer():
+        async for data in snapshot_sub:
+            shared_data.update(data)
+            funding_feed.on_update(data)
 
     async def print_snapshot_loop():
         while True:
@@ -155,10 +302,15 @@ if __name__ == "__main__":
             await asyncio.sleep(2)
 
     async def main():
-        binance = BinanceWSClient(symbol="rvnusdt", on_update=on_update_handler)
-        gate = GateWSClient(symbol="RVN_USDT", on_update=on_update_handler)
+        binance = BinanceWSClient(symbol="rvnusdt", on_update=fanout.publish)
+        gate = GateWSClient(symbol="RVN_USDT", on_update=fanout.publish)
+        await start_metrics_server()
 
         await asyncio.gather(
+            LATENCY.summary_loop(interval=30),
+            funding_feed.run(),
+            fanout.stats_loop(interval=30),
+            snapshot_consumer(),
             # binance.subscribe_mark_price(),
             # gate.subscribe_ticker(),
             binance.subscribe_orderbook(),
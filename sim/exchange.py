@@ -0,0 +1,785 @@
+"""
+本地模拟交易所，用于不联网的压测和故障演练：
+- 一个 aiohttp 服务同时模拟 Binance U 本位合约和 Gate USDT 永续
+  Binance WS: /binance/ws/{symbol}@depth{n}、/binance/ws/{symbol}@markPrice、/binance/ws/{symbol}@aggTrade
+  Gate WS:    /gate/ws，支持 futures.order_book_update / futures.tickers / futures.trades 订阅
+              order_book_update 和真实接口一样是增量：只带变化的档位（乱序，张数 0 表示删除），
+              U/u 为本条覆盖的序号区间，和 REST order_book 的 id 同一序列；丢包会留下序号缺口
+  REST:       K线、资金费率历史、24h 成交额、合约列表、盘口、市价下单、持仓、余额、ping / 服务器时间
+- 两边价格 = 共同的随机游走 + 各自的 OU 偏离，价差和真实行情一样会回归
+- 市价单按当前盘口逐档撮合，吃掉的数量到下一次行情推进前不会恢复
+- SimConfig 控制推送频率、延迟、断线、丢包、下单拒绝和 REST 错误，/stats 查看服务端计数
+
+现有 client 指向模拟交易所：
+    BinanceWSClient(symbol, on_update, base_url=f"ws://{host}:{port}/binance/ws")
+    GateWSClient(symbol, on_update, base_url=f"ws://{host}:{port}/gate/ws", rest_url=f"http://{host}:{port}/gate/api/v4")
+    AsyncBinanceDataHandler(base_url=f"http://{host}:{port}/binance", proxy=None)
+    AsyncGateDataHandler(base_url=f"http://{host}:{port}/gate/api/v4", proxy=None)
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import time
+import zlib
+from collections import deque
+
+import numpy as np
+from aiohttp import WSMsgType, web
+
+MINUTE_MS = 60_000
+FUNDING_INTERVAL_MS = 8 * 3600 * 1000
+
+
+class SimConfig:
+
+    def __init__(self, rate=10, latency_ms=0, jitter_ms=0, disconnect_after=None, drop_rate=0.0, reject_rate=0.0,
+                 rest_error_rate=0.0, rest_latency_ms=0, depth=20, tick_interval=0.05, quanto=1.0, seed=0):
+        """
+        rate: 每条 WS 订阅每秒推送的消息数
+        latency_ms / jitter_ms: 消息生成后到发出前的延迟（交易所事件时间 E / time_ms 仍为生成时刻）
+        disconnect_after: WS 连接平均存活秒数（指数分布），None 为不主动断线
+        drop_rate: 推送丢弃比例（消息生成了但不发，序号出现缺口）
+        reject_rate: 下单拒绝比例
+        rest_error_rate / rest_latency_ms: REST 随机返回 429/5xx 的比例和固定延迟
+        depth: 盘口档数；tick_interval: 行情推进间隔（秒）
+        quanto: Gate 每张合约对应的币数量
+        """
+        self.rate = rate
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.disconnect_after = disconnect_after
+        self.drop_rate = drop_rate
+        self.reject_rate = reject_rate
+        self.rest_error_rate = rest_error_rate
+        self.rest_latency_ms = rest_latency_ms
+        self.depth = depth
+        self.tick_interval = tick_interval
+        self.quanto = quanto
+        self.seed = seed
+
+
+def _symbol_seed(*parts):
+    return zlib.crc32('|'.join(parts).encode())
+
+
+# 统一格式 'BTCUSDT' <-> Gate 'BTC_USDT'
+def to_gate_symbol(symbol):
+    return symbol[:-4] + '_USDT' if symbol.endswith('USDT') else symbol
+
+
+def from_gate_symbol(contract):
+    return contract.replace('_', '')
+
+
+class SimMarket:
+    # 价格模型、盘口、撮合和账户
+    def __init__(self, symbols, config: SimConfig, venues=('binance', 'gate')):
+        self.config = config
+        self.venues = venues
+        self.symbols = [s.upper() for s in symbols]
+        self.rng = np.random.default_rng(config.seed)
+        self.base = {s: float(np.exp(np.random.default_rng(_symbol_seed(s)).uniform(-3, 5))) for s in self.symbols}
+        self.offset = {(v, s): 0.0 for v in venues for s in self.symbols}  # 各交易所相对 base 的偏离（比例）
+        self.funding = {(v, s): 0.0001 for v in venues for s in self.symbols}
+        self.consumed = {}  # (venue, symbol, 'bids'/'asks', level) -> 本轮已成交数量
+        self.seq = itertools.count(1)
+        self.positions = {}  # (venue, symbol, 'long'/'short') -> 币数量
+        self.balances = {v: 100_000.0 for v in venues}
+        self.order_ids = itertools.count(1)
+        self.stats = {'ticks': 0, 'orders': 0, 'rejects': 0, 'fills_qty': 0.0}
+        self.version = 0     # 行情推进或成交后加一，推送用它判断盘口 JSON 片段是否需要重建
+        self._book_json = {}  # (venue, symbol, depth) -> (version, bids_json, asks_json)
+        self._gate_books = {}  # symbol -> 已发布的 Gate 盘口和增量日志，见 gate_book
+        self._churn_rng = random.Random(config.seed)
+
+    def step(self, dt):
+        n = len(self.symbols)
+        shocks = self.rng.normal(0, 0.0005 * math.sqrt(dt), n)
+        for s, z in zip(self.symbols, shocks):
+            self.base[s] *= math.exp(z)
+        for key in self.offset:
+            # OU：半衰期约 30 秒，长期波动约 0.3%
+            self.offset[key] += -self.offset[key] * dt / 43 + self.rng.normal(0, 0.003 * math.sqrt(2 * dt / 43))
+        for key in self.funding:
+            self.funding[key] = min(max(self.funding[key] + self.rng.normal(0, 0.000002), -0.003), 0.003)
+        self.consumed.clear()
+        self.version += 1
+        self.stats['ticks'] += 1
+
+    def mid(self, venue, symbol):
+        return self.base[symbol] * (1 + self.offset[(venue, symbol)])
+
+    def tick_size(self, symbol):
+        return 10 ** (math.floor(math.log10(self.base[symbol])) - 4)
+
+    # 盘口：(价格, 数量) 列表，数量为币数量；扣掉本轮已成交的部分
+    def book(self, venue, symbol, depth=None):
+        depth = depth or self.config.depth
+        mid = self.mid(venue, symbol)
+        tick = self.tick_size(symbol)
+        unit = 2000 / mid  # 每档约 2000 USDT
+        bids, asks = [], []
+        for k in range(depth):
+            qty = unit * (1 + 0.5 * k)
+            bid_px = round((mid * (1 - 0.0001) - k * tick * 5) / tick) * tick
+            ask_px = round((mid * (1 + 0.0001) + k * tick * 5) / tick) * tick
+            bids.append((bid_px, max(qty - self.consumed.get((venue, symbol, 'bids', k), 0.0), 0.0)))
+            asks.append((ask_px, max(qty - self.consumed.get((venue, symbol, 'asks', k), 0.0), 0.0)))
+        return bids, asks
+
+    # Binance 推送用的盘口 JSON 片段 [["p","q"],...]，同一版本内各条消息共用，只有头部的时间和序号每条重新生成
+    def book_json(self, venue, symbol, depth):
+        key = (venue, symbol, depth)
+        cached = self._book_json.get(key)
+        if cached is not None and cached[0] == self.version:
+            return cached[1], cached[2]
+        bids, asks = self.book(venue, symbol, depth)
+        dump = lambda levels: json.dumps([[_fmt(p), _fmt(q)] for p, q in levels])
+        cached = (self.version, dump(bids), dump(asks))
+        self._book_json[key] = cached
+        return cached[1], cached[2]
+
+    # Gate 已发布的盘口（价格字符串 -> 张数）和增量日志 [(id, {'bids': [(p, s)], 'asks': [...]})]
+    # 每次调用推进一条增量：行情推进或成交后和当前盘口比较，否则随机改一档的张数模拟挂撤单
+    def gate_book(self, symbol, advance=True):
+        state = self._gate_books.get(symbol)
+        if state is None:
+            state = self._gate_books[symbol] = {'id': 0, 'version': None, 'bids': {}, 'asks': {},
+                                                'log': deque(maxlen=1024)}
+        if not advance and state['version'] is not None:
+            return state
+        quanto = self.config.quanto
+        changes = {'bids': [], 'asks': []}
+        if state['version'] != self.version:
+            state['version'] = self.version
+            bids, asks = self.book('gate', symbol)
+            for side, levels in (('bids', bids), ('asks', asks)):
+                new = {_fmt(p): int(q / quanto) for p, q in levels}
+                new = {p: size for p, size in new.items() if size > 0}
+                old = state[side]
+                changes[side] = [(p, size) for p, size in new.items() if old.get(p) != size] + \
+                                [(p, 0) for p in old if p not in new]
+                state[side] = new
+        else:
+            side = self._churn_rng.choice(('bids', 'asks'))
+            if state[side]:
+                p = self._churn_rng.choice(list(state[side]))
+                size = max(state[side][p] + self._churn_rng.randint(-5, 5), 1)
+                state[side][p] = size
+                changes[side] = [(p, size)]
+        for levels in changes.values():
+            self._churn_rng.shuffle(levels)
+        state['id'] += 1
+        state['log'].append((state['id'], changes))
+        return state
+
+    # 模拟一笔主动成交：(是否买方主动, 价格, 币数量)，价格取当前最优一档
+    def random_trade(self, venue, symbol):
+        buy = self.rng.random() < 0.5
+        mid = self.mid(venue, symbol)
+        tick = self.tick_size(symbol)
+        px = round(mid * (1 + 0.0001 if buy else 1 - 0.0001) / tick) * tick
+        return buy, px, float(self.rng.exponential(200 / mid))
+
+    # 市价单逐档撮合，返回 (成交数量, 均价)
+    def match(self, venue, symbol, buy, qty):
+        bids, asks = self.book(venue, symbol)
+        side = 'asks' if buy else 'bids'
+        remaining, cost = qty, 0.0
+        for k, (px, avail) in enumerate(asks if buy else bids):
+            if remaining <= 0:
+                break
+            take = min(avail, remaining)
+            if take <= 0:
+                continue
+            self.consumed[(venue, symbol, side, k)] = self.consumed.get((venue, symbol, side, k), 0.0) + take
+            remaining -= take
+            cost += take * px
+        filled = qty - remaining
+        self.version += 1
+        self.stats['fills_qty'] += filled
+        return filled, (cost / filled if filled else 0.0)
+
+    # 双向持仓下单：position 为 'long'/'short'，reduce 为平仓
+    def execute(self, venue, symbol, position, qty, reduce=False):
+        self.stats['orders'] += 1
+        if self.rng.random() < self.config.reject_rate:
+            self.stats['rejects'] += 1
+            return None
+        key = (venue, symbol, position)
+        if reduce:
+            qty = min(qty, self.positions.get(key, 0.0))
+        buy = (position == 'long') != reduce
+        filled, price = self.match(venue, symbol, buy, qty)
+        sign = -1 if reduce else 1
+        self.positions[key] = self.positions.get(key, 0.0) + sign * filled
+        self.balances[venue] -= filled * price * 0.0005
+        return filled, price
+
+    def next_funding_ms(self, now_ms=None):
+        now_ms = now_ms or int(time.time() * 1000)
+        return (now_ms // FUNDING_INTERVAL_MS + 1) * FUNDING_INTERVAL_MS
+
+    # 历史 K 线：以当前价格为终点，按 symbol 固定种子倒推的随机游走；两边共用 base，价差可回归
+    def klines(self, venue, symbol, interval_ms=MINUTE_MS, limit=500, end_ms=None):
+        end_ms = end_ms or int(time.time() * 1000)
+        start = (end_ms // interval_ms - limit + 1) * interval_ms
+        rng = np.random.default_rng(_symbol_seed(symbol, str(start // interval_ms)))
+        scale = math.sqrt(interval_ms / 1000)
+        base = self.base[symbol] * np.exp(-np.cumsum(rng.normal(0, 0.0005 * scale, limit))[::-1])
+        vrng = np.random.default_rng(_symbol_seed(symbol, venue, str(start // interval_ms)))
+        dev = np.zeros(limit)
+        for i in range(1, limit):
+            dev[i] = dev[i - 1] * 0.97 + vrng.normal(0, 0.0008)
+        close = base * (1 + dev)
+        open_ = np.concatenate(([close[0]], close[:-1]))
+        high = np.maximum(open_, close) * (1 + np.abs(vrng.normal(0, 0.0005, limit)))
+        low = np.minimum(open_, close) * (1 - np.abs(vrng.normal(0, 0.0005, limit)))
+        volume = vrng.uniform(1000, 10000, limit) / close
+        times = start + np.arange(limit) * interval_ms
+        return times, open_, high, low, close, volume
+
+    def funding_history(self, venue, symbol, limit=100, end_ms=None):
+        last = self.next_funding_ms(end_ms) - FUNDING_INTERVAL_MS
+        times = last - np.arange(limit)[::-1] * FUNDING_INTERVAL_MS
+        rng = np.random.default_rng(_symbol_seed(symbol, venue, 'fr'))
+        return times, rng.normal(0.0001, 0.0002, limit)
+
+
+INTERVAL_MS = {'1m': MINUTE_MS, '3m': 3 * MINUTE_MS, '5m': 5 * MINUTE_MS, '15m': 15 * MINUTE_MS,
+               '30m': 30 * MINUTE_MS, '1h': 60 * MINUTE_MS, '4h': 240 * MINUTE_MS, '1d': 1440 * MINUTE_MS}
+
+
+def _fmt(x):
+    return f"{x:.10g}"
+
+
+class SimExchange:
+
+    def __init__(self, symbols, config: SimConfig = None):
+        self.config = config or SimConfig()
+        self.market = SimMarket(symbols, self.config)
+        self.rng = random.Random(self.config.seed)
+        self.stats = {'connections': 0, 'open_connections': 0, 'disconnects': 0, 'sent': 0, 'dropped': 0,
+                      'rest_requests': 0, 'rest_errors': 0}
+        self.app = self._build_app()
+
+    def _build_app(self):
+        app = web.Application(middlewares=[self._rest_middleware])
+        app.router.add_get('/binance/ws/{stream}', self.binance_ws)
+        app.router.add_get('/gate/ws', self.gate_ws)
+        app.router.add_get('/stats', self.get_stats)
+
+        app.router.add_get('/binance/fapi/v1/ping', self.binance_ping)
+        app.router.add_get('/binance/fapi/v1/time', self.binance_time)
+        app.router.add_get('/gate/api/v4/spot/time', self.gate_time)
+        app.router.add_get('/binance/fapi/v1/klines', self.binance_klines)
+        app.router.add_get('/binance/fapi/v1/fundingRate', self.binance_funding)
+        app.router.add_get('/binance/fapi/v1/ticker/24hr', self.binance_ticker)
+        app.router.add_get('/binance/fapi/v1/exchangeInfo', self.binance_exchange_info)
+        app.router.add_get('/binance/fapi/v1/premiumIndex', self.binance_premium_index)
+        app.router.add_get('/binance/fapi/v1/depth', self.binance_depth)
+        app.router.add_post('/binance/fapi/v1/order', self.binance_order)
+        app.router.add_get('/binance/fapi/v2/positionRisk', self.binance_positions)
+        app.router.add_get('/binance/fapi/v2/balance', self.binance_balance)
+
+        prefix = '/gate/api/v4/futures/usdt'
+        app.router.add_get(f'{prefix}/candlesticks', self.gate_klines)
+        app.router.add_get(f'{prefix}/funding_rate', self.gate_funding)
+        app.router.add_get(f'{prefix}/tickers', self.gate_tickers)
+        app.router.add_get(f'{prefix}/contracts', self.gate_contracts)
+        app.router.add_get(f'{prefix}/contracts/{{contract}}', self.gate_contract)
+        app.router.add_get(f'{prefix}/order_book', self.gate_order_book)
+        app.router.add_post(f'{prefix}/orders', self.gate_order)
+        app.router.add_get(f'{prefix}/positions', self.gate_positions)
+        app.router.add_get(f'{prefix}/accounts', self.gate_accounts)
+        app.router.add_get('/gate/api/v4/account/detail', self.gate_account_detail)
+
+        app.on_startup.append(self._start_ticker)
+        app.on_cleanup.append(self._stop_ticker)
+        return app
+
+    # ---- 行情推进 ----
+    async def _tick_loop(self):
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(self.config.tick_interval)
+            now = time.monotonic()
+            self.market.step(now - last)
+            last = now
+
+    async def _start_ticker(self, app):
+        self._ticker = asyncio.create_task(self._tick_loop())
+
+    async def _stop_ticker(self, app):
+        self._ticker.cancel()
+
+    # ---- REST 故障注入 ----
+    @web.middleware
+    async def _rest_middleware(self, request, handler):
+        if request.path.endswith('/ws') or '/ws/' in request.path or request.path == '/stats':
+            return await handler(request)
+        self.stats['rest_requests'] += 1
+        if self.config.rest_latency_ms:
+            await asyncio.sleep(self.config.rest_latency_ms / 1000)
+        if self.rng.random() < self.config.rest_error_rate:
+            self.stats['rest_errors'] += 1
+            if request.path.startswith('/binance'):
+                return web.json_response({'code': -1003, 'msg': 'Too many requests.'}, status=429)
+            return web.json_response({'label': 'SERVER_ERROR', 'message': 'Internal server error'}, status=500)
+        return await handler(request)
+
+    async def get_stats(self, request):
+        return web.json_response({**self.stats, **self.market.stats})
+
+    # ---- WS 推送 ----
+    # 按 rate 计算到期应发的条数，每轮批量生成发送；断线、丢包、延迟在这里注入
+    async def _pump(self, ws, make_message, deadline):
+        rate = self.config.rate
+        start = time.monotonic()
+        sent = 0
+        step = min(max(1.0 / rate, 0.001), 0.05)
+        while not ws.closed:
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                self.stats['disconnects'] += 1
+                await ws.close(code=1001, message=b'simulated disconnect')
+                return
+            due = int((now - start) * rate) - sent
+            messages = []
+            for _ in range(due):
+                msg = make_message()
+                if self.config.drop_rate and self.rng.random() < self.config.drop_rate:
+                    self.stats['dropped'] += 1
+                    continue
+                messages.append(msg)
+            sent += due
+            if messages:
+                delay = self.config.latency_ms + (self.rng.uniform(0, self.config.jitter_ms) if self.config.jitter_ms else 0)
+                if delay:
+                    await asyncio.sleep(delay / 1000)
+                try:
+                    for msg in messages:
+                        await ws.send_str(msg)
+                except ConnectionResetError:
+                    return
+                self.stats['sent'] += len(messages)
+            await asyncio.sleep(step)
+
+    def _deadline(self):
+        if not self.config.disconnect_after:
+            return None
+        return time.monotonic() + self.rng.expovariate(1 / self.config.disconnect_after)
+
+    async def _open_ws(self, request):
+        ws = web.WebSocketResponse()
+        try:
+            await ws.prepare(request)
+        except ConnectionResetError:
+            return None  # 握手时客户端已断开（重连、退出）
+        self.stats['connections'] += 1
+        self.stats['open_connections'] += 1
+        return ws
+
+    async def binance_ws(self, request):
+        stream = request.match_info['stream']
+        symbol, _, channel = stream.partition('@')
+        symbol = symbol.upper()
+        if symbol not in self.market.base:
+            raise web.HTTPNotFound(text=f"unknown symbol {symbol}")
+        ws = await self._open_ws(request)
+        if ws is None:
+            return web.Response(status=499)
+        market = self.market
+
+        if channel.startswith('depth'):
+            depth = int(channel[5:].split('@')[0] or 20)
+
+            def make_message():
+                now_ms = int(time.time() * 1000)
+                bids, asks = market.book_json('binance', symbol, depth)
+                u = next(market.seq)
+                return (f'{{"e":"depthUpdate","E":{now_ms},"T":{now_ms},"s":"{symbol}","U":{u},"u":{u},'
+                        f'"pu":{u - 1},"b":{bids},"a":{asks}}}')
+        elif channel == 'aggTrade':
+            trade_ids = itertools.count(1)
+
+            def make_message():
+                now_ms = int(time.time() * 1000)
+                buy, px, qty = market.random_trade('binance', symbol)
+                a = next(trade_ids)
+                return json.dumps({'e': 'aggTrade', 'E': now_ms, 's': symbol, 'a': a, 'p': _fmt(px), 'q': _fmt(qty),
+                                   'f': a, 'l': a, 'T': now_ms, 'm': not buy})
+        elif channel.startswith('markPrice'):
+            def make_message():
+                now_ms = int(time.time() * 1000)
+                mark = market.mid('binance', symbol)
+                return json.dumps({'e': 'markPriceUpdate', 'E': now_ms, 's': symbol, 'p': _fmt(mark),
+                                   'i': _fmt(market.base[symbol]), 'P': _fmt(mark),
+                                   'r': _fmt(market.funding[('binance', symbol)]), 'T': market.next_funding_ms(now_ms)})
+        else:
+            await ws.close(code=1003, message=b'unsupported stream')
+            self.stats['open_connections'] -= 1
+            return ws
+
+        # 推送在后台任务里跑，这里读客户端消息，及时处理 close / ping
+        pump = asyncio.create_task(self._pump(ws, make_message, self._deadline()))
+        try:
+            async for _ in ws:
+                pass
+        finally:
+            pump.cancel()
+            self.stats['open_connections'] -= 1
+        return ws
+
+    async def gate_ws(self, request):
+        ws = await self._open_ws(request)
+        if ws is None:
+            return web.Response(status=499)
+        market = self.market
+        deadline = self._deadline()
+        tasks = []
+
+        # 每个连接记住自己发到的序号，每条消息带上之后所有增量（合并后同一价格取最新）；
+        # 落后太多、日志里已没有的部分不补，客户端会看到序号缺口
+        def orderbook_maker(contract):
+            symbol = from_gate_symbol(contract)
+            last_sent = [market.gate_book(symbol, advance=False)['id']]
+
+            def make_message():
+                now = time.time()
+                now_ms = int(now * 1000)
+                state = market.gate_book(symbol)
+                entries = [e for e in state['log'] if e[0] > last_sent[0]]
+                merged = {'bids': {}, 'asks': {}}
+                for _, changes in entries:
+                    for side, levels in changes.items():
+                        merged[side].update(levels)
+                first, last_sent[0] = entries[0][0], entries[-1][0]
+                bids = json.dumps([{'p': p, 's': size} for p, size in merged['bids'].items()])
+                asks = json.dumps([{'p': p, 's': size} for p, size in merged['asks'].items()])
+                return (f'{{"time":{int(now)},"time_ms":{now_ms},"channel":"futures.order_book_update",'
+                        f'"event":"update","result":{{"t":{now_ms},"s":"{contract}","U":{first},'
+                        f'"u":{last_sent[0]},"b":{bids},"a":{asks}}}}}')
+            return make_message
+
+        def ticker_maker(contract):
+            symbol = from_gate_symbol(contract)
+
+            def make_message():
+                now = time.time()
+                mark = market.mid('gate', symbol)
+                rate = market.funding[('gate', symbol)]
+                return json.dumps({'time': int(now), 'time_ms': int(now * 1000), 'channel': 'futures.tickers',
+                                   'event': 'update',
+                                   'result': [{'contract': contract, 'last': _fmt(mark), 'mark_price': _fmt(mark),
+                                               'index_price': _fmt(market.base[symbol]), 'funding_rate': _fmt(rate),
+                                               'funding_rate_indicative': _fmt(rate)}]})
+            return make_message
+
+        def trades_maker(contract):
+            symbol = from_gate_symbol(contract)
+            quanto = self.config.quanto
+            trade_ids = itertools.count(1)
+
+            def make_message():
+                now = time.time()
+                buy, px, qty = market.random_trade('gate', symbol)
+                size = max(int(qty / quanto), 1)
+                return json.dumps({'time': int(now), 'time_ms': int(now * 1000), 'channel': 'futures.trades',
+                                   'event': 'update',
+                                   'result': [{'size': size if buy else -size, 'id': next(trade_ids),
+                                               'create_time': int(now), 'create_time_ms': int(now * 1000),
+                                               'price': _fmt(px), 'contract': contract}]})
+            return make_message
+
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                req = json.loads(msg.data)
+                channel, payload = req.get('channel'), req.get('payload') or []
+                if req.get('event') != 'subscribe' or not payload or from_gate_symbol(payload[0]) not in market.base:
+                    await ws.send_json({'time': int(time.time()), 'channel': channel, 'event': req.get('event'),
+                                        'error': {'code': 2, 'message': 'unknown contract or channel'}})
+                    continue
+                if channel == 'futures.order_book_update':
+                    maker = orderbook_maker(payload[0])
+                elif channel == 'futures.tickers':
+                    maker = ticker_maker(payload[0])
+                elif channel == 'futures.trades':
+                    maker = trades_maker(payload[0])
+                else:
+                    await ws.send_json({'time': int(time.time()), 'channel': channel, 'event': 'subscribe',
+                                        'error': {'code': 2, 'message': 'unsupported channel'}})
+                    continue
+                await ws.send_json({'time': int(time.time()), 'channel': channel, 'event': 'subscribe',
+                                    'result': {'status': 'success'}})
+                tasks.append(asyncio.create_task(self._pump(ws, maker, deadline)))
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.stats['open_connections'] -= 1
+        return ws
+
+    # ---- Binance REST ----
+    def _binance_symbol(self, request):
+        symbol = request.query.get('symbol', '').upper()
+        if symbol not in self.market.base:
+            raise web.HTTPBadRequest(text=json.dumps({'code': -1121, 'msg': 'Invalid symbol.'}),
+                                     content_type='application/json')
+        return symbol
+
+    async def binance_klines(self, request):
+        symbol = self._binance_symbol(request)
+        interval_ms = INTERVAL_MS.get(request.query.get('interval', '1m'), MINUTE_MS)
+        limit = min(int(request.query.get('limit', 500)), 1500)
+        end_ms = int(request.query['endTime']) if 'endTime' in request.query else None
+        times, o, h, l, c, v = self.market.klines('binance', symbol, interval_ms, limit, end_ms)
+        return web.json_response([[int(t), _fmt(o[i]), _fmt(h[i]), _fmt(l[i]), _fmt(c[i]), _fmt(v[i]),
+                                   int(t) + interval_ms - 1, _fmt(v[i] * c[i]), 100, _fmt(v[i] / 2),
+                                   _fmt(v[i] * c[i] / 2), '0'] for i, t in enumerate(times)])
+
+    async def binance_funding(self, request):
+        symbol = self._binance_symbol(request)
+        limit = min(int(request.query.get('limit', 100)), 1000)
+        times, rates = self.market.funding_history('binance', symbol, limit)
+        mark = self.market.mid('binance', symbol)
+        return web.json_response([{'symbol': symbol, 'fundingTime': int(t), 'fundingRate': _fmt(r),
+                                   'markPrice': _fmt(mark)} for t, r in zip(times, rates)])
+
+    async def binance_ticker(self, request):
+        symbol = self._binance_symbol(request)
+        mark = self.market.mid('binance', symbol)
+        return web.json_response({'symbol': symbol, 'lastPrice': _fmt(mark), 'volume': _fmt(5e6 / mark),
+                                  'quoteVolume': '5000000'})
+
+    async def binance_exchange_info(self, request):
+        return web.json_response({'symbols': [{'symbol': s, 'status': 'TRADING', 'contractType': 'PERPETUAL',
+                                               'quoteAsset': 'USDT'} for s in self.market.symbols]})
+
+    async def binance_premium_index(self, request):
+        now_ms = int(time.time() * 1000)
+
+        def item(symbol):
+            return {'symbol': symbol, 'markPrice': _fmt(self.market.mid('binance', symbol)),
+                    'indexPrice': _fmt(self.market.base[symbol]),
+                    'lastFundingRate': _fmt(self.market.funding[('binance', symbol)]),
+                    'nextFundingTime': self.market.next_funding_ms(now_ms), 'time': now_ms}
+        if 'symbol' in request.query:
+            return web.json_response(item(self._binance_symbol(request)))
+        return web.json_response([item(s) for s in self.market.symbols])
+
+    async def binance_depth(self, request):
+        symbol = self._binance_symbol(request)
+        bids, asks = self.market.book('binance', symbol, int(request.query.get('limit', self.config.depth)))
+        return web.json_response({'lastUpdateId': next(self.market.seq), 'E': int(time.time() * 1000),
+                                  'bids': [[_fmt(p), _fmt(q)] for p, q in bids],
+                                  'asks': [[_fmt(p), _fmt(q)] for p, q in asks]})
+
+    async def binance_ping(self, request):
+        return web.json_response({})
+
+    async def binance_time(self, request):
+        return web.json_response({'serverTime': int(time.time() * 1000)})
+
+    async def gate_time(self, request):
+        return web.json_response({'server_time': int(time.time() * 1000)})
+
+    async def binance_order(self, request):
+        params = dict(request.query)
+        params.update(await request.post())
+        symbol = params.get('symbol', '').upper()
+        if symbol not in self.market.base or params.get('type', 'MARKET').upper() != 'MARKET':
+            return web.json_response({'code': -1121, 'msg': 'Invalid symbol or order type.'}, status=400)
+        side = params.get('side', '').upper()
+        position_side = params.get('positionSide', 'LONG' if side == 'BUY' else 'SHORT').upper()
+        position = position_side.lower()
+        reduce = (position == 'long') != (side == 'BUY')
+        result = self.market.execute('binance', symbol, position, float(params.get('quantity', 0)), reduce=reduce)
+        if result is None:
+            return web.json_response({'code': -2019, 'msg': 'Margin is insufficient.'}, status=400)
+        filled, price = result
+        now_ms = int(time.time() * 1000)
+        return web.json_response({'orderId': next(self.market.order_ids), 'symbol': symbol, 'status': 'FILLED',
+                                  'clientOrderId': params.get('newClientOrderId', ''), 'side': side,
+                                  'positionSide': position_side, 'type': 'MARKET',
+                                  'origQty': params.get('quantity'), 'executedQty': _fmt(filled),
+                                  'avgPrice': _fmt(price), 'cumQuote': _fmt(filled * price), 'updateTime': now_ms})
+
+    async def binance_positions(self, request):
+        rows = []
+        for (venue, symbol, position), qty in self.market.positions.items():
+            if venue != 'binance':
+                continue
+            rows.append({'symbol': symbol, 'positionSide': position.upper(),
+                         'positionAmt': _fmt(qty if position == 'long' else -qty),
+                         'markPrice': _fmt(self.market.mid('binance', symbol))})
+        return web.json_response(rows)
+
+    async def binance_balance(self, request):
+        balance = self.market.balances['binance']
+        return web.json_response([{'asset': 'USDT', 'balance': _fmt(balance), 'availableBalance': _fmt(balance)}])
+
+    # ---- Gate REST ----
+    def _gate_contract(self, contract):
+        if not contract or from_gate_symbol(contract) not in self.market.base:
+            raise web.HTTPBadRequest(text=json.dumps({'label': 'CONTRACT_NOT_FOUND', 'message': 'Contract not found'}),
+                                     content_type='application/json')
+        return from_gate_symbol(contract)
+
+    def _contract_info(self, symbol):
+        mark = self.market.mid('gate', symbol)
+        rate = self.market.funding[('gate', symbol)]
+        return {'name': to_gate_symbol(symbol), 'mark_price': _fmt(mark), 'index_price': _fmt(self.market.base[symbol]),
+                'funding_rate': _fmt(rate), 'funding_rate_indicative': _fmt(rate),
+                'funding_next_apply': self.market.next_funding_ms() // 1000, 'funding_interval': 28800,
+                'quanto_multiplier': _fmt(self.config.quanto), 'order_size_min': 1}
+
+    async def gate_klines(self, request):
+        symbol = self._gate_contract(request.query.get('contract'))
+        interval_ms = INTERVAL_MS.get(request.query.get('interval', '1m'), MINUTE_MS)
+        limit = min(int(request.query.get('limit', 100)), 2000)
+        times, o, h, l, c, v = self.market.klines('gate', symbol, interval_ms, limit)
+        return web.json_response([{'t': int(t) // 1000, 'v': int(v[i] / self.config.quanto), 'c': _fmt(c[i]),
+                                   'h': _fmt(h[i]), 'l': _fmt(l[i]), 'o': _fmt(o[i]), 'sum': _fmt(v[i] * c[i])}
+                                  for i, t in enumerate(times)])
+
+    async def gate_funding(self, request):
+        symbol = self._gate_contract(request.query.get('contract'))
+        limit = min(int(request.query.get('limit', 100)), 1000)
+        times, rates = self.market.funding_history('gate', symbol, limit)
+        # Gate 按时间倒序返回
+        return web.json_response([{'t': int(t) // 1000, 'r': _fmt(r)} for t, r in zip(times[::-1], rates[::-1])])
+
+    async def gate_tickers(self, request):
+        contract = request.query.get('contract')
+        symbols = [self._gate_contract(contract)] if contract else self.market.symbols
+        rows = []
+        for s in symbols:
+            mark = self.market.mid('gate', s)
+            rate = self.market.funding[('gate', s)]
+            rows.append({'contract': to_gate_symbol(s), 'last': _fmt(mark), 'mark_price': _fmt(mark),
+                         'funding_rate': _fmt(rate), 'funding_rate_indicative': _fmt(rate),
+                         'volume_24h_settle': '5000000'})
+        return web.json_response(rows)
+
+    async def gate_contracts(self, request):
+        return web.json_response([self._contract_info(s) for s in self.market.symbols])
+
+    async def gate_contract(self, request):
+        return web.json_response(self._contract_info(self._gate_contract(request.match_info['contract'])))
+
+    async def gate_order_book(self, request):
+        symbol = self._gate_contract(request.query.get('contract'))
+        limit = int(request.query.get('limit', self.config.depth))
+        # 和增量推送同一份已发布盘口，id 与推送的 U/u 同一序列
+        state = self.market.gate_book(symbol, advance=False)
+        bids = sorted(state['bids'].items(), key=lambda level: -float(level[0]))[:limit]
+        asks = sorted(state['asks'].items(), key=lambda level: float(level[0]))[:limit]
+        return web.json_response({'id': state['id'], 'current': time.time(),
+                                  'bids': [{'p': p, 's': size} for p, size in bids],
+                                  'asks': [{'p': p, 's': size} for p, size in asks]})
+
+    async def gate_order(self, request):
+        body = await request.json()
+        symbol = self._gate_contract(body.get('contract'))
+        quanto = self.config.quanto
+        size = int(body.get('size', 0))
+        auto_size = body.get('auto_size')
+        if auto_size in ('close_long', 'close_short'):
+            position = auto_size[len('close_'):]
+            contracts = int(self.market.positions.get(('gate', symbol, position), 0.0) / quanto)
+            size = -contracts if position == 'long' else contracts
+            reduce = True
+        else:
+            reduce = bool(body.get('reduce_only'))
+            position = ('short' if size > 0 else 'long') if reduce else ('long' if size > 0 else 'short')
+        result = self.market.execute('gate', symbol, position, abs(size) * quanto, reduce=reduce)
+        if result is None:
+            return web.json_response({'label': 'INSUFFICIENT_AVAILABLE', 'message': 'Insufficient balance'},
+                                     status=400)
+        filled, price = result
+        now = time.time()
+        left = abs(size) - int(round(filled / quanto))
+        return web.json_response({'id': next(self.market.order_ids), 'contract': body.get('contract'), 'size': size,
+                                  'left': left if size > 0 else -left, 'fill_price': _fmt(price), 'price': '0',
+                                  'tif': body.get('tif', 'ioc'), 'text': body.get('text', ''), 'status': 'finished',
+                                  'finish_as': 'filled' if left == 0 else 'ioc', 'create_time': now,
+                                  'finish_time': now, 'is_reduce_only': reduce}, status=201)
+
+    async def gate_positions(self, request):
+        rows = []
+        for (venue, symbol, position), qty in self.market.positions.items():
+            if venue != 'gate':
+                continue
+            contracts = int(round(qty / self.config.quanto))
+            rows.append({'contract': to_gate_symbol(symbol), 'mode': f"dual_{position}",
+                         'size': contracts if position == 'long' else -contracts,
+                         'mark_price': _fmt(self.market.mid('gate', symbol))})
+        return web.json_response(rows)
+
+    async def gate_accounts(self, request):
+        balance = self.market.balances['gate']
+        return web.json_response({'currency': 'USDT', 'total': _fmt(balance), 'available': _fmt(balance)})
+
+    # 和真实接口一样，uid 只在账户详情里
+    async def gate_account_detail(self, request):
+        return web.json_response({'user_id': 1, 'ip_whitelist': [], 'currency_pairs': [], 'key': {'mode': 1}})
+
+
+# 启动模拟交易所，返回 (runner, exchange)；退出时 await runner.cleanup()
+async def start_sim_exchange(symbols, config=None, host='127.0.0.1', port=8900):
+    exchange = SimExchange(symbols, config)
+    runner = web.AppRunner(exchange.app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"[SimExchange] {len(exchange.market.symbols)} symbols on http://{host}:{port} "
+          f"(rate={exchange.config.rate}/s per stream)")
+    return runner, exchange
+
+
+# 在独立进程里运行，避免和被测的 client 抢同一个 GIL
+def run_sim_exchange(symbols, config=None, host='127.0.0.1', port=8900):
+    async def main():
+        await start_sim_exchange(symbols, config, host, port)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+def parse_config_args(parser):
+    parser.add_argument('--rate', type=float, default=10, help='每条订阅每秒推送条数')
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--disconnect-after', type=float, default=None, help='WS 平均存活秒数')
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    parser.add_argument('--reject-rate', type=float, default=0.0)
+    parser.add_argument('--rest-error-rate', type=float, default=0.0)
+    parser.add_argument('--rest-latency-ms', type=float, default=0)
+    parser.add_argument('--depth', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser
+
+
+def config_from_args(args):
+    return SimConfig(rate=args.rate, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                     disconnect_after=args.disconnect_after, drop_rate=args.drop_rate, reject_rate=args.reject_rate,
+                     rest_error_rate=args.rest_error_rate, rest_latency_ms=args.rest_latency_ms, depth=args.depth,
+                     seed=args.seed)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='本地模拟 Binance / Gate 合约交易所')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--symbols', nargs='+', default=['BTCUSDT', 'ETHUSDT', 'RVNUSDT', 'BIDUSDT'])
+    args = parse_config_args(parser).parse_args()
+    run_sim_exchange(args.symbols, config_from_args(args), args.host, args.port)
@@ -0,0 +1,195 @@
+"""
+压测脚本：模拟交易所跑在独立进程，本进程用现有的 WS client 和下游组件接收，看吞吐上限和故障下的表现
+- 每个 symbol 订阅 Binance depth + Gate order_book_update，消息经 FanOut 分给快照（coalesce）和记录（drop_oldest）
+- 快照消费者更新 SharedMarketData 和 DepthCapacity，记录消费者只计数，模拟慢消费者
+- 可选 REST 下单流量，统计下单延迟和拒单
+- 每秒打印接收速率、事件循环延迟、FanOut 队列深度；结束时打印延迟直方图和服务端统计
+
+例：python -m sim.load_test --symbols 50 --rate 200 --duration 30 --disconnect-after 10 --reject-rate 0.05
+"""
+import argparse
+import asyncio
+import random
+import time
+from multiprocessing import Process
+
+import aiohttp
+
+from market_data.depth_capacity import DepthCapacity
+from market_data.fanout import FanOut, POLICY_COALESCE, POLICY_DROP_OLDEST
+from market_data.latency import LATENCY, LatencyHistogram, now_ns
+from market_data.shared_data import SharedMarketData
+from market_data.ws_market_data import BinanceWSClient, GateWSClient
+from sim.exchange import config_from_args, parse_config_args, run_sim_exchange, to_gate_symbol
+
+
+class LoadStats:
+
+    def __init__(self):
+        self.received = 0
+        self.per_venue = {'binance': 0, 'gate': 0}
+        self.loop_lag = LatencyHistogram()
+        self.order_latency = LatencyHistogram()
+        self.orders = 0
+        self.order_errors = 0
+
+
+async def wait_for_server(url, timeout=10):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"{url}/stats") as resp:
+                    if resp.status == 200:
+                        return await resp.json()
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.1)
+    raise TimeoutError(f"simulated exchange at {url} did not start")
+
+
+# 事件循环延迟：定时器实际触发时间和预期的差值，反映接收循环是否已经跟不上
+async def loop_lag_monitor(stats, interval=0.01):
+    while True:
+        start = now_ns()
+        await asyncio.sleep(interval)
+        stats.loop_lag.record(now_ns() - start - int(interval * 1e9))
+
+
+async def order_flow(url, symbols, stats, per_sec, notional=100):
+    async with aiohttp.ClientSession() as session:
+        while True:
+            await asyncio.sleep(1 / per_sec)
+            symbol = random.choice(symbols)
+            side = random.choice(('long', 'short'))
+            start = now_ns()
+            try:
+                if random.random() < 0.5:
+                    params = {'symbol': symbol, 'side': 'BUY' if side == 'long' else 'SELL', 'type': 'MARKET',
+                              'quantity': '1', 'positionSide': side.upper()}
+                    async with session.post(f"{url}/binance/fapi/v1/order", params=params) as resp:
+                        ok = resp.status == 200
+                        await resp.read()
+                else:
+                    body = {'contract': to_gate_symbol(symbol), 'size': 1 if side == 'long' else -1, 'price': '0',
+                            'tif': 'ioc'}
+                    async with session.post(f"{url}/gate/api/v4/futures/usdt/orders", json=body) as resp:
+                        ok = resp.status == 201
+                        await resp.read()
+            except aiohttp.ClientError:
+                ok = False
+            stats.order_latency.record(now_ns() - start)
+            stats.orders += 1
+            stats.order_errors += not ok
+
+
+async def report_loop(stats, fanout, interval=1.0):
+    last, last_t = 0, time.monotonic()
+    while True:
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        rate = (stats.received - last) / (now - last_t)
+        last, last_t = stats.received, now
+        depth = {name: s['depth'] for name, s in fanout.stats().items()}
+        print(f"[Load] recv={rate:,.0f}/s total={stats.received:,} loop_lag_p99={_us(stats.loop_lag.percentile(0.99))} "
+              f"queue_depth={depth}")
+
+
+def _us(value):
+    return f"{value / 1000:.0f}us" if value is not None else '-'
+
+
+async def run_load(url, ws_url, symbols, duration, orders_per_sec, depth):
+    stats = LoadStats()
+    shared = SharedMarketData()
+    capacity = DepthCapacity(target_spread=0.0)
+
+    fanout = FanOut()
+    snapshot_sub = fanout.subscribe('snapshot', policy=POLICY_COALESCE, capacity=4096)
+    recorder_sub = fanout.subscribe('recorder', policy=POLICY_DROP_OLDEST, capacity=10000)
+
+    def on_update(data):
+        stats.received += 1
+        stats.per_venue[data['source']] += 1
+        return fanout.publish(data)
+
+    async def snapshot_consumer():
+        async for data in snapshot_sub:
+            shared.update(data)
+            capacity.on_update(data)
+
+    # 慢消费者：每批处理后让出一次，积压时由 drop_oldest 丢弃
+    async def recorder_consumer():
+        while True:
+            await asyncio.sleep(0.05)
+            recorder_sub.drain()
+
+    server = await wait_for_server(url)
+    print(f"[Load] server up: {server}")
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{url}/gate/api/v4/futures/usdt/contracts") as resp:
+            for item in await resp.json():
+                capacity.set_quanto(item['name'], item['quanto_multiplier'])
+
+    tasks = [
+        asyncio.create_task(snapshot_consumer()),
+        asyncio.create_task(recorder_consumer()),
+        asyncio.create_task(loop_lag_monitor(stats)),
+        asyncio.create_task(report_loop(stats, fanout)),
+    ]
+    for symbol in symbols:
+        tasks.append(asyncio.create_task(BinanceWSClient(symbol, on_update, proxy=None, base_url=f"{ws_url}/binance/ws")
+                                         .subscribe_orderbook(depth=depth)))
+        tasks.append(asyncio.create_task(GateWSClient(to_gate_symbol(symbol), on_update, proxy=None,
+                                                      base_url=f"{ws_url}/gate/ws", rest_url=f"{url}/gate/api/v4")
+                                         .subscribe_orderbook(depth=depth)))
+    if orders_per_sec:
+        tasks.append(asyncio.create_task(order_flow(url, symbols, stats, orders_per_sec)))
+
+    started = time.monotonic()
+    await asyncio.sleep(duration)
+    elapsed = time.monotonic() - started
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{url}/stats") as resp:
+            server = await resp.json()
+
+    print("\n[Load Result]")
+    print(f"received {stats.received:,} msgs in {elapsed:.1f}s = {stats.received / elapsed:,.0f} msgs/s "
+          f"({stats.per_venue})")
+    print(f"server sent {server['sent']:,}, dropped {server['dropped']:,}, connections {server['connections']}, "
+          f"disconnects {server['disconnects']}")
+    print(f"event loop lag p50={_us(stats.loop_lag.percentile(0.5))} p99={_us(stats.loop_lag.percentile(0.99))} "
+          f"max={_us(stats.loop_lag.max)}")
+    if stats.orders:
+        print(f"orders {stats.orders}, errors/rejects {stats.order_errors}, latency "
+              f"p50={_us(stats.order_latency.percentile(0.5))} p99={_us(stats.order_latency.percentile(0.99))}")
+    for name, s in fanout.stats().items():
+        print(f"fanout {name}: {s}")
+    print(LATENCY.format_summary())
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='模拟交易所压测')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--symbols', type=int, default=20, help='symbol 数量，每个 symbol 两条订阅')
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--orders-per-sec', type=float, default=0)
+    args = parse_config_args(parser).parse_args()
+
+    symbols = [f"SIM{i}USDT" for i in range(args.symbols)]
+    config = config_from_args(args)
+    server = Process(target=run_sim_exchange, args=(symbols, config, args.host, args.port), daemon=True)
+    server.start()
+    try:
+        asyncio.run(run_load(f"http://{args.host}:{args.port}", f"ws://{args.host}:{args.port}", symbols,
+                             args.duration, args.orders_per_sec, args.depth))
+    except KeyboardInterrupt:
+        print("Stopped by user.")
+    finally:
+        server.terminate()
@@ -0,0 +1,135 @@
+"""
+SpreadMatrix 多交易所测试：用 LocalVenue 注入行情，经 stream_orderbook / stream_mark_price 回调驱动价差矩阵
+- 每次增量重算一行一列的结果和按当前报价整矩阵重算一致
+- 没有报价的交易所行列为 NaN，不参与 best；设置 max_age_ms 后过期交易所不参与 best / opportunities
+
+运行：python -m pytest tests
+"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from market_data.spread_matrix import SpreadMatrix
+from venues.local import LocalVenue
+
+VENUES = ['binance', 'gate', 'okx', 'bybit']
+SYMBOLS = ['BTCUSDT', 'ETHUSDT']
+
+
+# 按当前报价整矩阵重算，作为增量结果的参照
+def full_recompute(bid, ask, mid):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mid_spread = (mid[:, None] - mid[None, :]) / mid[:, None]
+        exec_spread = (bid[:, None] - ask[None, :]) / bid[:, None]
+    np.fill_diagonal(mid_spread, np.nan)
+    np.fill_diagonal(exec_spread, np.nan)
+    return mid_spread, exec_spread
+
+
+def assert_matches_full(matrix, symbol):
+    state = matrix.get(symbol)
+    mid_spread, exec_spread = full_recompute(state['bid'], state['ask'], state['mid'])
+    np.testing.assert_allclose(state['mid_spread'], mid_spread, equal_nan=True)
+    np.testing.assert_allclose(state['exec_spread'], exec_spread, equal_nan=True)
+
+
+# 注册所有交易所的 stream 回调，在同一个事件循环里执行 body(venues, matrix)
+def run_with_venues(matrix, body, names=VENUES, symbols=SYMBOLS, mark_price=False):
+    async def main():
+        venues = {name: LocalVenue(name) for name in names}
+        streams = [asyncio.create_task(v.stream_orderbook(s, matrix.on_update)) for v in venues.values() for s in symbols]
+        if mark_price:
+            streams += [asyncio.create_task(v.stream_mark_price(s, matrix.on_update))
+                        for v in venues.values() for s in symbols]
+        await asyncio.sleep(0)
+        try:
+            body(venues, matrix)
+        finally:
+            for task in streams:
+                task.cancel()
+            await asyncio.gather(*streams, return_exceptions=True)
+    asyncio.run(main())
+
+
+def push_book(venue, symbol, mid, half_spread=0.01):
+    venue.push_orderbook(symbol, [(mid - half_spread, 1.0), (mid - 2 * half_spread, 2.0)],
+                         [(mid + half_spread, 1.0), (mid + 2 * half_spread, 2.0)])
+
+
+def test_incremental_matches_full_recompute():
+    matrix = SpreadMatrix(VENUES)
+    rng = np.random.default_rng(0)
+
+    def body(venues, matrix):
+        for step in range(200):
+            name = VENUES[rng.integers(len(VENUES))]
+            symbol = SYMBOLS[rng.integers(len(SYMBOLS))]
+            push_book(venues[name], symbol, 100 + rng.normal(), half_spread=rng.uniform(0.001, 0.05))
+            assert_matches_full(matrix, symbol)
+
+    run_with_venues(matrix, body)
+    # 每次更新只重算 2 * (N - 1) 个交易所对
+    assert matrix.updates == 200
+    assert matrix.pair_updates == 200 * 2 * (len(VENUES) - 1)
+
+
+def test_mark_price_only_venue_uses_mark_as_mid():
+    matrix = SpreadMatrix(VENUES[:3])
+
+    def body(venues, matrix):
+        push_book(venues['binance'], 'BTCUSDT', 100.0)
+        push_book(venues['gate'], 'BTCUSDT', 101.0)
+        venues['okx'].push_mark_price('BTCUSDT', 99.0)
+        assert_matches_full(matrix, 'BTCUSDT')
+
+    run_with_venues(matrix, body, names=VENUES[:3], mark_price=True)
+    state = matrix.get('BTCUSDT')
+    assert state['mid'][2] == 99.0
+    assert np.isnan(state['exec_spread'][2]).all()  # 只有标记价格，没有可执行价差
+    assert matrix.best('BTCUSDT')[:2] == ('gate', 'binance')
+
+
+def test_missing_venue_is_nan_and_skipped():
+    matrix = SpreadMatrix(VENUES)
+
+    def body(venues, matrix):
+        push_book(venues['binance'], 'BTCUSDT', 100.0)
+        assert matrix.best('BTCUSDT') is None  # 只有一个交易所，没有交易所对
+        push_book(venues['gate'], 'BTCUSDT', 101.0)
+        push_book(venues['okx'], 'BTCUSDT', 100.5)
+
+    run_with_venues(matrix, body)
+    frame = matrix.frame('BTCUSDT')
+    assert frame.loc['bybit'].isna().all() and frame['bybit'].isna().all()
+    assert_matches_full(matrix, 'BTCUSDT')
+    sell, buy, spread = matrix.best('BTCUSDT')
+    assert (sell, buy) == ('gate', 'binance')
+    assert spread == pytest.approx((100.99 - 100.01) / 100.99)
+    assert matrix.get('ETHUSDT') is None
+
+
+def test_stale_venue_excluded():
+    matrix = SpreadMatrix(VENUES[:3], max_age_ms=1000)
+
+    def body(venues, matrix):
+        push_book(venues['binance'], 'BTCUSDT', 100.0)
+        push_book(venues['gate'], 'BTCUSDT', 102.0)
+        push_book(venues['okx'], 'BTCUSDT', 101.0)
+
+    run_with_venues(matrix, body, names=VENUES[:3])
+    event_ms = matrix.symbols['BTCUSDT'].event_ms
+    now_ms = int(event_ms.max())
+    assert matrix.best('BTCUSDT', now_ms=now_ms)[:2] == ('gate', 'binance')
+
+    # gate 报价过期后，最大价差换成剩下两个交易所之间
+    event_ms[1] = now_ms - 5000
+    assert matrix.fresh('BTCUSDT', now_ms=now_ms).tolist() == [True, False, True]
+    assert matrix.best('BTCUSDT', now_ms=now_ms)[:2] == ('okx', 'binance')
+    assert [o['sell'] for o in matrix.opportunities(now_ms=now_ms)] == ['okx']
+
+    # 只剩一个未过期的交易所时没有机会；矩阵本身保留最后的报价
+    event_ms[2] = now_ms - 5000
+    assert matrix.best('BTCUSDT', now_ms=now_ms) is None
+    assert matrix.opportunities(now_ms=now_ms) == []
+    assert_matches_full(matrix, 'BTCUSDT')
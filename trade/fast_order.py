@@ -0,0 +1,200 @@
+"""
+低延迟下单通道，绕开 ccxt / gate_api 的请求构建：
+- 每个交易所一个 requests.Session 长连接池，后台线程在空闲时定时 ping，保持经代理的 TLS 连接处于热状态
+- 每个 symbol / 方向的请求体预先拼好，发送时只填数量和时间戳
+- HMAC 密钥只初始化一次，签名时 copy() 已经吸收密钥的 hmac 对象，省去每次重新计算 ipad/opad
+  Binance: HMAC-SHA256(secret, query)，参数和签名放在 form body 里
+  Gate:    HMAC-SHA512(secret, "POST\\n{path}\\n\\n{sha512(body)}\\n{ts}")；平仓请求体完全固定，body 哈希也预先算好
+- Binance 时间戳按服务器时间校准，ping 线程顺带刷新偏移
+- 由 BinanceFuturesTrader / GateFuturesTrader.enable_fast_path() 启用，失败时打印错误返回 None，和 trader 一致
+"""
+import hashlib
+import hmac
+import json
+import math
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import BINANCE_API_KEY, BINANCE_API_SECRET, BINANCE_PROXY, GATEIO_API_KEY, GATEIO_API_SECRET, GATE_PROXY
+
+
+class _WarmSession:
+    # 长连接池 + 空闲 ping 线程；最近 interval 秒内有过请求就不 ping
+    def __init__(self, base_url, proxy=None, ping_path=None, interval=15, pool_size=4, timeout=5):
+        self.base_url = base_url.rstrip('/')
+        self.ping_path = ping_path
+        self.interval = interval
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if proxy:
+            self.session.proxies = {'http': proxy, 'https': proxy}
+        self.last_used = 0.0
+        self.on_ping = None  # ping 成功后回调（如 Binance 校准时间）
+        self._stop = threading.Event()
+        self._thread = None
+
+    def request(self, method, path, **kwargs):
+        self.last_used = time.monotonic()
+        return self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+
+    def ping(self):
+        try:
+            resp = self.request('GET', self.ping_path)
+            if self.on_ping is not None:
+                self.on_ping(resp)
+        except requests.RequestException as e:
+            print(f"[FastOrder] keep-alive ping to {self.base_url} failed: {e}")
+
+    def _ping_loop(self):
+        while not self._stop.wait(self.interval / 3):
+            if time.monotonic() - self.last_used >= self.interval:
+                self.ping()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self.ping()  # 先建好连接
+        self._thread = threading.Thread(target=self._ping_loop, name=f"keepalive-{self.base_url}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        self.session.close()
+
+
+# 按 step 向下取整后格式化，避免浮点尾数（如 0.30000000000000004）
+def format_step(value, step):
+    decimals = max(0, -int(math.floor(math.log10(step) + 1e-9)))
+    return f"{math.floor(value / step + 1e-9) * step:.{decimals}f}"
+
+
+class BinanceFastOrder:
+
+    def __init__(self, api_key=BINANCE_API_KEY, api_secret=BINANCE_API_SECRET, base_url="https://fapi.binance.com",
+                 proxy=BINANCE_PROXY, recv_window=5000, keepalive_interval=15):
+        self.conn = _WarmSession(base_url, proxy=proxy, ping_path='/fapi/v1/time', interval=keepalive_interval)
+        self.conn.on_ping = self._sync_time
+        self.headers = {'X-MBX-APIKEY': api_key, 'Content-Type': 'application/x-www-form-urlencoded'}
+        self._mac = hmac.new(api_secret.encode(), digestmod=hashlib.sha256)
+        self.recv_window = recv_window
+        self.time_offset_ms = 0
+        self.step = {}       # symbol -> 数量步长
+        self.templates = {}  # (symbol, side, positionSide) -> 数量之前的固定参数
+
+    # 用 /fapi/v1/time 的返回校准本地时钟，取请求往返的中点
+    def _sync_time(self, resp):
+        if resp.status_code != 200:
+            return
+        server_ms = resp.json().get('serverTime')
+        if server_ms:
+            elapsed_ms = resp.elapsed.total_seconds() * 1000
+            self.time_offset_ms = int(server_ms + elapsed_ms / 2 - time.time() * 1000)
+
+    def start(self):
+        self.conn.start()
+
+    def stop(self):
+        self.conn.stop()
+
+    # 预先拼好某 symbol 四个方向的参数；step 为数量步长（交易所 LOT_SIZE.stepSize）
+    def prepare(self, symbol, step):
+        self.step[symbol] = float(step)
+        for side, position_side in (('BUY', 'LONG'), ('SELL', 'SHORT'), ('SELL', 'LONG'), ('BUY', 'SHORT')):
+            self.templates[(symbol, side, position_side)] = (
+                f"symbol={symbol}&side={side}&type=MARKET&positionSide={position_side}"
+                f"&recvWindow={self.recv_window}&quantity=").encode()
+
+    def _signed_body(self, prefix, quantity):
+        body = b''.join((prefix, quantity.encode(), b'&timestamp=',
+                         str(int(time.time() * 1000) + self.time_offset_ms).encode()))
+        mac = self._mac.copy()
+        mac.update(body)
+        return body + b'&signature=' + mac.hexdigest().encode()
+
+    # side: BUY/SELL；position_side: LONG/SHORT；quantity 为币数量，按步长向下取整
+    def send(self, symbol, side, position_side, quantity):
+        prefix = self.templates.get((symbol, side, position_side))
+        if prefix is None:
+            raise KeyError(f"{symbol} is not prepared for fast orders")
+        qty = format_step(quantity, self.step[symbol])
+        if float(qty) <= 0:
+            print(f"[Error] Binance - fast order quantity {quantity} for {symbol} rounds to zero")
+            return None
+        resp = self.conn.request('POST', '/fapi/v1/order', data=self._signed_body(prefix, qty), headers=self.headers)
+        result = resp.json()
+        if resp.status_code != 200:
+            print(f"[Error] Binance - fast order rejected for {symbol}: {result}")
+            return None
+        return result
+
+
+class GateFastOrder:
+
+    ORDER_PATH = '/api/v4/futures/usdt/orders'
+
+    def __init__(self, api_key=GATEIO_API_KEY, api_secret=GATEIO_API_SECRET, base_url="https://api.gateio.ws",
+                 proxy=GATE_PROXY, keepalive_interval=15):
+        self.conn = _WarmSession(base_url, proxy=proxy, ping_path='/api/v4/spot/time', interval=keepalive_interval)
+        self.api_key = api_key
+        self._mac = hmac.new(api_secret.encode(), digestmod=hashlib.sha512)
+        self._sign_prefix = f"POST\n{self.ORDER_PATH}\n\n".encode()
+        self.open_templates = {}   # contract -> (size 之前, size 之后)
+        self.close_bodies = {}     # (contract, 'long'/'short') -> (body, sha512(body) hex)
+
+    def start(self):
+        self.conn.start()
+
+    def stop(self):
+        self.conn.stop()
+
+    # 预先拼好某合约的开仓模板和两个方向的平仓请求体，字段同 GateFuturesTrader
+    def prepare(self, contract):
+        head = json.dumps({'contract': contract}, separators=(',', ':'))[:-1]
+        self.open_templates[contract] = (
+            f'{head},"size":'.encode(),
+            b',"price":"0","tif":"ioc","text":"t-api_market","reduce_only":false,"close":false}')
+        for position in ('long', 'short'):
+            body = (f'{head},"size":0,"price":"0","tif":"ioc","text":"t-api_market_close",'
+                    f'"reduce_only":true,"close":false,"auto_size":"close_{position}"}}').encode()
+            self.close_bodies[(contract, position)] = (body, hashlib.sha512(body).hexdigest().encode())
+
+    def _post(self, contract, body, body_hash):
+        ts = str(int(time.time())).encode()
+        mac = self._mac.copy()
+        mac.update(b''.join((self._sign_prefix, body_hash, b'\n', ts)))
+        headers = {'KEY': self.api_key, 'Timestamp': ts, 'SIGN': mac.hexdigest(),
+                   'Content-Type': 'application/json', 'Accept': 'application/json'}
+        resp = self.conn.request('POST', self.ORDER_PATH, data=body, headers=headers)
+        result = resp.json()
+        if resp.status_code not in (200, 201):
+            print(f"❌ Gate 快速下单被拒 {contract}: {result}")
+            return None
+        return result
+
+    # size 为带方向的张数，正数开多、负数开空
+    def send(self, contract, size):
+        template = self.open_templates.get(contract)
+        if template is None:
+            raise KeyError(f"{contract} is not prepared for fast orders")
+        size = int(size)
+        if size == 0:
+            print(f"❌ Gate 快速下单张数为 0: {contract}")
+            return None
+        body = b''.join((template[0], str(size).encode(), template[1]))
+        return self._post(contract, body, hashlib.sha512(body).hexdigest().encode())
+
+    # position: 'long' / 'short'，按 auto_size 全部平掉
+    def close(self, contract, position):
+        prepared = self.close_bodies.get((contract, position))
+        if prepared is None:
+            raise KeyError(f"{contract} is not prepared for fast orders")
+        return self._post(contract, *prepared)
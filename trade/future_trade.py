@@ -2,11 +2,15 @@
 合约下单的模块
 - gate/binance设置合约杠杆
 - gate/binance合约下单，市价单
+- enable_fast_path() 后下单改走 fast_order 的热连接和预构建请求，不经过 ccxt / gate_api
 """
 import ccxt
 from config import BINANCE_API_KEY, BINANCE_API_SECRET, GATEIO_API_KEY, GATEIO_API_SECRET, BINANCE_PROXY, GATE_PROXY
 from gate_api import FuturesApi, Configuration, ApiClient
 from gate_api.exceptions import ApiException
+from market_data.latency import LATENCY, STAGE_SIGNAL_TO_ORDER_ACK
+from market_data.depth_capacity import SHORT_BINANCE
+from trade.fast_order import BinanceFastOrder, GateFastOrder
 
 class BinanceFuturesTrader:
     # Binance的symbol格式为：BTCUSDT
@@ -19,6 +23,44 @@ class BinanceFuturesTrader:
         self.exchange.httpsProxy = BINANCE_PROXY
         self.markets = self.exchange.load_markets()
 
+        # 由 BinanceUserStream 维护的实时账户状态；未启用或断线时回退到 REST
+        self.account = None
+        # enable_fast_path() 后的低延迟下单通道
+        self.fast_order = None
+        # fast path 下单前定数量用的本地 WS 盘口（SharedMarketData），取不到时回退到 REST
+        self.book = None
+
+    # 启用低延迟下单：建立热连接并为 symbols 预先准备请求模板（未准备的 symbol 首次下单时再准备）
+    # book: SharedMarketData，传入后按本地盘口换算下单数量，不再阻塞请求 REST orderbook
+    def enable_fast_path(self, symbols=(), keepalive_interval=15, book=None, **kwargs):
+        self.book = book
+        if self.fast_order is None:
+            self.fast_order = BinanceFastOrder(api_key=self.exchange.apiKey, api_secret=self.exchange.secret,
+                                               proxy=BINANCE_PROXY, keepalive_interval=keepalive_interval, **kwargs)
+            self.fast_order.start()
+        for symbol in symbols:
+            self._prepare_fast(symbol)
+
+    def disable_fast_path(self):
+        if self.fast_order is not None:
+            self.fast_order.stop()
+            self.fast_order = None
+        self.book = None
+
+    def _prepare_fast(self, symbol):
+        if symbol not in self.fast_order.step:
+            self.fast_order.prepare(symbol, self.exchange.market(symbol)['precision']['amount'])
+
+    # 下单：启用了 fast path 时走预构建请求，否则走 ccxt
+    def _send_order(self, symbol, side, positionSide, amount):
+        if self.fast_order is not None:
+            self._prepare_fast(symbol)
+            result = self.fast_order.send(symbol, side, positionSide, amount)
+            # 转成和 create_order 一样的 ccxt 统一格式
+            return self.exchange.parse_order(result, self.exchange.market(symbol)) if result is not None else None
+        return self.exchange.create_order(symbol=symbol, type='market', side=side, amount=amount,
+                                          params={'positionSide': positionSide})
+
     # 设置杠杆
     def set_leverage(self, symbol, leverage):
         try:
@@ -28,6 +70,8 @@ class BinanceFuturesTrader:
 
     # 获取合约账户余额
     def get_balance(self):
+        if self.account is not None and self.account.synced:
+            return self.account.available_balance('USDT')
         try:
             balance = self.exchange.fetch_balance()['info']['availableBalance']
             return balance
@@ -35,7 +79,12 @@ class BinanceFuturesTrader:
             print(f"[Error] Binance - Can't get future account balance: {e}")
 
     # 根据合约下单方向，获取相应的实时orderbook price
+    # fast path 下优先取本地 WS 盘口，没有或过期时才请求 REST
     def get_orderbook_price(self, symbol, side):
+        if self.fast_order is not None and self.book is not None:
+            price = self.book.best_price('binance', symbol.lower(), side)
+            if price is not None:
+                return price
         ob = self.exchange.fetch_order_book(symbol)
         if side == 'long': # 做多需要buy
             return ob['asks'][0][0]  # best ask price for buy
@@ -53,7 +102,8 @@ class BinanceFuturesTrader:
 
     # 合约下市价单
     # create_order里，amount实际指quantity
-    def place_market_order(self, symbol, side, amount):
+    # signal_ns: 策略信号时间（SharedMarketData.mark_signal 返回值），用于统计信号到下单回报的延迟
+    def place_market_order(self, symbol, side, amount, signal_ns=None):
 
         positionSide = None
         if side=='long':
@@ -64,14 +114,11 @@ class BinanceFuturesTrader:
             positionSide = 'SHORT'
 
         try:
-            q = self.usdt_to_quantity(symbol=symbol, usdt_amount=amount)
-            future_order = self.exchange.create_order(
-                symbol=symbol,
-                type='market',
-                side=side,
-                amount=q,
-                params={'positionSide': positionSide}
-            )
+            q = self.usdt_to_quantity(symbol=symbol, usdt_amount=amount, side=positionSide.lower())
+            future_order = self._send_order(symbol, side, positionSide, q)
+            if future_order is None:
+                return None
+            LATENCY.record(STAGE_SIGNAL_TO_ORDER_ACK, 'binance', symbol, signal_ns)
             print("Binance Future market order is placed: ", future_order)
             return future_order
 
@@ -79,7 +126,7 @@ class BinanceFuturesTrader:
             print(f"[Error] Binance - Can't place future market order for {symbol}: {e}")
 
     # 市价关仓
-    def close_position(self, symbol, position):
+    def close_position(self, symbol, position, signal_ns=None):
         # position='long' 表示平多（卖出），position='short' 表示平空（买入）
         if position == 'long':
             side = 'SELL'
@@ -89,19 +136,18 @@ class BinanceFuturesTrader:
             positionSide = 'SHORT'
 
         try:
-            positions = self.exchange.fetch_positions([symbol], params={})
-            position_qty = 0
-            for pos in positions:
-                if pos['info']['symbol'] == symbol and pos['side'].lower() == position:
-                    position_qty = abs(pos['contracts'])
+            if self.account is not None and self.account.synced:
+                position_qty = self.account.position_qty(symbol, position)
+            else:
+                positions = self.exchange.fetch_positions([symbol], params={})
+                position_qty = 0
+                for pos in positions:
+                    if pos['info']['symbol'] == symbol and pos['side'].lower() == position:
+                        position_qty = abs(pos['contracts'])
             if position_qty > 0:
-                close_order = self.exchange.create_order(symbol=symbol,
-                                                  type='market',
-                                                  side=side,
-                                                  amount=position_qty,
-                                                  params={
-                'positionSide': positionSide
-            })
+                close_order = self._send_order(symbol, side, positionSide, position_qty)
+                if close_order is not None:
+                    LATENCY.record(STAGE_SIGNAL_TO_ORDER_ACK, 'binance', symbol, signal_ns)
                 return close_order
         except Exception as e:
             print(f"[Error] Binance - Can't close future market for {symbol}: {e}")
@@ -128,6 +174,38 @@ class GateFuturesTrader:
         self.api_client = ApiClient(self.config)
         self.futures_api = FuturesApi(self.api_client)
 
+        # 由 GateUserStream 维护的实时账户状态；未启用或断线时回退到 REST
+        self.account = None
+        # enable_fast_path() 后的低延迟下单通道
+        self.fast_order = None
+        # fast path 下单前定数量用的本地 WS 盘口（SharedMarketData），取不到时回退到 REST
+        self.book = None
+        # contract -> quanto_multiplier，fast path 下复用
+        self.quanto = {}
+
+    # 启用低延迟下单：建立热连接并为 symbols 预先准备请求模板（未准备的 symbol 首次下单时再准备）
+    # book: SharedMarketData，传入后按本地盘口换算下单张数，合约面值也只查一次
+    def enable_fast_path(self, symbols=(), keepalive_interval=15, book=None, **kwargs):
+        self.book = book
+        if self.fast_order is None:
+            self.fast_order = GateFastOrder(api_key=GATEIO_API_KEY, api_secret=GATEIO_API_SECRET, proxy=GATE_PROXY,
+                                            keepalive_interval=keepalive_interval, **kwargs)
+            self.fast_order.start()
+        for symbol in symbols:
+            self.fast_order.prepare(symbol)
+            self.get_quanto_multiplier(symbol)
+
+    def disable_fast_path(self):
+        if self.fast_order is not None:
+            self.fast_order.stop()
+            self.fast_order = None
+        self.book = None
+
+    def _fast(self, symbol):
+        if symbol not in self.fast_order.open_templates:
+            self.fast_order.prepare(symbol)
+        return self.fast_order
+
     # 设置杠杆
     def set_leverage(self, symbol, leverage):
         try:
@@ -142,6 +220,8 @@ class GateFuturesTrader:
 
     # 查询合约usdt余额
     def get_available_balance(self):
+        if self.account is not None and self.account.synced:
+            return self.account.available_balance('USDT')
         try:
             balance_info = self.futures_api.list_futures_accounts(settle='usdt')
             return float(balance_info.available)
@@ -149,7 +229,12 @@ class GateFuturesTrader:
             print(f"❌ 获取 Gate 合约账户余额出错: {e}")
 
     # 根据合约下单方向，获取相应的实时orderbook price
+    # fast path 下优先取本地 WS 盘口，没有或过期时才请求 REST
     def get_orderbook_price(self, symbol, side):
+        if self.fast_order is not None and self.book is not None:
+            price = self.book.best_price('gate', symbol, side)
+            if price is not None:
+                return price
         ob = self.exchange.fetch_order_book(symbol)
         if side == 'long':  # 做多需要buy
             return float(ob['asks'][0][0])  # best ask price for buy
@@ -157,10 +242,14 @@ class GateFuturesTrader:
             return float(ob['bids'][0][0])  # best bid price for sell
 
     # Gateio获取单个合约规格
+    # fast path 下合约面值查一次后缓存，下单时不再走 REST
     def get_quanto_multiplier(self, symbol):
+        if self.fast_order is not None and symbol in self.quanto:
+            return self.quanto[symbol]
         try:
             info = self.futures_api.get_futures_contract(settle='usdt', contract=symbol)
-            return float(info.quanto_multiplier)  # 每一张合约面值
+            self.quanto[symbol] = float(info.quanto_multiplier)
+            return self.quanto[symbol]  # 每一张合约面值
         except Exception as e:
             print(f"获取合约规格时出错: {e}")
 
@@ -176,7 +265,7 @@ class GateFuturesTrader:
 
     # 合约市价下单
     # amount对应是size
-    def place_market_order(self, symbol, side, amount):
+    def place_market_order(self, symbol, side, amount, signal_ns=None):
 
         size = self.usdt_to_size(symbol=symbol, usdt_amount=amount, side=side)
         if side == 'long':
@@ -184,6 +273,16 @@ class GateFuturesTrader:
         elif side == 'short':
             size = -abs(size)
 
+        if self.fast_order is not None:
+            try:
+                order = self._fast(symbol).send(symbol, size)
+            except Exception as e:
+                print(f"❌ 快速下单出错: {e}")
+                return None
+            if order is not None:
+                LATENCY.record(STAGE_SIGNAL_TO_ORDER_ACK, 'gate', symbol, signal_ns)
+            return order
+
         try:
             order = self.futures_api.create_futures_order(
                 settle="usdt",
@@ -197,19 +296,35 @@ class GateFuturesTrader:
                     "close": False  # 开仓
                 }
             )
+            LATENCY.record(STAGE_SIGNAL_TO_ORDER_ACK, 'gate', symbol, signal_ns)
             return order
         except ApiException as e:
             print(f"❌ 开多市价单时出错: {e}")
             return None
 
     # 市价关仓
-    def close_position(self, symbol, position):
+    def close_position(self, symbol, position, signal_ns=None):
         # position='long' 表示平多（卖出），position='short' 表示平空（买入）
         if position == 'long':
             auto_size = 'close_long'
         elif position == 'short':
             auto_size = 'close_short'
 
+        # 账户推送在线时可直接确认是否有仓位，无仓位就不发单
+        if self.account is not None and self.account.synced and self.account.position_qty(symbol, position) == 0:
+            print(f"Gate - no {position} position on {symbol} to close")
+            return None
+
+        if self.fast_order is not None:
+            try:
+                order = self._fast(symbol).close(symbol, position)
+            except Exception as e:
+                print(f"❌ 快速平仓出错: {e}")
+                return None
+            if order is not None:
+                LATENCY.record(STAGE_SIGNAL_TO_ORDER_ACK, 'gate', symbol, signal_ns)
+            return order
+
         try:
             order = self.futures_api.create_futures_order(
                 settle="usdt",
@@ -224,12 +339,27 @@ class GateFuturesTrader:
                     "auto_size": auto_size  # "close_long" or "close_short"
                 }
             )
+            LATENCY.record(STAGE_SIGNAL_TO_ORDER_ACK, 'gate', symbol, signal_ns)
             return order
         except ApiException as e:
             print(f"❌ 平多市价单时出错: {e}")
             return None
 
 
+# 两边同时开一对套利单，两条腿用同一个金额
+# direction: 'short_binance' / 'long_binance'；symbol 为 Binance 格式，如 'BTCUSDT'
+# capacity: DepthCapacity，传入时 max_amount 作为上限，按同一份盘口估算结果定金额；容量不足时两条腿都不下
+def place_pair_order(binance_trader, gate_trader, symbol, direction, max_amount, capacity=None, signal_ns=None):
+    amount = capacity.size_for(symbol, direction, max_amount) if capacity is not None else max_amount
+    if not amount:
+        print(f"Not enough depth on {symbol} for {direction} at target spread, pair order skipped")
+        return None, None
+    b_side, g_side = ('short', 'long') if direction == SHORT_BINANCE else ('long', 'short')
+    b_order = binance_trader.place_market_order(symbol, b_side, amount, signal_ns=signal_ns)
+    g_order = gate_trader.place_market_order(symbol.replace('USDT', '_USDT'), g_side, amount, signal_ns=signal_ns)
+    return b_order, g_order
+
+
 if __name__ == '__main__':
 
     # bfuture_trader = BinanceFuturesTrader()
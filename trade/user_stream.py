@@ -0,0 +1,399 @@
+"""
+合约账户私有数据流模块：
+- Binance: listenKey 用户数据流（ACCOUNT_UPDATE / ORDER_TRADE_UPDATE），定时 keep-alive
+- Gate: futures.orders / futures.positions / futures.balances 私有频道
+- 每次（重）连接先用 REST 对账，之后仓位、订单、余额全部由推送维护在内存里
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+from collections import deque
+
+import aiohttp
+from gate_api import AccountApi
+
+from config import BINANCE_PROXY, GATE_PROXY, GATEIO_API_KEY, GATEIO_API_SECRET
+
+
+class AccountState:
+    # 单个交易所合约账户的内存状态，symbol 使用该交易所自己的格式
+    def __init__(self, venue):
+        self.venue = venue
+        self.positions = {}  # (symbol, 'long'/'short') -> 持仓数量（绝对值，Binance 为币数量，Gate 为张数）
+        self.orders = {}     # order_id -> 最新订单状态
+        self.balances = {}   # asset -> {'wallet': ..., 'available': ...}
+        self.fills = deque(maxlen=1000)
+        self.fill_listeners = []
+        self.synced = False  # REST 对账完成且推送连接在线时为 True
+        self.updated_at = None
+
+    def _touch(self):
+        self.updated_at = time.time()
+
+    def position_qty(self, symbol, side):
+        return self.positions.get((symbol, side), 0.0)
+
+    def set_position(self, symbol, side, qty):
+        self.positions[(symbol, side)] = abs(float(qty))
+        self._touch()
+
+    # 单向持仓模式下数量带符号，拆成 long/short 两边
+    def set_net_position(self, symbol, signed_qty):
+        signed_qty = float(signed_qty)
+        self.positions[(symbol, 'long')] = max(signed_qty, 0.0)
+        self.positions[(symbol, 'short')] = max(-signed_qty, 0.0)
+        self._touch()
+
+    def set_balance(self, asset, wallet=None, available=None):
+        balance = self.balances.setdefault(asset, {'wallet': None, 'available': None})
+        if wallet is not None:
+            balance['wallet'] = float(wallet)
+        if available is not None:
+            balance['available'] = float(available)
+        self._touch()
+
+    def available_balance(self, asset='USDT'):
+        return self.balances.get(asset, {}).get('available')
+
+    # 对账时用 REST 快照整体替换，推送断开期间已平掉的仓位、已结束的订单不会残留
+    def replace_positions(self, positions):
+        self.positions = positions
+        self._touch()
+
+    def replace_orders(self, orders):
+        self.orders = orders
+        self._touch()
+
+    def update_order(self, order_id, order):
+        self.orders[order_id] = order
+        self._touch()
+
+    def add_fill(self, fill):
+        self.fills.append(fill)
+        self._touch()
+        for listener in self.fill_listeners:
+            try:
+                listener(fill)
+            except Exception as e:
+                print(f"[{self.venue} Fill Listener Error] {e}")
+
+
+class BinanceUserStream:
+
+    base_url = "wss://fstream.binance.com/ws"
+    keepalive_interval = 30 * 60  # listenKey 60 分钟过期，30 分钟续期一次
+
+    # trader: BinanceFuturesTrader，复用其 ccxt exchange 做 listenKey 和 REST 对账
+    def __init__(self, trader, proxy: str = BINANCE_PROXY):
+        self.trader = trader
+        self.exchange = trader.exchange
+        self.proxy = proxy
+        self.state = AccountState('binance')
+        self.listen_key = None
+        self._refresh_task = None
+        trader.account = self.state
+
+    async def _create_listen_key(self):
+        response = await asyncio.to_thread(self.exchange.fapiPrivatePostListenKey)
+        return response['listenKey']
+
+    async def _keepalive_loop(self):
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            try:
+                await asyncio.to_thread(self.exchange.fapiPrivatePutListenKey)
+            except Exception as e:
+                print(f"[Binance UserStream] listenKey keep-alive failed: {e}")
+
+    # REST 对账：全部仓位、挂单和余额；仓位和挂单按快照重建（positionRisk 只返回非零仓位）
+    def _reconcile(self):
+        positions = {}
+        for pos in self.exchange.fetch_positions():
+            symbol = pos['info']['symbol']
+            position_side = pos['info'].get('positionSide', 'BOTH')
+            if position_side == 'BOTH':
+                amount = float(pos['info'].get('positionAmt', 0) or 0)
+                positions[(symbol, 'long')] = max(amount, 0.0)
+                positions[(symbol, 'short')] = max(-amount, 0.0)
+            else:
+                positions[(symbol, position_side.lower())] = abs(float(pos['contracts'] or 0))
+        self.state.replace_positions(positions)
+
+        orders = {}
+        for o in self.exchange.fapiPrivateGetOpenOrders():
+            orders[int(o['orderId'])] = {
+                'symbol': o['symbol'],
+                'order_id': int(o['orderId']),
+                'client_order_id': o.get('clientOrderId'),
+                'side': o['side'],
+                'position_side': o.get('positionSide'),
+                'status': o['status'],
+                'filled': float(o.get('executedQty', 0)),
+                'avg_price': float(o.get('avgPrice', 0)),
+                'time': o.get('updateTime'),
+            }
+        self.state.replace_orders(orders)
+
+        info = self.exchange.fetch_balance()['info']
+        for asset in info.get('assets', []):
+            self.state.set_balance(asset['asset'], wallet=asset.get('walletBalance'),
+                                   available=asset.get('availableBalance'))
+        self.state.set_balance('USDT', available=info.get('availableBalance'))
+
+    # ACCOUNT_UPDATE 不带 availableBalance，收到后在后台线程刷新一次，不影响下单路径
+    async def _refresh_available(self):
+        try:
+            info = await asyncio.to_thread(self.exchange.fetch_balance)
+            self.state.set_balance('USDT', available=info['info'].get('availableBalance'))
+        except Exception as e:
+            print(f"[Binance UserStream] balance refresh failed: {e}")
+
+    # 后台刷新可用余额；保留 task 引用，已有刷新在跑就不再重复发起
+    def _schedule_refresh(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._refresh_available())
+
+    def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        self.state.synced = False
+
+    def _handle_account_update(self, data):
+        account = data.get('a', {})
+        for b in account.get('B', []):
+            self.state.set_balance(b['a'], wallet=b.get('wb'))
+        for p in account.get('P', []):
+            if p.get('ps', 'BOTH') == 'BOTH':
+                self.state.set_net_position(p['s'], p['pa'])
+            else:
+                self.state.set_position(p['s'], p['ps'].lower(), p['pa'])
+        self._schedule_refresh()
+
+    def _handle_order_update(self, data):
+        o = data['o']
+        order = {
+            'symbol': o['s'],
+            'order_id': o['i'],
+            'client_order_id': o.get('c'),
+            'side': o['S'],
+            'position_side': o.get('ps'),
+            'status': o['X'],
+            'filled': float(o.get('z', 0)),
+            'avg_price': float(o.get('ap', 0)),
+            'time': o.get('T'),
+        }
+        self.state.update_order(o['i'], order)
+        if o.get('x') == 'TRADE':
+            self.state.add_fill({**order, 'last_qty': float(o.get('l', 0)), 'last_price': float(o.get('L', 0))})
+
+    async def _handle_message(self, msg):
+        data = json.loads(msg.data)
+        event = data.get('e')
+        if event == 'ACCOUNT_UPDATE':
+            self._handle_account_update(data)
+        elif event == 'ORDER_TRADE_UPDATE':
+            self._handle_order_update(data)
+        elif event == 'listenKeyExpired':
+            raise ConnectionError("listenKey expired")
+
+    async def run(self):
+        while True:
+            keepalive = None
+            try:
+                self.listen_key = await self._create_listen_key()
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(f"{self.base_url}/{self.listen_key}", proxy=self.proxy) as ws:
+                        # 先连上推送再对账，避免对账期间的变动丢失
+                        await asyncio.to_thread(self._reconcile)
+                        self.state.synced = True
+                        keepalive = asyncio.create_task(self._keepalive_loop())
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                await self._handle_message(msg)
+            except Exception as e:
+                print(f"[Binance UserStream Error] {e}")
+            finally:
+                self.stop()
+                if keepalive:
+                    keepalive.cancel()
+            await asyncio.sleep(5)
+
+
+class GateUserStream:
+
+    base_url = "wss://fx-ws.gateio.ws/v4/ws/usdt"
+    channels = ("futures.orders", "futures.positions", "futures.balances")
+
+    # trader: GateFuturesTrader，复用其 gate_api futures_api 做 REST 对账
+    def __init__(self, trader, api_key=GATEIO_API_KEY, api_secret=GATEIO_API_SECRET, proxy: str = GATE_PROXY):
+        self.trader = trader
+        self.futures_api = trader.futures_api
+        self.account_api = AccountApi(trader.api_client)
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.proxy = proxy
+        self.state = AccountState('gate')
+        self.user_id = None
+        self._order_filled = {}  # order_id -> 已成交张数，用于计算增量成交
+        self._refresh_task = None
+        trader.account = self.state
+
+    def _sign(self, channel, event, ts):
+        message = f"channel={channel}&event={event}&time={ts}"
+        return hmac.new(self.api_secret.encode(), message.encode(), hashlib.sha512).hexdigest()
+
+    def _subscribe_msg(self, channel):
+        ts = int(time.time())
+        payload = [str(self.user_id)] if channel == "futures.balances" else [str(self.user_id), "!all"]
+        return {
+            "time": ts,
+            "channel": channel,
+            "event": "subscribe",
+            "payload": payload,
+            "auth": {"method": "api_key", "KEY": self.api_key, "SIGN": self._sign(channel, "subscribe", ts)},
+        }
+
+    # REST 对账：仓位、挂单和账户余额；仓位和挂单按快照重建，不和旧状态合并
+    def _reconcile(self):
+        account = self.futures_api.list_futures_accounts(settle='usdt')
+        self.state.set_balance('USDT', wallet=account.total, available=account.available)
+
+        positions = {}
+        for pos in self.futures_api.list_positions(settle='usdt'):
+            positions.update(self._position_entries(pos.contract, pos.size, getattr(pos, 'mode', 'single')))
+        self.state.replace_positions(positions)
+
+        orders = {}
+        self._order_filled = {}
+        for o in self.futures_api.list_futures_orders(settle='usdt', status='open'):
+            size = float(o.size)
+            filled = abs(size) - abs(float(o.left or 0))
+            orders[o.id] = {
+                'symbol': o.contract,
+                'order_id': o.id,
+                'text': o.text,
+                'size': size,
+                'status': o.status,
+                'finish_as': o.finish_as,
+                'filled': filled,
+                'avg_price': float(o.fill_price or 0),
+                'time': int(float(o.create_time) * 1000) if o.create_time else None,
+            }
+            self._order_filled[o.id] = filled
+        self.state.replace_orders(orders)
+
+    # 单向持仓 size 带符号，拆成 long/short 两边；双向持仓只更新对应一边
+    @staticmethod
+    def _position_entries(contract, size, mode):
+        size = float(size)
+        if mode == 'dual_long':
+            return {(contract, 'long'): abs(size)}
+        if mode == 'dual_short':
+            return {(contract, 'short'): abs(size)}
+        return {(contract, 'long'): max(size, 0.0), (contract, 'short'): max(-size, 0.0)}
+
+    def _apply_position(self, contract, size, mode):
+        for (symbol, side), qty in self._position_entries(contract, size, mode).items():
+            self.state.set_position(symbol, side, qty)
+
+    def _handle_orders(self, result):
+        for o in result:
+            order_id = o['id']
+            left = abs(float(o.get('left', 0)))
+            size = float(o['size'])
+            filled = abs(size) - left
+            order = {
+                'symbol': o['contract'],
+                'order_id': order_id,
+                'text': o.get('text'),
+                'size': size,
+                'status': o.get('status'),
+                'finish_as': o.get('finish_as'),
+                'filled': filled,
+                'avg_price': float(o.get('fill_price') or 0),
+                'time': o.get('finish_time_ms') or o.get('create_time_ms'),
+            }
+            self.state.update_order(order_id, order)
+            last_qty = filled - self._order_filled.get(order_id, 0.0)
+            if last_qty > 0:
+                self.state.add_fill({**order, 'last_qty': last_qty, 'last_price': order['avg_price']})
+            if o.get('status') == 'finished':
+                self._order_filled.pop(order_id, None)
+            else:
+                self._order_filled[order_id] = filled
+
+    def _handle_positions(self, result):
+        for p in result:
+            self._apply_position(p['contract'], p['size'], p.get('mode', 'single'))
+
+    # balances 推送只带变动后的总额；可用余额由下一次对账或 positions 变化后刷新
+    def _handle_balances(self, result):
+        for b in result:
+            self.state.set_balance('USDT', wallet=b.get('balance'))
+        self._schedule_refresh()
+
+    async def _refresh_available(self):
+        try:
+            account = await asyncio.to_thread(self.futures_api.list_futures_accounts, settle='usdt')
+            self.state.set_balance('USDT', wallet=account.total, available=account.available)
+        except Exception as e:
+            print(f"[Gate UserStream] balance refresh failed: {e}")
+
+    # 后台刷新可用余额；保留 task 引用，已有刷新在跑就不再重复发起
+    def _schedule_refresh(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._refresh_available())
+
+    def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        self.state.synced = False
+
+    async def _handle_message(self, msg):
+        data = json.loads(msg.data)
+        if data.get('event') != 'update':
+            if data.get('error'):
+                print(f"[Gate UserStream] {data.get('channel')}: {data['error']}")
+            return
+        channel = data.get('channel')
+        result = data.get('result', [])
+        if channel == 'futures.orders':
+            self._handle_orders(result)
+        elif channel == 'futures.positions':
+            self._handle_positions(result)
+        elif channel == 'futures.balances':
+            self._handle_balances(result)
+
+    # 私有频道的 payload 需要 uid，合约账户接口不返回，从账户详情取
+    async def _fetch_user_id(self):
+        while self.user_id is None:
+            try:
+                detail = await asyncio.to_thread(self.account_api.get_account_detail)
+                self.user_id = detail.user_id
+            except Exception as e:
+                print(f"[Gate UserStream] can't get account uid: {e}")
+                await asyncio.sleep(5)
+
+    async def run(self):
+        await self._fetch_user_id()
+        while True:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(self.base_url, proxy=self.proxy, heartbeat=20) as ws:
+                        # 先订阅再对账，避免对账期间的变动丢失
+                        for channel in self.channels:
+                            await ws.send_json(self._subscribe_msg(channel))
+                        await asyncio.to_thread(self._reconcile)
+                        self.state.synced = True
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                await self._handle_message(msg)
+            except Exception as e:
+                print(f"[Gate UserStream Error] {e}")
+            finally:
+                self.stop()
+            await asyncio.sleep(5)
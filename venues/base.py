@@ -0,0 +1,72 @@
+"""
+交易所适配层接口：
+- 每个交易所一个 VenueAdapter 实现，统一三类能力：实时行情、历史数据、交易
+- 对外统一使用 'BTCUSDT' 格式的 symbol，适配器内部转换成交易所自己的格式
+- 实时行情推送的 dict 和 WS client 一致：source 为交易所名，orderbook / price 等字段不变
+- 历史数据统一为以时间为 index 的 DataFrame：K线含 open/high/low/close/volume，资金费率含 funding_rate
+"""
+import pandas as pd
+
+from market_data.shared_data import normalize_symbol
+
+
+class VenueAdapter:
+
+    name = None
+
+    # 统一格式 -> 交易所格式
+    def to_venue_symbol(self, symbol):
+        return normalize_symbol(symbol)
+
+    # 交易所格式 -> 统一格式
+    def from_venue_symbol(self, venue_symbol):
+        return normalize_symbol(venue_symbol)
+
+    # ---- 实时行情 ----
+    async def stream_orderbook(self, symbol, on_update, depth=5):
+        raise NotImplementedError
+
+    async def stream_mark_price(self, symbol, on_update):
+        raise NotImplementedError
+
+    # ---- 历史数据 ----
+    def get_klines(self, symbol, interval='1m', limit=1000):
+        raise NotImplementedError
+
+    def get_funding_history(self, symbol, limit=1000):
+        raise NotImplementedError
+
+    # ---- 交易 ----
+    def set_leverage(self, symbol, leverage):
+        raise NotImplementedError
+
+    def get_balance(self):
+        raise NotImplementedError
+
+    # side: 'long' / 'short'，usdt_amount 为单边名义本金
+    def place_market_order(self, symbol, side, usdt_amount, signal_ns=None):
+        raise NotImplementedError
+
+    # position: 'long' 平多，'short' 平空
+    def close_position(self, symbol, position, signal_ns=None):
+        raise NotImplementedError
+
+
+# 多个交易所同一 symbol 的收盘价和资金费率对齐到同一时间轴
+# 列名为 {venue}_close / {venue}_fr，两个交易所时等价于 merge_diff_fr 的 b_close / g_close / binance_fr / gate_fr
+def merge_history(adapters, symbol, interval='1m', limit=1000, with_funding=True):
+    closes = []
+    for adapter in adapters:
+        klines = adapter.get_klines(symbol, interval=interval, limit=limit)
+        closes.append(klines['close'].rename(f"{adapter.name}_close"))
+    merged = pd.concat(closes, axis=1, join='inner')
+
+    if with_funding:
+        for adapter in adapters:
+            fr = adapter.get_funding_history(symbol)
+            if fr is None or fr.empty:
+                merged[f"{adapter.name}_fr"] = float('nan')
+                continue
+            fr = fr['funding_rate'].rename(f"{adapter.name}_fr")
+            merged = merged.join(fr[~fr.index.duplicated(keep='last')], how='left')
+    return merged
@@ -0,0 +1,64 @@
+"""
+Binance U 本位合约适配器：行情用 BinanceWSClient，历史用 BinanceDataHandler，交易用 BinanceFuturesTrader
+symbol 格式：BTCUSDT（WS 为小写）
+"""
+import pandas as pd
+
+from market_data.ws_market_data import BinanceWSClient
+from venues.base import VenueAdapter
+
+
+class BinanceVenue(VenueAdapter):
+
+    name = 'binance'
+
+    def __init__(self, data_handler=None, trader=None):
+        # 历史数据和交易客户端按需创建，只用行情时不需要 API key 也不会请求 load_markets
+        self._data_handler = data_handler
+        self._trader = trader
+
+    @property
+    def data_handler(self):
+        if self._data_handler is None:
+            from analysis.data import BinanceDataHandler
+            self._data_handler = BinanceDataHandler()
+        return self._data_handler
+
+    @property
+    def trader(self):
+        if self._trader is None:
+            from trade.future_trade import BinanceFuturesTrader
+            self._trader = BinanceFuturesTrader()
+        return self._trader
+
+    async def stream_orderbook(self, symbol, on_update, depth=5):
+        await BinanceWSClient(self.to_venue_symbol(symbol), on_update).subscribe_orderbook(depth=depth)
+
+    async def stream_mark_price(self, symbol, on_update):
+        await BinanceWSClient(self.to_venue_symbol(symbol), on_update).subscribe_mark_price()
+
+    def get_klines(self, symbol, interval='1m', limit=1000):
+        df = self.data_handler.get_future_klines(symbol=self.to_venue_symbol(symbol), interval=interval, limit=limit)
+        df = df.rename(columns=str.lower)
+        df.index.name = 'time'
+        return df
+
+    def get_funding_history(self, symbol, limit=1000):
+        df = self.data_handler.get_funding_rate_history(symbol=self.to_venue_symbol(symbol), limit=limit)
+        if df is None:
+            return None
+        return pd.DataFrame({'funding_rate': pd.to_numeric(df['binance_fr'], errors='coerce').to_numpy()},
+                            index=pd.Index(df['Date'], name='funding_time'))
+
+    def set_leverage(self, symbol, leverage):
+        return self.trader.set_leverage(self.to_venue_symbol(symbol), leverage)
+
+    def get_balance(self):
+        balance = self.trader.get_balance()
+        return float(balance) if balance is not None else None
+
+    def place_market_order(self, symbol, side, usdt_amount, signal_ns=None):
+        return self.trader.place_market_order(self.to_venue_symbol(symbol), side, usdt_amount, signal_ns=signal_ns)
+
+    def close_position(self, symbol, position, signal_ns=None):
+        return self.trader.close_position(self.to_venue_symbol(symbol), position, signal_ns=signal_ns)
@@ -0,0 +1,64 @@
+"""
+Gate U 本位永续适配器：行情用 GateWSClient，历史用 GateDataHandler，交易用 GateFuturesTrader
+symbol 格式：BTC_USDT
+"""
+import pandas as pd
+
+from market_data.ws_market_data import GateWSClient
+from venues.base import VenueAdapter
+
+
+class GateVenue(VenueAdapter):
+
+    name = 'gate'
+
+    def __init__(self, data_handler=None, trader=None):
+        self._data_handler = data_handler
+        self._trader = trader
+
+    @property
+    def data_handler(self):
+        if self._data_handler is None:
+            from analysis.data import GateDataHandler
+            self._data_handler = GateDataHandler()
+        return self._data_handler
+
+    @property
+    def trader(self):
+        if self._trader is None:
+            from trade.future_trade import GateFuturesTrader
+            self._trader = GateFuturesTrader()
+        return self._trader
+
+    def to_venue_symbol(self, symbol):
+        symbol = super().to_venue_symbol(symbol)
+        return symbol[:-4] + '_USDT' if symbol.endswith('USDT') else symbol
+
+    async def stream_orderbook(self, symbol, on_update, depth=20):
+        await GateWSClient(self.to_venue_symbol(symbol), on_update).subscribe_orderbook(depth=depth)
+
+    async def stream_mark_price(self, symbol, on_update):
+        await GateWSClient(self.to_venue_symbol(symbol), on_update).subscribe_ticker()
+
+    def get_klines(self, symbol, interval='1m', limit=1000):
+        df = self.data_handler.get_future_klines(symbol=self.to_venue_symbol(symbol), interval=interval, limit=limit)
+        return df.set_index('time')[['open', 'high', 'low', 'close', 'volume']]
+
+    def get_funding_history(self, symbol, limit=1000):
+        df = self.data_handler.get_funding_rate_history(symbol=self.to_venue_symbol(symbol), limit=limit)
+        if df is None:
+            return None
+        return pd.DataFrame({'funding_rate': df['gate_fr'].to_numpy()},
+                            index=pd.Index(df['funding_time'], name='funding_time'))
+
+    def set_leverage(self, symbol, leverage):
+        return self.trader.set_leverage(self.to_venue_symbol(symbol), leverage)
+
+    def get_balance(self):
+        return self.trader.get_available_balance()
+
+    def place_market_order(self, symbol, side, usdt_amount, signal_ns=None):
+        return self.trader.place_market_order(self.to_venue_symbol(symbol), side, usdt_amount, signal_ns=signal_ns)
+
+    def close_position(self, symbol, position, signal_ns=None):
+        return self.trader.close_position(self.to_venue_symbol(symbol), position, signal_ns=signal_ns)
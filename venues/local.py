@@ -0,0 +1,131 @@
+"""
+本地替身交易所，用于不联网测试多交易所逻辑：
+- 行情由测试代码 push_orderbook / push_mark_price 注入，推送给 stream_* 注册的回调，dict 格式与 WS client 相同
+- 历史数据来自构造时传入的 DataFrame
+- 交易按当前最优价立即成交，记录订单、持仓和余额
+"""
+import asyncio
+import inspect
+import itertools
+import time
+
+import pandas as pd
+
+from market_data.latency import now_ns
+from venues.base import VenueAdapter
+
+
+class LocalVenue(VenueAdapter):
+
+    def __init__(self, name, klines=None, funding=None, balance=10000.0, fee_rate=0.0005):
+        """
+        klines: {symbol: DataFrame}，index 为时间，至少包含 close 列
+        funding: {symbol: DataFrame}，index 为结算时间，包含 funding_rate 列
+        """
+        self.name = name
+        self.klines = klines or {}
+        self.funding = funding or {}
+        self.balance = balance
+        self.fee_rate = fee_rate
+        self.books = {}      # symbol -> {'bids': [...], 'asks': [...]}
+        self.marks = {}      # symbol -> mark price
+        self.positions = {}  # (symbol, 'long'/'short') -> 币数量
+        self.orders = []
+        self.leverage = {}
+        self._listeners = {}  # (channel, symbol) -> [on_update]
+        self._order_ids = itertools.count(1)
+
+    # ---- 行情注入 ----
+    def _emit(self, channel, symbol, data):
+        results = [cb(data) for cb in self._listeners.get((channel, symbol), [])]
+        return [r for r in results if inspect.isawaitable(r)]
+
+    def _message(self, symbol, **fields):
+        ts = now_ns()
+        data = {'source': self.name, 'symbol': self.to_venue_symbol(symbol), 'event_ms': int(time.time() * 1000),
+                'recv_ns': ts, 'decode_ns': ts}
+        data.update(fields)
+        return data
+
+    def push_orderbook(self, symbol, bids, asks):
+        symbol = self.to_venue_symbol(symbol)
+        orderbook = {'bids': [(float(p), float(q)) for p, q in bids], 'asks': [(float(p), float(q)) for p, q in asks]}
+        self.books[symbol] = orderbook
+        return self._emit('orderbook', symbol, self._message(symbol, orderbook=orderbook))
+
+    def push_mark_price(self, symbol, price, funding_rate=None, next_funding_time=None):
+        symbol = self.to_venue_symbol(symbol)
+        self.marks[symbol] = float(price)
+        return self._emit('mark_price', symbol, self._message(symbol, price=float(price), funding_rate=funding_rate,
+                                                              next_funding_time=next_funding_time))
+
+    # ---- 实时行情 ----
+    async def _stream(self, channel, symbol, on_update):
+        key = (channel, self.to_venue_symbol(symbol))
+        self._listeners.setdefault(key, []).append(on_update)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self._listeners[key].remove(on_update)
+
+    async def stream_orderbook(self, symbol, on_update, depth=5):
+        await self._stream('orderbook', symbol, on_update)
+
+    async def stream_mark_price(self, symbol, on_update):
+        await self._stream('mark_price', symbol, on_update)
+
+    # ---- 历史数据 ----
+    def get_klines(self, symbol, interval='1m', limit=1000):
+        df = self.klines[self.to_venue_symbol(symbol)]
+        return df.iloc[-limit:]
+
+    def get_funding_history(self, symbol, limit=1000):
+        df = self.funding.get(self.to_venue_symbol(symbol))
+        return df.iloc[-limit:] if df is not None else pd.DataFrame(columns=['funding_rate'])
+
+    # ---- 交易 ----
+    def set_leverage(self, symbol, leverage):
+        self.leverage[self.to_venue_symbol(symbol)] = leverage
+
+    def get_balance(self):
+        return self.balance
+
+    def _fill_price(self, symbol, buy):
+        book = self.books.get(symbol)
+        if book and book['asks' if buy else 'bids']:
+            return book['asks' if buy else 'bids'][0][0]
+        return self.marks.get(symbol)
+
+    # 按最优价立即成交；开仓按 usdt_amount 换算数量，平仓直接给 qty
+    def _fill(self, symbol, buy, qty=None, usdt_amount=None, reduce=False):
+        price = self._fill_price(symbol, buy)
+        if price is None:
+            print(f"[{self.name}] no price for {symbol}")
+            return None
+        qty = qty if qty is not None else usdt_amount / price
+        fee = qty * price * self.fee_rate
+        self.balance -= fee
+        order = {'id': next(self._order_ids), 'symbol': symbol, 'side': 'buy' if buy else 'sell', 'qty': qty,
+                 'price': price, 'fee': fee, 'reduce': reduce, 'time': time.time()}
+        self.orders.append(order)
+        return order
+
+    def place_market_order(self, symbol, side, usdt_amount, signal_ns=None):
+        symbol = self.to_venue_symbol(symbol)
+        order = self._fill(symbol, side == 'long', usdt_amount=usdt_amount)
+        if order is not None:
+            self.positions[(symbol, side)] = self.positions.get((symbol, side), 0.0) + order['qty']
+        return order
+
+    def close_position(self, symbol, position, signal_ns=None):
+        symbol = self.to_venue_symbol(symbol)
+        qty = self.positions.get((symbol, position), 0.0)
+        if qty <= 0:
+            return None
+        order = self._fill(symbol, position == 'short', qty=qty, reduce=True)
+        if order is not None:
+            self.positions[(symbol, position)] = 0.0
+        return order
+
+    def position_qty(self, symbol, side):
+        return self.positions.get((self.to_venue_symbol(symbol), side), 0.0)